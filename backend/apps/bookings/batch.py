@@ -0,0 +1,255 @@
+"""
+Recurring and batch booking creation
+
+A batch is a list of slots on one court, given explicitly or expanded from a
+recurrence rule ("every Tuesday 19:00 for 12 weeks"). All slots are checked
+against existing bookings with one interval-index lookup, against admin
+blocks with one occupancy read and against the plan's weekly limit with one
+usage read. Accepted slots are claimed with one insert_many and the bookings
+are written with another; occupancy bits are set with one bulk write and
+booking.created goes out as one batch event, so a batch costs the same
+handful of round trips whatever its size.
+"""
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from apps.bookings.models import Booking
+from apps.bookings.interval_index import booking_index, days_between
+from apps.bookings.slot_claims import alignment_error, claim_many, release_slots_many
+from apps.bookings.week_usage import (
+    get_usage_counts, reserve_usage, decrement_usage, week_key
+)
+from apps.core.mongo_utils import to_naive_utc
+from apps.courts.occupancy import get_occupancy, day_masks, mark_booked_many
+from apps.core.events import publish_many, BOOKING_CREATED
+from apps.bookings.handlers import booking_payload
+
+RECURRENCE_FREQUENCIES = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+# Booking fields a batch applies to every slot
+BATCH_OPTION_FIELDS = [
+    'number_of_players', 'equipment_needed', 'equipment_details',
+    'payment_method', 'notes',
+]
+
+
+def get_max_batch_slots():
+    """Get maximum number of slots in one batch"""
+    return getattr(settings, 'BOOKING_BATCH_MAX_SLOTS', 52)
+
+
+def expand_recurrence(start_time, end_time, frequency='weekly', count=None, until=None, interval=1):
+    """
+    Expand a recurrence rule into slots.
+
+    Args:
+        start_time, end_time: first occurrence
+        frequency: 'daily' or 'weekly'
+        count: number of occurrences
+        until: last date/datetime an occurrence may start on
+        interval: repeat every `interval` periods
+
+    Returns:
+        list of (start_time, end_time)
+    """
+    if frequency not in RECURRENCE_FREQUENCIES:
+        raise ValueError(f"Unsupported frequency '{frequency}'. Use: {', '.join(RECURRENCE_FREQUENCIES)}")
+    if not count and not until:
+        raise ValueError("Recurrence needs 'count' or 'until'")
+    if interval < 1:
+        raise ValueError("Interval must be at least 1")
+
+    max_slots = get_max_batch_slots()
+    if count and count > max_slots:
+        raise ValueError(f"At most {max_slots} occurrences can be booked at once")
+
+    step = RECURRENCE_FREQUENCIES[frequency] * interval
+    duration = end_time - start_time
+
+    slots = []
+    occurrence = start_time
+    while True:
+        if count and len(slots) >= count:
+            break
+        if until and occurrence.date() > (until.date() if hasattr(until, 'date') else until):
+            break
+        if len(slots) >= max_slots:
+            raise ValueError(f"At most {max_slots} occurrences can be booked at once")
+        slots.append((occurrence, occurrence + duration))
+        occurrence += step
+
+    return slots
+
+
+def _reject(result, code, message, **extra):
+    result['status'] = 'rejected'
+    result['errors'].append(dict({'code': code, 'message': message}, **extra))
+
+
+def create_batch_bookings(user, court, slots, policy, options=None):
+    """
+    Check and create bookings for many slots of one court.
+
+    Args:
+        slots: list of (start_time, end_time)
+        policy: BookingPolicy of the user's plan
+        options: booking fields applied to every created booking
+
+    Returns:
+        tuple: (results, bookings) where results holds one dict per
+               requested slot (in request order) and bookings the
+               created Booking documents
+    """
+    options = options or {}
+    court_id = str(court.id)
+    user_id = str(user.id)
+
+    results = []
+    for index, (start_time, end_time) in enumerate(slots):
+        results.append({
+            'index': index,
+            'start_time': to_naive_utc(start_time),
+            'end_time': to_naive_utc(end_time),
+            'status': 'accepted',
+            'booking_id': None,
+            'errors': [],
+        })
+    if not results:
+        return results, []
+
+    for result in results:
+        if result['end_time'] <= result['start_time']:
+            _reject(result, 'INVALID_TIME_RANGE', 'End time must be after start time')
+        elif result['end_time'] - result['start_time'] > timedelta(days=1):
+            _reject(result, 'INVALID_TIME_RANGE', 'A booking cannot last more than a day')
+        elif alignment_error(result['start_time'], result['end_time']):
+            _reject(result, 'TIME_NOT_ALIGNED', alignment_error(result['start_time'], result['end_time']))
+
+    ordered = sorted(
+        [result for result in results if result['status'] == 'accepted'],
+        key=lambda result: result['start_time']
+    )
+
+    # Slots of the same batch must not overlap each other
+    previous = None
+    for result in ordered:
+        if previous and result['start_time'] < previous['end_time']:
+            _reject(result, 'OVERLAPS_BATCH_SLOT', 'This slot overlaps another slot of the batch',
+                    overlaps_index=previous['index'])
+        else:
+            previous = result
+    ordered = [result for result in ordered if result['status'] == 'accepted']
+    if not ordered:
+        return results, []
+
+    # Existing bookings: every (court, day) bucket the batch touches in one lookup
+    first_day = (ordered[0]['start_time'] - timedelta(days=1)).date()
+    last_day = max(result['end_time'] for result in ordered).date()
+    buckets = booking_index.get_buckets([court_id], days_between(first_day, last_day))
+
+    # Admin blocks: one occupancy read for the same range
+    occupancy = get_occupancy([court_id], first_day, last_day)
+
+    for result in ordered:
+        start_time, end_time = result['start_time'], result['end_time']
+
+        conflicts = []
+        for day in days_between((start_time - timedelta(days=1)).date(), end_time.date()):
+            for entry in buckets[(court_id, day)].overlapping(start_time, end_time):
+                conflicts.append({
+                    'id': entry[2],
+                    'start_time': entry[0].isoformat(),
+                    'end_time': entry[1].isoformat(),
+                    'status': entry[3],
+                })
+        if conflicts:
+            _reject(result, 'TIME_SLOT_OCCUPIED', 'This time slot is already booked', conflicts=conflicts)
+            continue
+
+        for day, mask in day_masks(start_time, end_time):
+            _, blocked = occupancy.get((court_id, day), (0, 0))
+            if blocked & mask:
+                _reject(result, 'TIME_SLOT_BLOCKED', 'This time slot is blocked by the club')
+                break
+
+    # Plan rules, counting the batch's own slots against the weekly limit
+    ordered = [result for result in ordered if result['status'] == 'accepted']
+    week_counts = get_usage_counts(user_id, [result['start_time'] for result in ordered])
+    for result in ordered:
+        key = week_key(user_id, result['start_time'])
+        errors, _ = policy.check(result['start_time'], result['end_time'], week_counts.get(key, 0))
+        if errors:
+            result['status'] = 'rejected'
+            result['errors'].extend(errors)
+        else:
+            week_counts[key] = week_counts.get(key, 0) + 1
+
+    accepted = [result for result in ordered if result['status'] == 'accepted']
+    if not accepted:
+        return results, []
+
+    bookings = {}
+    for result in accepted:
+        booking = Booking(
+            id=uuid.uuid4(),
+            user=user,
+            court=court,
+            start_time=result['start_time'],
+            end_time=result['end_time'],
+            **options
+        )
+        booking.validate()
+        bookings[str(booking.id)] = (booking, result)
+
+    # Claim every slot in one round trip; the unique claim keys settle races
+    failed = claim_many(court_id, [
+        (result['start_time'], result['end_time'], booking_id)
+        for booking_id, (_, result) in bookings.items()
+    ])
+    for booking_id in failed:
+        _, result = bookings.pop(booking_id)
+        _reject(result, 'TIME_SLOT_OCCUPIED', 'This time slot was booked in the meantime')
+
+    # Reserve the weekly quota per week with one conditional increment each
+    weeks = {}
+    for booking_id, (booking, result) in bookings.items():
+        weeks.setdefault(week_key(user_id, result['start_time']), []).append(booking_id)
+
+    reserved = []
+    for booking_ids in weeks.values():
+        week_start_time = bookings[booking_ids[0]][1]['start_time']
+        if reserve_usage(user_id, week_start_time, policy.bookings_per_week, len(booking_ids)) is None:
+            release_slots_many(booking_ids)
+            for booking_id in booking_ids:
+                _, result = bookings.pop(booking_id)
+                _reject(result, 'WEEKLY_LIMIT_REACHED',
+                        f'Weekly booking limit ({policy.bookings_per_week}) reached',
+                        bookings_per_week=policy.bookings_per_week)
+        else:
+            reserved.append((week_start_time, len(booking_ids)))
+
+    if not bookings:
+        return results, []
+
+    created = [booking for booking, _ in bookings.values()]
+    try:
+        Booking.objects.insert(created, load_bulk=False)
+    except Exception:
+        release_slots_many(bookings.keys())
+        for week_start_time, amount in reserved:
+            decrement_usage(user_id, week_start_time, amount)
+        raise
+
+    # insert_many bypasses Booking.save(), so apply its side effects here
+    mark_booked_many(court_id, [(booking.start_time, booking.end_time) for booking in created])
+    for booking_id, (booking, result) in bookings.items():
+        booking._created = False
+        booking_index.apply(booking)
+        result['status'] = 'created'
+        result['booking_id'] = booking_id
+    publish_many(BOOKING_CREATED, [booking_payload(booking) for booking in created])
+
+    return results, created
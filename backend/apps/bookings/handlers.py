@@ -0,0 +1,49 @@
+"""
+Booking domain event handlers (see settings.DOMAIN_EVENT_HANDLERS)
+"""
+from apps.core.events import publish, MATCH_CREATED
+from apps.core.mongo_utils import reference_id, to_naive_utc
+
+
+def booking_payload(booking):
+    """Payload of booking.created / booking.cancelled events"""
+    return {
+        'booking_id': str(booking.id),
+        'user_id': reference_id(booking, 'user'),
+        'court_id': reference_id(booking, 'court'),
+        'start_time': to_naive_utc(booking.start_time).isoformat(),
+        'end_time': to_naive_utc(booking.end_time).isoformat(),
+        'find_opponents': bool(booking.find_opponents),
+        'cancellation_reason': booking.cancellation_reason or '',
+    }
+
+
+def match_created_payload(match, booking):
+    """Payload of a match.created event"""
+    return {
+        'match_id': str(match.id),
+        'booking_id': str(booking.id),
+        'court_id': reference_id(booking, 'court'),
+        'seeker_id': reference_id(match, 'seeker'),
+        'opponent_id': reference_id(match, 'opponent'),
+    }
+
+
+def match_opponents(event):
+    """booking.created: pair the booking with waiting seekers, then publish match.created"""
+    from apps.bookings.models import Booking
+    from apps.bookings.matching import OpponentMatch, FILLED_MATCH_STATUSES, auto_match_opponents
+
+    booking = Booking.objects(id=event['payload']['booking_id']).first()
+    if not booking or booking.status not in ['pending', 'confirmed']:
+        return
+    if not booking.find_opponents or booking.opponents_needed <= 0:
+        return
+
+    # A retried delivery must not pair the booking twice
+    matches = list(OpponentMatch.objects(booking=booking.id, status__in=FILLED_MATCH_STATUSES))
+    if not matches:
+        matches = auto_match_opponents(booking, event['payload'].get('skill_level', 'any'))
+
+    for match in matches:
+        publish(MATCH_CREATED, match_created_payload(match, booking))
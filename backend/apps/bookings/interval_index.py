@@ -0,0 +1,222 @@
+"""
+In-memory per-court interval index for booking conflict checks
+
+Active (pending/confirmed) bookings are grouped into (court, day) buckets of
+intervals sorted by start time. A bucket is loaded from MongoDB with a single
+query the first time it is needed, kept fresh by Booking.save() in this
+process and reloaded after BOOKING_INTERVAL_INDEX_TTL seconds so that writes
+made by other processes are picked up.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from django.conf import settings
+from apps.core.mongo_utils import reference_id, to_naive_utc
+
+ACTIVE_STATUSES = ['confirmed', 'pending']
+
+
+def day_start(day):
+    """Get midnight of a date as datetime"""
+    return datetime(day.year, day.month, day.day)
+
+
+def days_between(first_day, last_day):
+    """List dates from first_day to last_day inclusive"""
+    days = []
+    day = first_day
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class CourtDayIntervals:
+    """Active booking intervals of one court for one day, sorted by start"""
+
+    def __init__(self, loaded_at):
+        self.loaded_at = loaded_at
+        self.starts = []
+        self.entries = []  # (start_time, end_time, booking_id, status)
+        self.max_duration = timedelta(0)
+
+    def add(self, start_time, end_time, booking_id, status):
+        """Insert an interval keeping the bucket sorted"""
+        idx = bisect_left(self.starts, start_time)
+        self.starts.insert(idx, start_time)
+        self.entries.insert(idx, (start_time, end_time, booking_id, status))
+        self.max_duration = max(self.max_duration, end_time - start_time)
+
+    def remove(self, booking_id):
+        """Remove the interval of a booking"""
+        for idx, entry in enumerate(self.entries):
+            if entry[2] == booking_id:
+                del self.starts[idx]
+                del self.entries[idx]
+                return True
+        return False
+
+    def overlapping(self, start_time, end_time):
+        """Get intervals overlapping [start_time, end_time)"""
+        # Everything left of idx starts before end_time
+        idx = bisect_left(self.starts, end_time)
+        # Intervals starting before this bound end before start_time
+        lower_bound = start_time - self.max_duration
+        result = []
+        while idx > 0:
+            idx -= 1
+            entry = self.entries[idx]
+            if entry[0] < lower_bound:
+                break
+            if entry[1] > start_time:
+                result.append(entry)
+        result.reverse()
+        return result
+
+
+class BookingIntervalIndex:
+    """Process-local index of active booking intervals per court and day"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buckets = OrderedDict()  # (court_id, date) -> CourtDayIntervals
+        self._locations = {}  # booking_id -> (court_id, date)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'BOOKING_INTERVAL_INDEX_TTL', 60)
+
+    @property
+    def max_buckets(self):
+        return getattr(settings, 'BOOKING_INTERVAL_INDEX_MAX_BUCKETS', 5000)
+
+    def find_conflicts(self, court_id, start_time, end_time, exclude_booking_id=None):
+        """
+        Find active bookings of a court overlapping the given time range.
+        Cold buckets are loaded from MongoDB with one query.
+        """
+        court_id = str(court_id)
+        start_time = to_naive_utc(start_time)
+        end_time = to_naive_utc(end_time)
+        exclude_booking_id = str(exclude_booking_id) if exclude_booking_id else None
+
+        # Bookings last less than a day, so one that overlaps the range
+        # starts no earlier than the day before start_time
+        days = days_between((start_time - timedelta(days=1)).date(), end_time.date())
+        buckets = self.get_buckets([court_id], days)
+
+        conflicts = []
+        for day in days:
+            for entry in buckets[(court_id, day)].overlapping(start_time, end_time):
+                if entry[2] != exclude_booking_id:
+                    conflicts.append({
+                        'id': entry[2],
+                        'start_time': entry[0],
+                        'end_time': entry[1],
+                        'status': entry[3],
+                    })
+        return conflicts
+
+    def get_buckets(self, court_ids, days):
+        """Get buckets for every (court, day) pair, loading cold ones in one query"""
+        now = time.monotonic()
+        keys = [(str(court_id), day) for court_id in court_ids for day in days]
+
+        buckets = {}
+        with self._lock:
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is not None and now - bucket.loaded_at < self.ttl:
+                    self._buckets.move_to_end(key)
+                    buckets[key] = bucket
+
+        missing = [key for key in keys if key not in buckets]
+        if missing:
+            missing_courts = sorted(set(key[0] for key in missing))
+            missing_days = [key[1] for key in missing]
+            buckets.update(self._load(missing_courts, min(missing_days), max(missing_days), now))
+
+        return buckets
+
+    def _load(self, court_ids, first_day, last_day, now):
+        """Load buckets for courts and a day range from MongoDB"""
+        from apps.bookings.models import Booking
+
+        loaded = {
+            (court_id, day): CourtDayIntervals(now)
+            for court_id in court_ids
+            for day in days_between(first_day, last_day)
+        }
+
+        rows = Booking.objects(
+            court__in=court_ids,
+            status__in=ACTIVE_STATUSES,
+            start_time__gte=day_start(first_day),
+            start_time__lt=day_start(last_day) + timedelta(days=1)
+        ).only('id', 'court', 'start_time', 'end_time', 'status').as_pymongo()
+
+        locations = {}
+        for row in rows:
+            key = (str(row['court']), row['start_time'].date())
+            booking_id = str(row['_id'])
+            loaded[key].add(row['start_time'], row['end_time'], booking_id, row['status'])
+            locations[booking_id] = key
+
+        with self._lock:
+            for key, bucket in loaded.items():
+                self._drop_bucket(key)
+                self._buckets[key] = bucket
+            self._locations.update(locations)
+            while len(self._buckets) > self.max_buckets:
+                self._drop_bucket(next(iter(self._buckets)))
+
+        return loaded
+
+    def _drop_bucket(self, key):
+        bucket = self._buckets.pop(key, None)
+        if bucket is not None:
+            for entry in bucket.entries:
+                self._locations.pop(entry[2], None)
+
+    def apply(self, booking):
+        """Reflect a saved booking in the index (only warm buckets are touched)"""
+        booking_id = str(booking.id)
+        court_id = reference_id(booking, 'court')
+        start_time = to_naive_utc(booking.start_time)
+        end_time = to_naive_utc(booking.end_time)
+
+        with self._lock:
+            old_key = self._locations.pop(booking_id, None)
+            if old_key in self._buckets:
+                self._buckets[old_key].remove(booking_id)
+
+            if booking.status not in ACTIVE_STATUSES or not (court_id and start_time and end_time):
+                return
+
+            key = (court_id, start_time.date())
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.add(start_time, end_time, booking_id, booking.status)
+                self._locations[booking_id] = key
+
+    def discard(self, booking_id):
+        """Remove a booking from the index"""
+        with self._lock:
+            key = self._locations.pop(str(booking_id), None)
+            if key in self._buckets:
+                self._buckets[key].remove(str(booking_id))
+
+    def invalidate(self, court_id=None):
+        """Drop cached buckets of one court, or everything"""
+        with self._lock:
+            if court_id is None:
+                self._buckets.clear()
+                self._locations.clear()
+                return
+            for key in [key for key in self._buckets if key[0] == str(court_id)]:
+                self._drop_bucket(key)
+
+
+booking_index = BookingIntervalIndex()
@@ -0,0 +1,127 @@
+"""
+Denormalized per-user match feed
+
+Every match is written twice to the match_feed collection, once for the
+seeker and once for the opponent, together with the court name, booking
+times and the other player's display fields. A user's matches are then one
+indexed, cursor-paginated read with no dereferencing.
+"""
+from datetime import datetime
+from mongoengine import Document, fields
+from apps.core.mongo_utils import reference_id
+
+# Display fields of the other player copied into feed entries
+PLAYER_FIELDS = ['nickname', 'first_name', 'last_name']
+
+
+class MatchFeedEntry(Document):
+    """One match as seen by one of its players"""
+
+    # "<match_id>:<role>"
+    id = fields.StringField(primary_key=True)
+
+    user = fields.StringField(required=True)
+    match_id = fields.StringField(required=True)
+    role = fields.StringField(choices=['seeker', 'opponent'], required=True)
+    status = fields.StringField(default='matched')
+
+    # {'id', 'nickname', 'first_name', 'last_name'} of the other player
+    opponent = fields.DictField()
+    # {'id', 'court_id', 'court_name', 'start_time', 'end_time', 'status'}
+    booking = fields.DictField()
+
+    matched_at = fields.DateTimeField()
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'match_feed',
+        'indexes': [
+            [('user', 1), ('status', 1), ('created_at', -1), ('id', -1)],
+            'booking.id',
+            [('booking.status', 1), ('booking.end_time', 1)],
+        ]
+    }
+
+    def __str__(self):
+        return f"MatchFeed {self.id} - {self.user}"
+
+
+def _player(user):
+    data = {'id': str(user.id)}
+    for field in PLAYER_FIELDS:
+        data[field] = getattr(user, field, None)
+    return data
+
+
+def _booking(booking, court_name):
+    return {
+        'id': str(booking.id),
+        'court_id': reference_id(booking, 'court'),
+        'court_name': court_name,
+        'start_time': booking.start_time,
+        'end_time': booking.end_time,
+        'status': booking.status,
+    }
+
+
+def feed_entries(match, booking, seeker, opponent, court_name):
+    """Build the seeker's and the opponent's feed documents of a match"""
+    base = {
+        'match_id': str(match.id),
+        'status': match.status,
+        'booking': _booking(booking, court_name),
+        'matched_at': match.matched_at,
+        'created_at': match.created_at,
+    }
+    return [
+        dict(base, _id=f"{match.id}:seeker", user=str(seeker.id), role='seeker', opponent=_player(opponent)),
+        dict(base, _id=f"{match.id}:opponent", user=str(opponent.id), role='opponent', opponent=_player(seeker)),
+    ]
+
+
+def update_booking_status(booking_ids, status):
+    """Copy a booking status change into the feed"""
+    booking_ids = [str(booking_id) for booking_id in booking_ids]
+    if booking_ids:
+        MatchFeedEntry._get_collection().update_many(
+            {'booking.id': {'$in': booking_ids}},
+            {'$set': {'booking.status': status}}
+        )
+
+
+def rebuild_feed(batch_size=500):
+    """
+    Rewrite the feed from opponent_matches.
+
+    Returns:
+        int: number of feed documents written
+    """
+    from pymongo import ReplaceOne
+    from apps.bookings.matching import OpponentMatch
+    from apps.courts.models import Court
+
+    collection = MatchFeedEntry._get_collection()
+    written = 0
+    batch = []
+    court_names = {}
+
+    for match in OpponentMatch.objects(opponent__exists=True).no_cache():
+        booking = match.booking
+        if not booking or not match.seeker or not match.opponent:
+            continue
+        court_id = reference_id(booking, 'court')
+        if court_id not in court_names:
+            court = Court.objects(id=court_id).only('name_i18n').first()
+            court_names[court_id] = court.get_name() if court else ''
+        for entry in feed_entries(match, booking, match.seeker, match.opponent, court_names[court_id]):
+            batch.append(ReplaceOne({'_id': entry['_id']}, entry, upsert=True))
+
+        if len(batch) >= batch_size:
+            collection.bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch = []
+
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+        written += len(batch)
+    return written
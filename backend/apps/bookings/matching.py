@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 from mongoengine import Document, fields
 from apps.users.models import User
 from apps.bookings.models import Booking
+from apps.core.mongo_utils import reference_id, to_naive_utc
+from apps.bookings.match_feed import MatchFeedEntry, feed_entries
+from pymongo import UpdateOne
 
 
 class OpponentMatch(Document):
@@ -35,6 +38,7 @@ class OpponentMatch(Document):
     # Notifications
     seeker_notified = fields.BooleanField(default=False)
     opponent_notified = fields.BooleanField(default=False)
+    cancellation_notified = fields.BooleanField(default=False)  # Opponent told the seeker's booking was cancelled
     
     # Timestamps
     created_at = fields.DateTimeField(default=datetime.utcnow)
@@ -50,6 +54,9 @@ class OpponentMatch(Document):
             'status',
             'created_at',
             [('booking', 1), ('status', 1)],
+            # Cursor pagination of a user's matches
+            [('seeker', 1), ('created_at', -1), ('id', -1)],
+            [('opponent', 1), ('created_at', -1), ('id', -1)],
         ]
     }
     
@@ -117,89 +124,298 @@ class OpponentRequest(Document):
         return datetime.utcnow() >= self.expires_at
 
 
+# Match statuses that use up one of a booking's needed opponents
+FILLED_MATCH_STATUSES = ['matched', 'accepted']
+
+# Ranking of flexible matches: closer courts and longer shared time score higher
+FLEXIBLE_MATCH_WEIGHTS = {
+    'distance': 0.4,
+    'overlap': 0.6,
+}
+
+# Seeker fields loaded with each candidate booking
+CANDIDATE_USER_FIELDS = [
+    'nickname', 'first_name', 'last_name', 'avatar_url', 'experience_level', 'rating',
+]
+
+
+def _open_candidate_stages():
+    """Pipeline stages counting matches per booking and keeping those still needing opponents"""
+    return [
+        {'$lookup': {
+            'from': OpponentMatch._get_collection_name(),
+            'let': {'booking_id': '$_id'},
+            'pipeline': [
+                {'$match': {
+                    '$expr': {'$eq': ['$booking', '$$booking_id']},
+                    'status': {'$in': FILLED_MATCH_STATUSES},
+                }},
+                {'$count': 'count'},
+            ],
+            'as': 'match_counts',
+        }},
+        {'$addFields': {
+            'matches_found': {'$ifNull': [{'$arrayElemAt': ['$match_counts.count', 0]}, 0]},
+        }},
+        # Only bookings that still need opponents
+        {'$match': {'$expr': {'$lt': ['$matches_found', '$opponents_needed']}}},
+        {'$project': {'match_counts': 0}},
+    ]
+
+
+def _seeker_stages():
+    """Pipeline stages joining each booking's seeker (CANDIDATE_USER_FIELDS only)"""
+    return [
+        {'$lookup': {
+            'from': User._get_collection_name(),
+            'let': {'user_id': '$user'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', '$$user_id']}}},
+                {'$project': {field: 1 for field in CANDIDATE_USER_FIELDS}},
+            ],
+            'as': 'user_doc',
+        }},
+        {'$unwind': '$user_doc'},
+    ]
+
+
+def _build_candidates(rows, extra_fields=()):
+    """Build candidate bookings with preloaded seekers from aggregation rows"""
+    candidates = []
+    for row in rows:
+        user_doc = row.pop('user_doc')
+        matches_found = row.pop('matches_found')
+        extras = {field: row.pop(field, None) for field in extra_fields}
+        candidate = Booking._from_son(row)
+        # Set the raw value so the preloaded user is not tracked as a change
+        candidate._data['user'] = User._from_son(user_doc, only_fields=CANDIDATE_USER_FIELDS)
+        candidate.matches_found = matches_found
+        for field, value in extras.items():
+            setattr(candidate, field, value)
+        candidates.append(candidate)
+    return candidates
+
+
 def find_opponent_for_booking(booking):
     """
     Find an opponent for a booking.
     Returns a list of potential opponents (users looking for opponents at the same time/court).
+    
+    Candidates are found with one aggregation: matches already made for each
+    candidate are counted with a $lookup on opponent_matches and the seeker is
+    joined in, so the result does not depend on how many seekers share the slot.
+    Each returned booking has `user` preloaded (CANDIDATE_USER_FIELDS only) and
+    `matches_found` set.
     """
     if not booking.find_opponents or booking.opponents_needed <= 0:
         return []
     
-    # Find other bookings looking for opponents at the same time and court
-    potential_matches = Booking.objects(
+    rows = Booking.objects(
         court=booking.court,
         start_time=booking.start_time,
         end_time=booking.end_time,
         find_opponents=True,
         status__in=['pending', 'confirmed'],
         id__ne=booking.id  # Exclude current booking
+    ).aggregate(
+        [{'$sort': {'created_at': 1}}] + _open_candidate_stages() + _seeker_stages()
     )
     
-    # Filter out bookings that already have enough opponents
-    candidates = []
-    for match in potential_matches:
-        # Check if this booking still needs opponents
-        current_matches = OpponentMatch.objects(
-            booking=match,
-            status__in=['matched', 'accepted']
-        ).count()
-        
-        if current_matches < match.opponents_needed:
-            candidates.append(match)
-    
-    return candidates
+    return _build_candidates(rows)
 
 
-def create_opponent_match(booking, opponent_booking):
+def find_flexible_opponents(booking, radius_km=5, window_minutes=60, limit=10):
     """
-    Create a match between two bookings looking for opponents.
+    Find seekers on nearby courts whose bookings start within a time window.
+    
+    Nearby courts come from one $geoNear on the courts' 2dsphere index; seeking
+    bookings from one aggregation on the partial (start_time, court) index of
+    bookings with find_opponents set. Candidates are ranked in the database by
+    distance and time overlap and only the top `limit` are joined with users.
+    
+    Returns:
+        list of Booking with `user` preloaded and `matches_found`,
+        `distance_km`, `overlap_minutes` and `score` set
     """
-    # Create match for the seeker
-    match = OpponentMatch(
-        booking=booking,
-        seeker=booking.user,
-        opponent=opponent_booking.user,
-        opponents_needed=booking.opponents_needed,
-        opponents_found=1,
-        status='matched',
-        matched_at=datetime.utcnow()
-    )
-    match.save()
+    from apps.courts.models import Court
+    
+    if not booking.find_opponents or booking.opponents_needed <= 0:
+        return []
+    
+    court = booking.court
+    if not court.location:
+        return find_opponent_for_booking(booking)[:limit]
+    
+    location = court.location
+    if not isinstance(location, dict):
+        location = {'type': 'Point', 'coordinates': location}
     
-    # Add opponent to booking participants
-    if opponent_booking.user not in booking.participants:
-        booking.participants.append(opponent_booking.user)
-        booking.save()
+    # $geoNear has to be the first stage, so it runs on the raw collection
+    courts = list(Court._get_collection().aggregate([
+        {'$geoNear': {
+            'near': location,
+            'distanceField': 'distance',
+            'maxDistance': radius_km * 1000,
+            'query': {'is_active': True},
+            'spherical': True,
+        }},
+        {'$project': {'_id': 1, 'distance': 1}},
+    ]))
+    court_ids = [row['_id'] for row in courts]
+    distances_km = [row['distance'] / 1000 for row in courts]
     
-    # Add seeker to opponent's booking participants
-    if booking.user not in opponent_booking.participants:
-        opponent_booking.participants.append(booking.user)
-        opponent_booking.save()
+    start_time = to_naive_utc(booking.start_time)
+    end_time = to_naive_utc(booking.end_time)
+    window = timedelta(minutes=window_minutes)
+    duration_ms = (end_time - start_time).total_seconds() * 1000
     
-    return match
+    overlap_ms = {'$max': [0, {'$subtract': [
+        {'$min': ['$end_time', end_time]},
+        {'$max': ['$start_time', start_time]},
+    ]}]}
+    
+    rows = Booking.objects(
+        find_opponents=True,
+        start_time__gte=start_time - window,
+        start_time__lte=start_time + window,
+        court__in=court_ids,
+        status__in=['pending', 'confirmed'],
+        user__ne=booking.user,
+        id__ne=booking.id
+    ).aggregate(
+        _open_candidate_stages() + [
+            {'$addFields': {
+                'distance_km': {'$arrayElemAt': [distances_km, {'$indexOfArray': [court_ids, '$court']}]},
+                'overlap_minutes': {'$divide': [overlap_ms, 60000]},
+            }},
+            {'$addFields': {
+                'score': {'$add': [
+                    {'$multiply': [
+                        FLEXIBLE_MATCH_WEIGHTS['distance'],
+                        {'$subtract': [1, {'$divide': ['$distance_km', radius_km]}]},
+                    ]},
+                    {'$multiply': [
+                        FLEXIBLE_MATCH_WEIGHTS['overlap'],
+                        {'$divide': [{'$multiply': ['$overlap_minutes', 60000]}, duration_ms]},
+                    ]},
+                ]},
+            }},
+            {'$sort': {'score': -1, 'start_time': 1}},
+            {'$limit': limit},
+        ] + _seeker_stages()
+    )
+    
+    return _build_candidates(rows, extra_fields=('distance_km', 'overlap_minutes', 'score'))
+
 
+def _supports_transactions(client):
+    """Check if the MongoDB deployment can run multi-document transactions"""
+    return client.topology_description.topology_type_name in ('ReplicaSetWithPrimary', 'Sharded')
 
-def auto_match_opponents(booking):
+
+def commit_matches(booking, opponent_bookings):
     """
-    Automatically try to match opponents for a booking.
-    Returns list of created matches.
+    Create matches between a seeker booking and several opponent bookings.
+    
+    All matches are written with one insert_many, all participant lists
+    with one bulk_write of $addToSet updates and the players' feed entries
+    with one more insert_many, inside a transaction when the deployment
+    supports it.
+    
+    Returns:
+        list: created OpponentMatch documents
     """
-    if not booking.find_opponents:
+    if not opponent_bookings:
         return []
     
-    candidates = find_opponent_for_booking(booking)
+    now = datetime.utcnow()
+    seeker_id = reference_id(booking, 'user')
+    opponent_ids = [reference_id(opponent_booking, 'user') for opponent_booking in opponent_bookings]
+    
     matches = []
+    for opponent_booking in opponent_bookings:
+        match = OpponentMatch(
+            booking=booking,
+            seeker=booking.user,
+            opponent=opponent_booking.user,
+            opponents_needed=booking.opponents_needed,
+            opponents_found=1,
+            status='matched',
+            matched_at=now,
+            created_at=now,
+            updated_at=now
+        )
+        match.validate()
+        matches.append(match)
     
-    opponents_still_needed = booking.opponents_needed
+    # Seeker's booking gets every opponent, each opponent's booking gets the seeker
+    participant_updates = [
+        UpdateOne(
+            {'_id': str(booking.id)},
+            {'$addToSet': {'participants': {'$each': opponent_ids}}, '$set': {'updated_at': now}}
+        )
+    ] + [
+        UpdateOne(
+            {'_id': str(opponent_booking.id)},
+            {'$addToSet': {'participants': seeker_id}, '$set': {'updated_at': now}}
+        )
+        for opponent_booking in opponent_bookings
+    ]
     
-    for candidate in candidates:
-        if opponents_still_needed <= 0:
-            break
-        
-        # Create match
-        match = create_opponent_match(booking, candidate)
-        matches.append(match)
-        opponents_still_needed -= 1
+    match_collection = OpponentMatch._get_collection()
+    booking_collection = Booking._get_collection()
+    client = match_collection.database.client
+    
+    # Denormalized feed documents for both players of every match
+    court_name = booking.court.get_name()
+    feed_documents = []
+    for match, opponent_booking in zip(matches, opponent_bookings):
+        feed_documents.extend(feed_entries(match, booking, booking.user, opponent_booking.user, court_name))
+    feed_collection = MatchFeedEntry._get_collection()
+    
+    def write(session=None):
+        match_collection.insert_many([match.to_mongo() for match in matches], session=session)
+        booking_collection.bulk_write(participant_updates, ordered=False, session=session)
+        feed_collection.insert_many(feed_documents, session=session)
+    
+    if _supports_transactions(client):
+        with client.start_session() as session:
+            session.with_transaction(write)
+    else:
+        write()
+    
+    # Reflect the writes in the loaded documents without marking them changed
+    for match in matches:
+        match._created = False
+        match._clear_changed_fields()
+    for document, user_ids in [(booking, opponent_ids)] + [(b, [seeker_id]) for b in opponent_bookings]:
+        known = set(str(participant.id) if hasattr(participant, 'id') else str(participant)
+                    for participant in document._data.get('participants') or [])
+        document._data['participants'] = list(document._data.get('participants') or []) + [
+            user_id for user_id in user_ids if user_id not in known
+        ]
+        document._data['updated_at'] = now
     
     return matches
 
+
+def create_opponent_match(booking, opponent_booking):
+    """
+    Create a match between two bookings looking for opponents.
+    """
+    return commit_matches(booking, [opponent_booking])[0]
+
+
+def auto_match_opponents(booking, skill_level='any'):
+    """
+    Automatically try to match opponents for a booking.
+    Pairs with seekers waiting in the matchmaking queue for the same slot and
+    queues the booking for the opponents still missing, so seekers that book
+    later match it too.
+    Returns list of created matches.
+    """
+    if not booking.find_opponents:
+        return []
+    
+    from apps.bookings.matchmaking_queue import pair_or_enqueue
+    return pair_or_enqueue(booking, skill_level)
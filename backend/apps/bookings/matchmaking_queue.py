@@ -0,0 +1,270 @@
+"""
+Slot-keyed matchmaking queue
+
+Seekers that still need opponents wait in the matchmaking_queue collection,
+keyed by (court, start, end, skill band). A new seeker pairs by atomically
+popping the oldest compatible entry of its slot with find_one_and_update on
+the (slot_key, enqueued_at) index, so pairing costs a constant number of
+point operations however many bookings exist. Entries disappear through a
+TTL index on expires_at (one hour before the booking starts, as for
+OpponentRequest).
+"""
+from datetime import datetime, timedelta
+from mongoengine import Document, fields
+from pymongo import ReturnDocument
+from apps.core.mongo_utils import reference_id, to_naive_utc
+
+SKILL_BANDS = ['beginner', 'intermediate', 'advanced']
+ANY_SKILL = 'any'
+
+# Queue entries stop being matched this long before the booking starts
+QUEUE_CLOSE_BEFORE_START = timedelta(hours=1)
+
+
+class MatchmakingQueueEntry(Document):
+    """A booking waiting in the matchmaking queue for opponents"""
+
+    # Booking id
+    id = fields.StringField(primary_key=True)
+
+    # "<court_id>:<start ISO>:<end ISO>:<skill band>"
+    slot_key = fields.StringField(required=True)
+    court = fields.StringField(required=True)
+    start_time = fields.DateTimeField(required=True)
+    end_time = fields.DateTimeField(required=True)
+    skill_band = fields.StringField(choices=SKILL_BANDS, required=True)
+
+    user = fields.StringField(required=True)
+    # Skill bands of opponents this seeker accepts
+    accepts = fields.ListField(fields.StringField(choices=SKILL_BANDS))
+    open_slots = fields.IntField(min_value=0, default=1)
+
+    enqueued_at = fields.DateTimeField(default=datetime.utcnow)
+    expires_at = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'matchmaking_queue',
+        'indexes': [
+            [('slot_key', 1), ('enqueued_at', 1)],
+            'user',
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+    def __str__(self):
+        return f"QueueEntry {self.id} - {self.slot_key} ({self.open_slots} open)"
+
+
+def skill_band(experience_level):
+    """Map an experience level (1-7) to a skill band"""
+    level = experience_level or 1
+    if level <= 2:
+        return 'beginner'
+    if level <= 4:
+        return 'intermediate'
+    return 'advanced'
+
+
+def accepted_bands(skill_level=ANY_SKILL):
+    """Get bands accepted for an OpponentRequest.skill_level preference"""
+    if skill_level in SKILL_BANDS:
+        return [skill_level]
+    return list(SKILL_BANDS)
+
+
+def slot_key(court_id, start_time, end_time, band):
+    """Build the queue key of a court slot and skill band"""
+    return f"{court_id}:{to_naive_utc(start_time).isoformat()}:{to_naive_utc(end_time).isoformat()}:{band}"
+
+
+def enqueue(booking, open_slots, band, accepts=None, expires_at=None):
+    """Put a booking in the queue, or refresh its entry"""
+    court_id = reference_id(booking, 'court')
+    start_time = to_naive_utc(booking.start_time)
+    end_time = to_naive_utc(booking.end_time)
+    expires_at = expires_at or start_time - QUEUE_CLOSE_BEFORE_START
+
+    if open_slots <= 0 or expires_at <= datetime.utcnow():
+        dequeue(booking.id)
+        return
+
+    MatchmakingQueueEntry._get_collection().update_one(
+        {'_id': str(booking.id)},
+        {
+            '$set': {
+                'slot_key': slot_key(court_id, start_time, end_time, band),
+                'court': court_id,
+                'start_time': start_time,
+                'end_time': end_time,
+                'skill_band': band,
+                'user': reference_id(booking, 'user'),
+                'accepts': accepts or list(SKILL_BANDS),
+                'open_slots': open_slots,
+                'expires_at': to_naive_utc(expires_at),
+            },
+            '$setOnInsert': {'enqueued_at': datetime.utcnow()},
+        },
+        upsert=True
+    )
+
+
+def dequeue(booking_id):
+    """Remove a booking from the queue"""
+    MatchmakingQueueEntry._get_collection().delete_one({'_id': str(booking_id)})
+
+
+def pop_opponent(booking, band, wanted_bands):
+    """
+    Atomically take one open slot from the oldest compatible waiting entry.
+
+    Bands are tried in order, the seeker's own band first.
+
+    Returns:
+        dict or None: the entry (before the pop)
+    """
+    collection = MatchmakingQueueEntry._get_collection()
+    court_id = reference_id(booking, 'court')
+    now = datetime.utcnow()
+
+    if band in wanted_bands:
+        ordered_bands = [band] + [b for b in wanted_bands if b != band]
+    else:
+        ordered_bands = wanted_bands
+    for wanted in ordered_bands:
+        entry = collection.find_one_and_update(
+            {
+                'slot_key': slot_key(court_id, booking.start_time, booking.end_time, wanted),
+                'open_slots': {'$gt': 0},
+                'accepts': band,
+                'user': {'$ne': reference_id(booking, 'user')},
+                '_id': {'$ne': str(booking.id)},
+                'expires_at': {'$gt': now},
+            },
+            {'$inc': {'open_slots': -1}},
+            sort=[('enqueued_at', 1)],
+            return_document=ReturnDocument.BEFORE
+        )
+        if entry:
+            if entry['open_slots'] <= 1:
+                collection.delete_one({'_id': entry['_id'], 'open_slots': {'$lte': 0}})
+            return entry
+    return None
+
+
+def restore_popped(entries):
+    """Give back the open slots taken from popped entries (re-inserting deleted ones)"""
+    collection = MatchmakingQueueEntry._get_collection()
+    for entry in entries:
+        collection.update_one(
+            {'_id': entry['_id']},
+            {
+                '$inc': {'open_slots': 1},
+                '$setOnInsert': {
+                    key: value for key, value in entry.items() if key not in ('_id', 'open_slots')
+                },
+            },
+            upsert=True
+        )
+
+
+def pair_or_enqueue(booking, skill_level=ANY_SKILL):
+    """
+    Pair a seeker booking with waiting seekers of the same slot, then queue
+    it for the opponents still missing.
+
+    Returns:
+        list: created OpponentMatch documents
+    """
+    from apps.bookings.models import Booking
+    from apps.bookings.matching import commit_matches
+
+    if not booking.find_opponents or booking.opponents_needed <= 0:
+        return []
+
+    band = skill_band(booking.user.experience_level)
+    wanted_bands = accepted_bands(skill_level)
+
+    popped = []
+    while len(popped) < booking.opponents_needed:
+        entry = pop_opponent(booking, band, wanted_bands)
+        if not entry:
+            break
+        popped.append(entry)
+
+    matches = []
+    if popped:
+        popped_ids = [entry['_id'] for entry in popped]
+        try:
+            opponents = Booking.objects(id__in=popped_ids, status__in=['pending', 'confirmed']).select_related()
+            by_id = {str(opponent.id): opponent for opponent in opponents}
+            opponent_bookings = [by_id[booking_id] for booking_id in popped_ids if booking_id in by_id]
+            # All matches and participant updates in one batch
+            matches = commit_matches(booking, opponent_bookings)
+        except Exception:
+            # The pops already took the waiting seekers' slots
+            restore_popped(popped)
+            raise
+
+    enqueue(booking, booking.opponents_needed - len(matches), band, wanted_bands)
+    return matches
+
+
+def seed_from_bookings():
+    """
+    Queue every active future booking that still needs opponents.
+
+    Skill preferences come from the booking's OpponentRequest when one
+    exists; other bookings accept any band.
+
+    Returns:
+        int: number of entries written
+    """
+    from apps.bookings.models import Booking
+    from apps.bookings.matching import OpponentRequest, OpponentMatch, FILLED_MATCH_STATUSES
+    from apps.users.models import User
+
+    now = datetime.utcnow()
+    # Uses the partial (start_time, court) index of bookings looking for opponents
+    bookings = list(Booking.objects(
+        find_opponents=True,
+        opponents_needed__gt=0,
+        status__in=['pending', 'confirmed'],
+        start_time__gt=now + QUEUE_CLOSE_BEFORE_START
+    ).only('id', 'user', 'court', 'start_time', 'end_time', 'opponents_needed'))
+    if not bookings:
+        return 0
+
+    booking_ids = [str(booking.id) for booking in bookings]
+
+    # Matches already made per booking, in one grouped count
+    filled = {
+        row['_id']: row['count']
+        for row in OpponentMatch.objects(
+            booking__in=booking_ids, status__in=FILLED_MATCH_STATUSES
+        ).aggregate([{'$group': {'_id': '$booking', 'count': {'$sum': 1}}}])
+    }
+    skill_levels = {
+        reference_id(request, 'booking'): request.skill_level
+        for request in OpponentRequest.objects(booking__in=booking_ids, is_active=True).only('booking', 'skill_level')
+    }
+    levels = {
+        str(row['_id']): row.get('experience_level')
+        for row in User.objects(
+            id__in=list(set(reference_id(booking, 'user') for booking in bookings))
+        ).only('experience_level').as_pymongo()
+    }
+
+    written = 0
+    for booking in bookings:
+        booking_id = str(booking.id)
+        open_slots = booking.opponents_needed - filled.get(booking_id, 0)
+        if open_slots <= 0:
+            continue
+        enqueue(
+            booking,
+            open_slots,
+            skill_band(levels.get(reference_id(booking, 'user'))),
+            accepted_bands(skill_levels.get(booking_id, ANY_SKILL))
+        )
+        written += 1
+    return written
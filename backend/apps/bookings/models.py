@@ -4,6 +4,7 @@ Booking models for MongoDB
 import uuid
 from datetime import datetime
 from mongoengine import Document, fields
+from apps.core.mongo_utils import reference_id
 from apps.users.models import User
 from apps.courts.models import Court
 
@@ -82,7 +83,13 @@ class Booking(Document):
             'created_at',
             'payment_status',
             [('court', 1), ('start_time', 1), ('end_time', 1)],  # Compound index for availability checks
-            [('user', 1), ('start_time', -1)],  # User's bookings sorted by time
+            [('user', 1), ('start_time', -1), ('id', -1)],  # User's bookings sorted by time (cursor pagination)
+            [('status', 1), ('end_time', 1)],  # Completing finished bookings
+            [('status', 1), ('start_time', 1)],  # Expiring stale pending bookings
+            {  # Flexible opponent matching: only bookings looking for opponents
+                'fields': [('start_time', 1), ('court', 1)],
+                'partialFilterExpression': {'find_opponents': True},
+            },
         ]
     }
     
@@ -99,7 +106,31 @@ class Booking(Document):
         if self.start_time and self.end_time and self.start_time >= self.end_time:
             raise ValueError("End time must be after start time")
         
-        return super().save(*args, **kwargs)
+        is_new = self._created
+        status_changed = not is_new and 'status' in getattr(self, '_changed_fields', [])
+        result = super().save(*args, **kwargs)
+        
+        # Keep match feed entries of this booking in sync
+        if status_changed:
+            from apps.bookings.match_feed import update_booking_status
+            update_booking_status([self.id], self.status)
+        
+        # Matching, notifications and statistics run off the request path
+        if is_new or (status_changed and self.status == 'cancelled'):
+            from apps.core.events import publish, BOOKING_CREATED, BOOKING_CANCELLED
+            from apps.bookings.handlers import booking_payload
+            publish(BOOKING_CREATED if is_new else BOOKING_CANCELLED, booking_payload(self))
+        
+        # Keep the in-process interval index in sync
+        from apps.bookings.interval_index import booking_index
+        booking_index.apply(self)
+        
+        # Mark the court's occupancy bitmap for new active bookings
+        if is_new and self.status in ['confirmed', 'pending']:
+            from apps.courts.occupancy import mark_booked
+            mark_booked(reference_id(self, 'court'), self.start_time, self.end_time)
+        
+        return result
     
     def clean(self):
         """Validation before saving"""
@@ -107,16 +138,21 @@ class Booking(Document):
             if self.start_time >= self.end_time:
                 raise ValueError("End time must be after start time")
             
+            # Slot claims and occupancy bits work on the slot grid
+            if self._created:
+                from apps.bookings.slot_claims import alignment_error
+                error = alignment_error(self.start_time, self.end_time)
+                if error:
+                    raise ValueError(error)
+            
             # Check for overlapping bookings (only for new bookings)
             if not self.pk:  # New booking
-                overlapping = Booking.objects(
-                    court=self.court,
-                    status__in=['confirmed', 'pending'],
-                    start_time__lt=self.end_time,
-                    end_time__gt=self.start_time
-                ).count()
+                from apps.bookings.interval_index import booking_index
+                overlapping = booking_index.find_conflicts(
+                    reference_id(self, 'court'), self.start_time, self.end_time
+                )
                 
-                if overlapping > 0:
+                if overlapping:
                     raise ValueError("This time slot is already booked")
     
     def duration_hours(self):
@@ -147,6 +183,38 @@ class Booking(Document):
         self.cancellation_reason = reason
         self.cancelled_at = datetime.utcnow()
         self.save()
+        
+        self._release_time_slot()
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to free the court time and weekly quota"""
+        if self.status in ['confirmed', 'pending']:
+            self._release_time_slot()
+        elif self.status == 'completed':
+            from apps.bookings.week_usage import decrement_usage
+            decrement_usage(reference_id(self, 'user'), self.start_time)
+        
+        result = super().delete(*args, **kwargs)
+        
+        from apps.bookings.interval_index import booking_index
+        booking_index.discard(self.id)
+        
+        # Matches of a deleted booking must leave the players' feeds
+        from apps.bookings.match_feed import MatchFeedEntry
+        MatchFeedEntry._get_collection().delete_many({'booking.id': str(self.id)})
+        
+        return result
+    
+    def _release_time_slot(self):
+        """Free the slot claims, occupancy bits and weekly quota held by this booking"""
+        from apps.bookings.slot_claims import release_slots
+        from apps.bookings.week_usage import decrement_usage
+        from apps.bookings.matchmaking_queue import dequeue
+        from apps.courts.occupancy import clear_booked
+        release_slots(self.id)
+        dequeue(self.id)
+        clear_booked(reference_id(self, 'court'), self.start_time, self.end_time, self.id)
+        decrement_usage(reference_id(self, 'user'), self.start_time)
     
     def confirm(self):
         """Confirm the booking"""
@@ -159,3 +227,7 @@ class Booking(Document):
         if self.status == 'confirmed':
             self.status = 'completed'
             self.save()
+            
+            # The slot stays occupied and keeps counting against the weekly limit
+            from apps.bookings.slot_claims import release_slots
+            release_slots(self.id)
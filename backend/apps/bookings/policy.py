@@ -0,0 +1,144 @@
+"""
+Booking policy engine
+
+A subscription plan's features and booking_limits are compiled once into a
+BookingPolicy (cached per plan id and updated_at) which evaluates one or
+many candidate slots in memory. Weekly usage is passed in by the caller, so
+a whole day of slots is checked with a single usage read.
+"""
+import threading
+from datetime import timedelta
+from apps.bookings.week_usage import week_key, week_start_of
+from apps.core.mongo_utils import to_naive_utc
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class BookingPolicy:
+    """Booking rules compiled from a subscription plan"""
+
+    def __init__(self, plan):
+        features = plan.features or {}
+        booking_limits = plan.booking_limits or {}
+
+        self.plan_id = str(plan.id)
+        self.version = plan.updated_at
+        self.court_booking = bool(features.get('court_booking', False))
+        self.equipment_rental = bool(features.get('equipment_rental', False))
+        self.allowed_days = list(booking_limits.get('allowed_days', []) or [])
+        self._allowed_days = frozenset(self.allowed_days)
+        self.max_duration_hours = booking_limits.get('max_duration_hours', 0) or 0
+        self.bookings_per_week = booking_limits.get('bookings_per_week', 0) or 0
+
+    def is_day_allowed(self, day_of_week):
+        """Check ISO day of week (1=Monday) against allowed days"""
+        return not self._allowed_days or day_of_week in self._allowed_days
+
+    def check(self, start_time, end_time, week_count=0):
+        """
+        Evaluate one slot.
+
+        Args:
+            week_count: bookings already counted in the slot's week
+
+        Returns:
+            tuple: (errors, warnings) lists of dicts with 'code' and 'message'
+        """
+        errors = []
+        warnings = []
+        duration_hours = (end_time - start_time).total_seconds() / 3600
+        day_of_week = start_time.isoweekday()
+
+        if not self.court_booking:
+            errors.append({
+                'code': 'FEATURE_NOT_AVAILABLE',
+                'message': 'Your subscription does not include court booking',
+                'field': 'subscription'
+            })
+
+        if not self.is_day_allowed(day_of_week):
+            allowed_day_names = [DAY_NAMES[d - 1] for d in self.allowed_days]
+            errors.append({
+                'code': 'DAY_NOT_ALLOWED',
+                'message': f'Booking only allowed on: {", ".join(allowed_day_names)}',
+                'field': 'start_time',
+                'allowed_days': self.allowed_days,
+                'requested_day': day_of_week,
+                'requested_day_name': DAY_NAMES[day_of_week - 1]
+            })
+
+        if self.max_duration_hours > 0 and duration_hours > self.max_duration_hours:
+            errors.append({
+                'code': 'DURATION_EXCEEDS_LIMIT',
+                'message': f'Maximum booking duration is {self.max_duration_hours} hours. You requested {duration_hours} hours',
+                'field': 'duration',
+                'max_duration_hours': self.max_duration_hours,
+                'requested_duration_hours': duration_hours
+            })
+
+        if self.bookings_per_week > 0:
+            week_start = week_start_of(start_time)
+            next_week_start = week_start + timedelta(days=7)
+
+            if week_count >= self.bookings_per_week:
+                days_until_next_week = (next_week_start - to_naive_utc(start_time)).days
+                errors.append({
+                    'code': 'WEEKLY_LIMIT_REACHED',
+                    'message': f'Weekly booking limit ({self.bookings_per_week}) reached. You have {week_count} booking(s) this week',
+                    'field': 'weekly_limit',
+                    'bookings_per_week': self.bookings_per_week,
+                    'current_week_bookings': week_count,
+                    'current_week_start': week_start.isoformat(),
+                    'current_week_end': next_week_start.isoformat(),
+                    'next_available_date': next_week_start.isoformat(),
+                    'days_until_available': days_until_next_week,
+                })
+            elif week_count >= self.bookings_per_week - 1:
+                warnings.append({
+                    'code': 'WEEKLY_LIMIT_NEAR',
+                    'message': f'This will be your last booking this week ({week_count + 1}/{self.bookings_per_week}). Next booking available from {next_week_start.strftime("%A, %B %d")}',
+                    'next_available_date': next_week_start.isoformat()
+                })
+
+        return errors, warnings
+
+    def evaluate(self, user_id, slots, week_counts):
+        """
+        Evaluate many candidate slots at once.
+
+        Args:
+            slots: list of (start_time, end_time)
+            week_counts: {week_key: count} as returned by get_usage_counts()
+
+        Returns:
+            list of dicts: start_time, end_time, allowed, errors (codes)
+        """
+        results = []
+        for start_time, end_time in slots:
+            week_count = week_counts.get(week_key(user_id, start_time), 0)
+            errors, _ = self.check(start_time, end_time, week_count)
+            results.append({
+                'start_time': start_time,
+                'end_time': end_time,
+                'allowed': not errors,
+                'errors': [error['code'] for error in errors],
+            })
+        return results
+
+
+_policy_cache = {}
+_policy_cache_lock = threading.Lock()
+
+
+def get_policy(plan):
+    """Get the compiled policy of a plan, recompiling when the plan changes"""
+    key = (str(plan.id), plan.updated_at)
+    policy = _policy_cache.get(key)
+    if policy is None:
+        policy = BookingPolicy(plan)
+        with _policy_cache_lock:
+            # Drop older versions of the same plan
+            for cached_key in [k for k in _policy_cache if k[0] == key[0]]:
+                del _policy_cache[cached_key]
+            _policy_cache[key] = policy
+    return policy
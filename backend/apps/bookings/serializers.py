@@ -5,13 +5,15 @@ from rest_framework import serializers
 from apps.core.mongoengine_drf import MongoEngineModelSerializer
 from apps.bookings.models import Booking
 from apps.users.serializers import UserPublicSerializer
-from apps.courts.serializers import CourtListSerializer
+from apps.courts.read_models import get_court_list_items, get_court_names
+from apps.core.mongo_utils import reference_id
+from apps.bookings.slot_claims import alignment_error
 
 
 class BookingSerializer(MongoEngineModelSerializer):
     """Full booking serializer"""
     user_details = UserPublicSerializer(source='user', read_only=True)
-    court_details = CourtListSerializer(source='court', read_only=True)
+    court_details = serializers.SerializerMethodField()
     
     class Meta:
         model = Booking
@@ -23,7 +25,17 @@ class BookingSerializer(MongoEngineModelSerializer):
             'payment_method', 'payment_status', 'notes',
             'created_at', 'updated_at', 'user_details', 'court_details'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        # Slot claims, occupancy and weekly quota follow user/court/time/status,
+        # so those only change through creation and the cancel/confirm endpoints
+        read_only_fields = [
+            'id', 'user', 'court', 'start_time', 'end_time', 'status',
+            'created_at', 'updated_at'
+        ]
+    
+    def get_court_details(self, obj):
+        """Court list item, read with a projection instead of the full court"""
+        court_id = reference_id(obj, 'court')
+        return get_court_list_items([court_id]).get(court_id)
     
     def validate(self, data):
         """Validate booking data"""
@@ -50,6 +62,13 @@ class BookingCreateSerializer(MongoEngineModelSerializer):
     
     def validate(self, data):
         """Validate booking data"""
+        start_time = data.get('start_time')
+        end_time = data.get('end_time')
+        if start_time and end_time:
+            error = alignment_error(start_time, end_time)
+            if error:
+                raise serializers.ValidationError({'start_time': error})
+        
         # Validate opponents logic
         if data.get('find_opponents', False):
             opponents_needed = data.get('opponents_needed', 0)
@@ -90,6 +109,15 @@ class BookingCreateSerializer(MongoEngineModelSerializer):
         return super().create(validated_data)
 
 
+class BookingListListSerializer(serializers.ListSerializer):
+    """Loads the court names of a whole page with one projected query"""
+    
+    def to_representation(self, data):
+        bookings = list(data)
+        self.child.court_names = get_court_names(reference_id(booking, 'court') for booking in bookings)
+        return super().to_representation(bookings)
+
+
 class BookingListSerializer(MongoEngineModelSerializer):
     """Booking list serializer (minimal fields)"""
     court_name = serializers.SerializerMethodField()
@@ -102,9 +130,12 @@ class BookingListSerializer(MongoEngineModelSerializer):
             'equipment_needed', 'equipment_details',
             'payment_status', 'created_at'
         ]
+        list_serializer_class = BookingListListSerializer
     
     def get_court_name(self, obj):
         """Get court name in default language"""
-        if obj.court and obj.court.name_i18n:
-            return obj.court.get_name()
-        return ""
+        court_id = reference_id(obj, 'court')
+        court_names = getattr(self, 'court_names', None)
+        if court_names is None or court_id not in court_names:
+            court_names = get_court_names([court_id])
+        return court_names.get(court_id, "")
@@ -0,0 +1,184 @@
+"""
+Atomic slot-claim reservations for bookings
+
+Every booking claims the fixed-size time buckets it covers on its court.
+A claim's _id is "<court_id>:<bucket_start>", so MongoDB's unique _id index
+guarantees that two active bookings can never hold the same bucket: all
+claims of a booking are written with one insert_many and either all
+succeed or the booking is rejected.
+
+Booking start and end times must lie on the BOOKING_SLOT_MINUTES grid
+(see alignment_error): back-to-back bookings off the grid would share a
+bucket and falsely conflict.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from mongoengine import Document, fields
+from pymongo.errors import BulkWriteError
+from apps.core.mongo_utils import to_naive_utc
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class SlotClaim(Document):
+    """Claim of one time bucket of a court by a booking"""
+
+    # "<court_id>:<bucket_start ISO>"
+    id = fields.StringField(primary_key=True)
+
+    court = fields.StringField(required=True)
+    bucket_start = fields.DateTimeField(required=True)
+    booking_id = fields.StringField(required=True)
+
+    # Claims are removed by a TTL index once the booked time is over
+    expires_at = fields.DateTimeField(required=True)
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'booking_slot_claims',
+        'indexes': [
+            'booking_id',
+            [('court', 1), ('bucket_start', 1)],
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+    def __str__(self):
+        return f"SlotClaim {self.id} - booking {self.booking_id}"
+
+
+def get_slot_minutes():
+    """Get claim bucket size in minutes"""
+    return getattr(settings, 'BOOKING_SLOT_MINUTES', 15)
+
+
+def is_aligned(moment):
+    """Check that a time lies on the slot grid (whole slots from midnight)"""
+    moment = to_naive_utc(moment)
+    day = datetime(moment.year, moment.month, moment.day)
+    return (moment - day) % timedelta(minutes=get_slot_minutes()) == timedelta(0)
+
+
+def alignment_error(start_time, end_time):
+    """Get an error message when a booking time range is off the slot grid, else None"""
+    if is_aligned(start_time) and is_aligned(end_time):
+        return None
+    return f'Start and end times must be on a {get_slot_minutes()}-minute boundary'
+
+
+def slot_buckets(start_time, end_time):
+    """List bucket start times covering [start_time, end_time)"""
+    start_time = to_naive_utc(start_time)
+    end_time = to_naive_utc(end_time)
+    step = timedelta(minutes=get_slot_minutes())
+
+    day = datetime(start_time.year, start_time.month, start_time.day)
+    bucket = day + ((start_time - day) // step) * step
+
+    buckets = []
+    while bucket < end_time:
+        buckets.append(bucket)
+        bucket += step
+    return buckets
+
+
+def claim_key(court_id, bucket_start):
+    """Build the unique claim key of a court bucket"""
+    return f"{court_id}:{bucket_start.isoformat()}"
+
+
+def claim_slots(court_id, start_time, end_time, booking_id):
+    """
+    Claim all buckets of a time range for a booking in one round trip.
+
+    Returns:
+        bool: True if every bucket was claimed, False if any was already taken
+              (partially written claims are released)
+    """
+    court_id = str(court_id)
+    booking_id = str(booking_id)
+    expires_at = to_naive_utc(end_time)
+    now = datetime.utcnow()
+
+    docs = [
+        {
+            '_id': claim_key(court_id, bucket),
+            'court': court_id,
+            'bucket_start': bucket,
+            'booking_id': booking_id,
+            'expires_at': expires_at,
+            'created_at': now,
+        }
+        for bucket in slot_buckets(start_time, end_time)
+    ]
+    if not docs:
+        return True
+
+    try:
+        SlotClaim._get_collection().insert_many(docs, ordered=True)
+    except BulkWriteError as e:
+        release_slots(booking_id)
+        write_errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY_ERROR for error in write_errors):
+            raise
+        return False
+
+    return True
+
+
+def claim_many(court_id, ranges):
+    """
+    Claim buckets of several bookings on one court with a single insert_many.
+
+    Args:
+        ranges: list of (start_time, end_time, booking_id)
+
+    Returns:
+        set: ids of bookings that could not claim every bucket (their
+             partially written claims are released)
+    """
+    court_id = str(court_id)
+    now = datetime.utcnow()
+
+    docs = []
+    for start_time, end_time, booking_id in ranges:
+        expires_at = to_naive_utc(end_time)
+        for bucket in slot_buckets(start_time, end_time):
+            docs.append({
+                '_id': claim_key(court_id, bucket),
+                'court': court_id,
+                'bucket_start': bucket,
+                'booking_id': str(booking_id),
+                'expires_at': expires_at,
+                'created_at': now,
+            })
+    if not docs:
+        return set()
+
+    try:
+        SlotClaim._get_collection().insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY_ERROR for error in write_errors):
+            release_slots_many([booking_id for _, _, booking_id in ranges])
+            raise
+        failed = set(docs[error['index']]['booking_id'] for error in write_errors)
+        release_slots_many(failed)
+        return failed
+
+    return set()
+
+
+def release_slots(booking_id):
+    """Release all claims held by a booking"""
+    result = SlotClaim._get_collection().delete_many({'booking_id': str(booking_id)})
+    return result.deleted_count
+
+
+def release_slots_many(booking_ids):
+    """Release all claims held by several bookings"""
+    booking_ids = [str(booking_id) for booking_id in booking_ids]
+    if not booking_ids:
+        return 0
+    result = SlotClaim._get_collection().delete_many({'booking_id': {'$in': booking_ids}})
+    return result.deleted_count
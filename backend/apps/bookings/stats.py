@@ -0,0 +1,187 @@
+"""
+Daily booking statistics rollup
+
+booking_stats_daily holds one document per (day, court) with the number of
+bookings created and cancelled and matches made that day. The counters are
+incremented by domain event handlers, so report endpoints read a few
+rollup documents instead of counting bookings; rebuild_booking_stats()
+recomputes the whole rollup from bookings and matches.
+"""
+from datetime import datetime
+from mongoengine import Document, fields
+
+COUNTERS = ['bookings_created', 'bookings_cancelled', 'matches_created']
+
+
+class BookingDailyStats(Document):
+    """Booking counters of one court for one day"""
+
+    # "<YYYY-MM-DD>:<court_id>"
+    id = fields.StringField(primary_key=True)
+
+    date = fields.DateTimeField(required=True)  # midnight UTC
+    court = fields.StringField(required=True)
+
+    bookings_created = fields.IntField(default=0)
+    bookings_cancelled = fields.IntField(default=0)
+    matches_created = fields.IntField(default=0)
+
+    meta = {
+        'collection': 'booking_stats_daily',
+        'indexes': [
+            [('date', 1), ('court', 1)],
+            [('court', 1), ('date', 1)],
+        ]
+    }
+
+    def __str__(self):
+        return f"BookingStats {self.id}"
+
+
+def day_of(moment):
+    """Get midnight UTC of a datetime"""
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def day_of_expression(field):
+    """Aggregation expression of midnight UTC of a date field"""
+    return {'$dateFromParts': {
+        'year': {'$year': field},
+        'month': {'$month': field},
+        'day': {'$dayOfMonth': field},
+    }}
+
+
+def increment(court_id, moment, counter, amount=1):
+    """Add to one counter of a court's day"""
+    day = day_of(moment)
+    BookingDailyStats._get_collection().update_one(
+        {'_id': f"{day.date().isoformat()}:{court_id}"},
+        {
+            '$inc': {counter: amount},
+            '$setOnInsert': {'date': day, 'court': str(court_id)},
+        },
+        upsert=True
+    )
+
+
+def get_daily_totals(start_date, end_date, court_id=None):
+    """
+    Sum counters per day over all (or one) courts.
+
+    Returns:
+        dict: midnight datetime -> {counter: value}
+    """
+    match = {'date': {'$gte': day_of(start_date), '$lte': day_of(end_date)}}
+    if court_id:
+        match['court'] = str(court_id)
+    rows = BookingDailyStats._get_collection().aggregate([
+        {'$match': match},
+        {'$group': dict(
+            {'_id': '$date'},
+            **{counter: {'$sum': f'${counter}'} for counter in COUNTERS}
+        )},
+    ])
+    return {row.pop('_id'): row for row in rows}
+
+
+def get_court_totals(limit, start_date=None, court_ids=None):
+    """
+    Get courts with the most bookings created.
+
+    Returns:
+        list of {'court': court_id, counters...}, most booked first
+    """
+    match = {}
+    if start_date:
+        match['date'] = {'$gte': day_of(start_date)}
+    if court_ids is not None:
+        match['court'] = {'$in': [str(court_id) for court_id in court_ids]}
+    pipeline = [{'$match': match}] if match else []
+    pipeline += [
+        {'$group': dict(
+            {'_id': '$court'},
+            **{counter: {'$sum': f'${counter}'} for counter in COUNTERS}
+        )},
+        {'$sort': {'bookings_created': -1}},
+        {'$limit': limit},
+        {'$addFields': {'court': '$_id'}},
+        {'$project': {'_id': 0}},
+    ]
+    return list(BookingDailyStats._get_collection().aggregate(pipeline))
+
+
+def rebuild_booking_stats():
+    """
+    Recompute the rollup from bookings and matches.
+
+    Returns:
+        int: number of (day, court) documents written
+    """
+    from apps.bookings.models import Booking
+    from apps.bookings.matching import OpponentMatch, FILLED_MATCH_STATUSES
+
+    rollup = {}
+
+    def add(court_id, moment, counter, amount):
+        if not court_id or not moment:
+            return
+        day = day_of(moment)
+        key = f"{day.date().isoformat()}:{court_id}"
+        doc = rollup.setdefault(key, dict({'date': day, 'court': str(court_id)}, **{c: 0 for c in COUNTERS}))
+        doc[counter] += amount
+
+    day_expression = day_of_expression('$created_at')
+    for row in Booking.objects.aggregate([
+        {'$group': {'_id': {'court': '$court', 'day': day_expression}, 'count': {'$sum': 1}}},
+    ]):
+        add(row['_id']['court'], row['_id']['day'], 'bookings_created', row['count'])
+
+    for row in Booking.objects(status='cancelled', cancelled_at__ne=None).aggregate([
+        {'$group': {
+            '_id': {'court': '$court', 'day': day_of_expression('$cancelled_at')},
+            'count': {'$sum': 1},
+        }},
+    ]):
+        add(row['_id']['court'], row['_id']['day'], 'bookings_cancelled', row['count'])
+
+    for row in OpponentMatch.objects(status__in=FILLED_MATCH_STATUSES).aggregate([
+        {'$lookup': {
+            'from': Booking._get_collection_name(),
+            'localField': 'booking',
+            'foreignField': '_id',
+            'as': 'booking_doc',
+        }},
+        {'$unwind': '$booking_doc'},
+        {'$group': {
+            '_id': {'court': '$booking_doc.court', 'day': day_expression},
+            'count': {'$sum': 1},
+        }},
+    ]):
+        add(row['_id']['court'], row['_id']['day'], 'matches_created', row['count'])
+
+    collection = BookingDailyStats._get_collection()
+    collection.delete_many({})
+    if rollup:
+        collection.insert_many([dict(doc, _id=key) for key, doc in rollup.items()])
+    return len(rollup)
+
+
+# Domain event handlers (see settings.DOMAIN_EVENT_HANDLERS)
+
+def count_booking_created(event):
+    """booking.created: count the booking on its court's creation day"""
+    payload = event['payload']
+    increment(payload['court_id'], datetime.fromisoformat(event['occurred_at']), 'bookings_created')
+
+
+def count_booking_cancelled(event):
+    """booking.cancelled: count the cancellation on its court's day"""
+    payload = event['payload']
+    increment(payload['court_id'], datetime.fromisoformat(event['occurred_at']), 'bookings_cancelled')
+
+
+def count_match_created(event):
+    """match.created: count the match on its court's day"""
+    payload = event['payload']
+    increment(payload['court_id'], datetime.fromisoformat(event['occurred_at']), 'matches_created')
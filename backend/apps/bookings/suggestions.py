@@ -0,0 +1,193 @@
+"""
+Next available slot suggestions
+
+When a requested slot is taken, the next free slots of the same duration
+are searched on the requested court and on the nearest courts of the same
+type. Each court's busy time (active bookings from the interval index and
+admin blocks from the occupancy bitmaps) is a list of intervals sorted by
+start; free slots are produced by sweeping the gaps between them, and the
+per-court slot streams are merged by start time with heapq.merge. Data for
+all courts and days is loaded with a fixed number of bulk reads, never one
+query per slot.
+"""
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+from django.conf import settings
+from apps.bookings.interval_index import booking_index, day_start, days_between
+from apps.bookings.slot_claims import get_slot_minutes
+from apps.bookings.week_usage import get_usage_counts, week_key
+from apps.core.mongo_utils import to_naive_utc
+from apps.courts.occupancy import day_runs, get_occupancy
+from apps.courts.read_models import court_name
+
+# Distance between suggested slot starts after a busy interval
+SUGGESTION_STEP = timedelta(minutes=30)
+
+
+def get_search_days():
+    """Get how many days after the requested start are searched"""
+    return getattr(settings, 'SLOT_SUGGESTION_DAYS', 7)
+
+
+def get_nearby_courts_count():
+    """Get how many nearby courts are searched besides the requested one"""
+    return getattr(settings, 'SLOT_SUGGESTION_NEARBY_COURTS', 5)
+
+
+def nearby_courts(court, radius_km):
+    """
+    Get the nearest other active courts of the same type.
+
+    Returns:
+        list of raw court list documents (with distance in meters), nearest first
+    """
+    from apps.courts.nearest_free import nearest_courts
+
+    location = court.location
+    if isinstance(location, dict):
+        location = location.get('coordinates')
+    if not location or not get_nearby_courts_count():
+        return []
+    lng, lat = location
+    rows = nearest_courts(lng, lat, radius_km * 1000, court.type, limit=get_nearby_courts_count() + 1)
+    return [row for row in rows if str(row['_id']) != str(court.id)][:get_nearby_courts_count()]
+
+
+def busy_intervals(court_id, days, booking_buckets, occupancy):
+    """
+    Get the busy intervals of a court, sorted by start.
+
+    Bookings are bucketed by start day and sorted inside a bucket; blocked
+    runs come day by day, so both streams are already sorted and only need
+    merging.
+    """
+    bookings = (
+        (entry[0], entry[1])
+        for day in days
+        for entry in booking_buckets[(court_id, day)].entries
+    )
+    blocks = (
+        (run['start_time'], run['end_time'])
+        for day in days
+        for run in day_runs(0, occupancy.get((court_id, day), (0, 0))[1], day)
+        if run['status'] == 'blocked'
+    )
+    return heapq.merge(bookings, blocks)
+
+
+def align_up(moment, origin, step):
+    """Round moment up to the grid origin + n * step"""
+    if moment <= origin:
+        return origin
+    return origin + -((origin - moment) // step) * step
+
+
+def free_slots(busy, window_start, window_end, duration, step=SUGGESTION_STEP):
+    """
+    Sweep the gaps between sorted busy intervals.
+
+    Yields back-to-back (start, end) slots of `duration` inside each gap;
+    after a busy interval the next start is aligned to window_start + n * step.
+    """
+    cursor = window_start
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        gap_end = min(busy_start, window_end)
+        while cursor + duration <= gap_end:
+            yield cursor, cursor + duration
+            cursor += duration
+        if busy_start >= window_end:
+            return
+        cursor = max(cursor, align_up(busy_end, window_start, step))
+
+    while cursor + duration <= window_end:
+        yield cursor, cursor + duration
+        cursor += duration
+
+
+def policy_filter(slots, policy, user_id, week_counts):
+    """Keep slots the user's booking policy allows"""
+    for start_time, end_time in slots:
+        week_count = week_counts.get(week_key(user_id, start_time), 0)
+        errors, _ = policy.check(start_time, end_time, week_count)
+        if not errors:
+            yield start_time, end_time
+
+
+def _ranked(slots, rank):
+    for slot_start, slot_end in slots:
+        yield slot_start, rank, slot_end
+
+
+def suggest_slots(court, start_time, end_time, user_id, policy, count=5, radius_km=10.0):
+    """
+    Get the next free slots like [start_time, end_time) on the court and
+    nearby courts of the same type.
+
+    Without a policy (no active subscription) nothing can be booked and no
+    slots are suggested. The duration is capped at the policy's
+    max_duration_hours; slots on disallowed days or in weeks where the
+    weekly limit is reached are skipped.
+
+    Returns:
+        list of dicts: court_id, court_name, distance (km, None for the
+        requested court), start_time, end_time; ordered by start, the
+        requested court first, then nearer courts
+    """
+    start_time = to_naive_utc(start_time)
+    duration = to_naive_utc(end_time) - start_time
+    if policy is None or not policy.court_booking:
+        return []
+    if policy.max_duration_hours > 0:
+        duration = min(duration, timedelta(hours=policy.max_duration_hours))
+    if duration <= timedelta(0) or count <= 0:
+        return []
+
+    # Never suggest the past: keep the grid of the requested start, moved
+    # onto the booking slot grid
+    slot = timedelta(minutes=get_slot_minutes())
+    step = SUGGESTION_STEP if not SUGGESTION_STEP % slot else slot
+    duration = max(slot, (duration // slot) * slot)
+    start_time = day_start(start_time) + ((start_time - day_start(start_time)) // slot) * slot
+    window_start = align_up(datetime.utcnow(), start_time, step)
+    window_end = window_start + timedelta(days=get_search_days())
+
+    courts = [{
+        '_id': str(court.id),
+        'name_i18n': court.name_i18n or {},
+        'distance': None,
+    }] + nearby_courts(court, radius_km)
+    court_ids = [str(row['_id']) for row in courts]
+
+    days = days_between(window_start.date(), window_end.date())
+    # Bookings are bucketed by start day: include the day before the window
+    booking_days = [days[0] - timedelta(days=1)] + days
+    booking_buckets = booking_index.get_buckets(court_ids, booking_days)
+    occupancy = get_occupancy(court_ids, days[0], days[-1])
+
+    week_counts = {}
+    if policy.bookings_per_week > 0:
+        week_counts = get_usage_counts(user_id, [day_start(day) for day in days])
+
+    streams = []
+    for rank, court_id in enumerate(court_ids):
+        slots = free_slots(
+            busy_intervals(court_id, booking_days, booking_buckets, occupancy),
+            window_start, window_end, duration, step
+        )
+        streams.append(_ranked(policy_filter(slots, policy, user_id, week_counts), rank))
+
+    suggestions = []
+    for slot_start, rank, slot_end in islice(heapq.merge(*streams), count):
+        row = courts[rank]
+        distance = row.get('distance')
+        suggestions.append({
+            'court_id': court_ids[rank],
+            'court_name': court_name(row.get('name_i18n')),
+            'distance': round(distance / 1000, 2) if distance is not None else None,
+            'start_time': slot_start,
+            'end_time': slot_end,
+        })
+    return suggestions
@@ -0,0 +1,202 @@
+"""
+Celery tasks for booking lifecycle transitions
+"""
+import time
+from datetime import datetime, timedelta
+from celery import shared_task
+from django.conf import settings
+from apps.bookings.models import Booking
+from apps.bookings.match_feed import MatchFeedEntry, update_booking_status
+from apps.bookings.matchmaking_queue import MatchmakingQueueEntry
+from apps.bookings.slot_claims import release_slots_many
+from apps.bookings.week_usage import decrement_usage, week_key
+from apps.courts.occupancy import clear_booked
+from apps.core.events import publish, BOOKING_CANCELLED
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_max_lookback():
+    """Get how far before the cutoff a lifecycle run looks for bookings"""
+    return timedelta(days=getattr(settings, 'BOOKING_LIFECYCLE_MAX_LOOKBACK_DAYS', 7))
+
+
+def _time_windows(collection, query, time_field, cutoff, window):
+    """
+    Split [oldest matching document, cutoff) into fixed-size windows,
+    starting no earlier than the lookback before the cutoff
+    """
+    oldest = collection.find_one(
+        dict(query, **{time_field: {'$gte': cutoff - get_max_lookback(), '$lt': cutoff}}),
+        {time_field: 1},
+        sort=[(time_field, 1)]
+    )
+    if not oldest:
+        return []
+
+    windows = []
+    window_start = oldest[time_field]
+    while window_start < cutoff:
+        window_end = min(window_start + window, cutoff)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def get_pending_expire_minutes():
+    """Get the grace period after start_time before pending bookings expire (0: never)"""
+    return getattr(settings, 'BOOKING_PENDING_EXPIRE_MINUTES', 0) or 0
+
+
+def complete_finished_bookings(now=None):
+    """
+    Move bookings that have ended to 'completed'.
+
+    Pending bookings are completed too unless pending expiry is enabled, in
+    which case only confirmed ones are. Completed bookings keep their
+    occupancy bits and weekly quota; their slot claims expire through the
+    claims TTL index.
+
+    Returns:
+        int: number of bookings completed
+    """
+    now = now or datetime.utcnow()
+    collection = Booking._get_collection()
+    window = timedelta(hours=getattr(settings, 'BOOKING_LIFECYCLE_WINDOW_HOURS', 24))
+
+    statuses = ['confirmed'] if get_pending_expire_minutes() > 0 else ['confirmed', 'pending']
+    status_query = {'$in': statuses}
+
+    completed = 0
+    for window_start, window_end in _time_windows(collection, {'status': status_query}, 'end_time', now, window):
+        # Uses the (status, end_time) index
+        result = collection.update_many(
+            {'status': status_query, 'end_time': {'$gte': window_start, '$lt': window_end}},
+            {'$set': {'status': 'completed', 'updated_at': now}}
+        )
+        completed += result.modified_count
+        
+        # Same window on the match feed's copy of the booking
+        MatchFeedEntry._get_collection().update_many(
+            {'booking.status': status_query, 'booking.end_time': {'$gte': window_start, '$lt': window_end}},
+            {'$set': {'booking.status': 'completed'}}
+        )
+    return completed
+
+
+def expire_stale_pending_bookings(now=None):
+    """
+    Cancel pending bookings still unconfirmed BOOKING_PENDING_EXPIRE_MINUTES
+    after they started. Disabled when the setting is 0 (the default): clients
+    do not confirm bookings, so pending ones are then completed instead.
+
+    Their slot claims, occupancy bits and weekly quota are released in bulk.
+
+    Returns:
+        int: number of bookings expired
+    """
+    expire_minutes = get_pending_expire_minutes()
+    if expire_minutes <= 0:
+        return 0
+
+    now = now or datetime.utcnow()
+    # MongoDB stores milliseconds; keep the cancelled_at marker comparable
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    collection = Booking._get_collection()
+    window = timedelta(hours=getattr(settings, 'BOOKING_LIFECYCLE_WINDOW_HOURS', 24))
+    cutoff = now - timedelta(minutes=expire_minutes)
+
+    expired = 0
+    for window_start, window_end in _time_windows(collection, {'status': 'pending'}, 'start_time', cutoff, window):
+        window_query = {'status': 'pending', 'start_time': {'$gte': window_start, '$lt': window_end}}
+        candidates = list(collection.find(
+            window_query,
+            {'_id': 1, 'user': 1, 'court': 1, 'start_time': 1, 'end_time': 1, 'find_opponents': 1}
+        ))
+        if not candidates:
+            continue
+
+        # Uses the (status, start_time) index; cancelled_at marks this run's updates
+        result = collection.update_many(
+            dict(window_query, _id={'$in': [row['_id'] for row in candidates]}),
+            {'$set': {
+                'status': 'cancelled',
+                'cancellation_reason': 'expired',
+                'cancelled_at': now,
+                'updated_at': now,
+            }}
+        )
+        if result.modified_count != len(candidates):
+            # Some were confirmed or cancelled in the meantime
+            expired_ids = set(
+                row['_id'] for row in collection.find(
+                    {'_id': {'$in': [row['_id'] for row in candidates]},
+                     'status': 'cancelled', 'cancelled_at': now},
+                    {'_id': 1}
+                )
+            )
+            candidates = [row for row in candidates if row['_id'] in expired_ids]
+
+        _release_expired(candidates)
+        expired += len(candidates)
+    return expired
+
+
+def _release_expired(rows):
+    """Free slot claims, occupancy bits and weekly quota of expired bookings"""
+    if not rows:
+        return
+
+    release_slots_many([row['_id'] for row in rows])
+    update_booking_status([row['_id'] for row in rows], 'cancelled')
+    MatchmakingQueueEntry._get_collection().delete_many({'_id': {'$in': [str(row['_id']) for row in rows]}})
+
+    usage = {}
+    for row in rows:
+        clear_booked(row['court'], row['start_time'], row['end_time'], row['_id'])
+        key = week_key(row['user'], row['start_time'])
+        if key not in usage:
+            usage[key] = [row['user'], row['start_time'], 0]
+        usage[key][2] += 1
+
+    for user_id, moment, amount in usage.values():
+        decrement_usage(user_id, moment, amount)
+
+    for row in rows:
+        publish(BOOKING_CANCELLED, {
+            'booking_id': str(row['_id']),
+            'user_id': str(row['user']),
+            'court_id': str(row['court']),
+            'start_time': row['start_time'].isoformat(),
+            'end_time': row['end_time'].isoformat(),
+            'find_opponents': bool(row.get('find_opponents')),
+            'cancellation_reason': 'expired',
+        })
+
+
+@shared_task
+def process_booking_lifecycle():
+    """Complete finished bookings and expire stale pending ones"""
+    now = datetime.utcnow()
+    started = time.monotonic()
+
+    completed = complete_finished_bookings(now)
+    completed_seconds = time.monotonic() - started
+
+    expired = expire_stale_pending_bookings(now)
+    total_seconds = time.monotonic() - started
+
+    metrics = {
+        'completed': completed,
+        'expired': expired,
+        'complete_seconds': round(completed_seconds, 3),
+        'expire_seconds': round(total_seconds - completed_seconds, 3),
+        'total_seconds': round(total_seconds, 3),
+    }
+    logger.info(
+        f"Booking lifecycle: completed={completed} expired={expired} "
+        f"complete_seconds={metrics['complete_seconds']} expire_seconds={metrics['expire_seconds']} "
+        f"total_seconds={metrics['total_seconds']}"
+    )
+    return metrics
@@ -12,6 +12,10 @@ router.register(r'bookings', views.BookingViewSet, basename='booking')
 urlpatterns = [
     # Check availability
     path('bookings/check-availability/', views.check_availability, name='check-availability'),
+    path('bookings/day-availability/', views.day_availability, name='day-availability'),
+    
+    # Recurring / batch booking
+    path('bookings/batch/', views.batch_create_bookings, name='batch-create-bookings'),
     
     # Weekly booking limits
     path('bookings/weekly-limits/', views.get_weekly_limits, name='weekly-limits'),
@@ -24,6 +28,7 @@ urlpatterns = [
     path('bookings/<uuid:booking_id>/matches/', views_matching.get_booking_matches, name='booking-matches'),
     path('bookings/matches/my/', views_matching.get_my_matches, name='my-matches'),
     path('bookings/matches/find/', views_matching.find_potential_opponents, name='find-opponents'),
+    path('bookings/matches/flexible/', views_matching.find_flexible_opponents_view, name='find-flexible-opponents'),
     
     # User bookings
     path('users/bookings/', views.UserBookingsView.as_view(), name='user-bookings'),
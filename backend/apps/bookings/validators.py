@@ -2,8 +2,109 @@
 Booking validation utilities
 """
 from datetime import datetime, timedelta
+from apps.subscriptions.models import SubscriptionPlan
 from apps.subscriptions.models_user import UserSubscription
 from apps.bookings.models import Booking
+from apps.bookings.policy import get_policy
+from apps.bookings.week_usage import WEEKLY_LIMIT_STATUSES, get_usage_count, week_start_of
+from apps.courts.models import Court
+
+
+def get_active_subscription(user):
+    """
+    Get user's active subscription with its plan in one aggregation.
+    
+    Returns:
+        tuple: (UserSubscription or None, SubscriptionPlan or None)
+    """
+    rows = list(UserSubscription.objects(
+        user=user,
+        status='active',
+        end_date__gte=datetime.now()
+    ).aggregate([
+        {'$limit': 1},
+        {'$lookup': {
+            'from': SubscriptionPlan._get_collection_name(),
+            'localField': 'plan',
+            'foreignField': '_id',
+            'as': 'plan_doc',
+        }},
+    ]))
+    
+    if not rows:
+        return None, None
+    
+    row = rows[0]
+    plan_docs = row.pop('plan_doc', [])
+    subscription = UserSubscription._from_son(row)
+    plan = SubscriptionPlan._from_son(plan_docs[0]) if plan_docs else None
+    if plan:
+        # Avoid a second query when callers access subscription.plan
+        subscription.plan = plan
+    return subscription, plan
+
+
+def get_weekly_usage(user, moment):
+    """
+    Get user's active bookings in the calendar week of `moment` with one aggregation.
+    
+    Returns:
+        dict: week_start, week_end, count, last_booking_start and bookings
+              (sorted by start time, with court names)
+    """
+    week_start = week_start_of(moment)
+    week_end = week_start + timedelta(days=7)
+    
+    rows = list(Booking.objects(
+        user=user,
+        status__in=WEEKLY_LIMIT_STATUSES,
+        start_time__gte=week_start,
+        start_time__lt=week_end
+    ).aggregate([
+        {'$sort': {'start_time': 1}},
+        {'$lookup': {
+            'from': Court._get_collection_name(),
+            'localField': 'court',
+            'foreignField': '_id',
+            'as': 'court_doc',
+        }},
+        {'$group': {
+            '_id': None,
+            'count': {'$sum': 1},
+            'last_booking_start': {'$last': '$start_time'},
+            'bookings': {'$push': {
+                'id': '$_id',
+                'court_id': '$court',
+                'court_name_i18n': {'$arrayElemAt': ['$court_doc.name_i18n', 0]},
+                'start_time': '$start_time',
+                'end_time': '$end_time',
+                'status': '$status',
+            }},
+        }},
+    ]))
+    
+    usage = rows[0] if rows else {'count': 0, 'last_booking_start': None, 'bookings': []}
+    
+    bookings = []
+    for booking in usage['bookings']:
+        court_name_i18n = booking.get('court_name_i18n') or {}
+        bookings.append({
+            'id': str(booking['id']),
+            'court_id': str(booking['court_id']) if booking.get('court_id') else None,
+            'court_name': court_name_i18n.get('tk', '') or 'Unknown',
+            'start_time': booking['start_time'].isoformat(),
+            'end_time': booking['end_time'].isoformat(),
+            'status': booking['status'],
+            'duration_hours': (booking['end_time'] - booking['start_time']).total_seconds() / 3600
+        })
+    
+    return {
+        'week_start': week_start,
+        'week_end': week_end,
+        'count': usage['count'],
+        'last_booking_start': usage['last_booking_start'],
+        'bookings': bookings,
+    }
 
 
 class BookingValidator:
@@ -17,140 +118,76 @@ class BookingValidator:
         self.day_of_week = start_time.isoweekday()
         self.errors = []
         self.warnings = []
+        self.subscription = None
+        self.plan = None
+        self.policy = None
+        self.weekly_usage = None
+        self.db_round_trips = 0
         
     def validate(self):
         """Run all validation checks"""
         self._check_subscription()
         if self.subscription:
-            self._check_feature_access()
-            self._check_day_restriction()
-            self._check_duration_limit()
-            self._check_weekly_limit()
+            self._check_policy()
         
         return len(self.errors) == 0
     
     def _check_subscription(self):
         """Check if user has active subscription"""
-        self.subscription = UserSubscription.objects(
-            user=self.user,
-            status='active',
-            end_date__gte=datetime.now()
-        ).first()
+        self.subscription, self.plan = get_active_subscription(self.user)
+        self.db_round_trips += 1
         
-        if not self.subscription:
+        if not self.subscription or not self.plan:
+            self.subscription = None
             self.errors.append({
                 'code': 'NO_SUBSCRIPTION',
                 'message': 'No active subscription found',
                 'field': 'subscription'
             })
     
-    def _check_feature_access(self):
-        """Check if subscription includes court booking"""
-        if not self.subscription.plan.features.get('court_booking', False):
-            self.errors.append({
-                'code': 'FEATURE_NOT_AVAILABLE',
-                'message': 'Your subscription does not include court booking',
-                'field': 'subscription'
-            })
+    def _load_weekly_usage(self):
+        """Fetch the week's bookings once and reuse them"""
+        if self.weekly_usage is None:
+            self.weekly_usage = get_weekly_usage(self.user, self.start_time)
+            self.db_round_trips += 1
+        return self.weekly_usage
     
-    def _check_day_restriction(self):
-        """Check if booking day is allowed by subscription"""
-        booking_limits = self.subscription.plan.booking_limits or {}
-        allowed_days = booking_limits.get('allowed_days', [])
+    def _check_policy(self):
+        """Check feature access, day, duration and weekly limit with the plan's policy"""
+        self.policy = get_policy(self.plan)
         
-        if allowed_days and self.day_of_week not in allowed_days:
-            day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            allowed_day_names = [day_names[d-1] for d in allowed_days]
-            self.errors.append({
-                'code': 'DAY_NOT_ALLOWED',
-                'message': f'Booking only allowed on: {", ".join(allowed_day_names)}',
-                'field': 'start_time',
-                'allowed_days': allowed_days,
-                'requested_day': self.day_of_week,
-                'requested_day_name': day_names[self.day_of_week - 1]
-            })
-    
-    def _check_duration_limit(self):
-        """Check if booking duration exceeds subscription limit"""
-        booking_limits = self.subscription.plan.booking_limits or {}
-        max_duration = booking_limits.get('max_duration_hours', 0)
+        week_count = 0
+        if self.policy.bookings_per_week > 0:
+            # Point read of the materialized weekly counter
+            week_count = get_usage_count(self.user.id, self.start_time)
+            self.db_round_trips += 1
         
-        if max_duration > 0 and self.duration_hours > max_duration:
-            self.errors.append({
-                'code': 'DURATION_EXCEEDS_LIMIT',
-                'message': f'Maximum booking duration is {max_duration} hours. You requested {self.duration_hours} hours',
-                'field': 'duration',
-                'max_duration_hours': max_duration,
-                'requested_duration_hours': self.duration_hours
-            })
+        errors, warnings = self.policy.check(self.start_time, self.end_time, week_count)
+        
+        for error in errors:
+            if error['code'] == 'WEEKLY_LIMIT_REACHED':
+                self._describe_weekly_limit(error)
+        
+        self.errors.extend(errors)
+        self.warnings.extend(warnings)
     
-    def _check_weekly_limit(self):
-        """Check if user has reached weekly booking limit (calendar week: Monday-Sunday)"""
-        booking_limits = self.subscription.plan.booking_limits or {}
-        bookings_per_week = booking_limits.get('bookings_per_week', 0)
-        
-        if bookings_per_week > 0:
-            # Get start of CALENDAR WEEK (Monday 00:00:00)
-            # If today is Monday (weekday=0), week_start is today
-            # If today is Friday (weekday=4), week_start is 4 days ago (Monday)
-            week_start = self.start_time - timedelta(days=self.start_time.weekday())
-            week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # Week ends on Sunday 23:59:59
-            week_end = week_start + timedelta(days=7)
-            
-            # Calculate next week start (next Monday 00:00:00)
-            next_week_start = week_end
-            
-            # Count user's bookings in current calendar week
-            weekly_bookings = Booking.objects(
-                user=self.user,
-                status__in=['confirmed', 'pending'],
-                start_time__gte=week_start,
-                start_time__lt=week_end
-            ).count()
-            
-            # Get last booking date in current week for better error message
-            last_booking = Booking.objects(
-                user=self.user,
-                status__in=['confirmed', 'pending'],
-                start_time__gte=week_start,
-                start_time__lt=week_end
-            ).order_by('-start_time').first()
-            
-            if weekly_bookings >= bookings_per_week:
-                # Calculate days until next Monday
-                days_until_next_week = (next_week_start - self.start_time).days
-                
-                error_msg = f'Weekly booking limit ({bookings_per_week}) reached. You have {weekly_bookings} booking(s) this week'
-                
-                if last_booking:
-                    last_booking_day = last_booking.start_time.strftime('%A, %B %d')
-                    error_msg += f'. Last booking was on {last_booking_day}'
-                
-                if days_until_next_week > 0:
-                    error_msg += f'. Next booking available from {next_week_start.strftime("%A, %B %d")} (in {days_until_next_week} day(s))'
-                else:
-                    error_msg += f'. Next booking available from next Monday'
-                
-                self.errors.append({
-                    'code': 'WEEKLY_LIMIT_REACHED',
-                    'message': error_msg,
-                    'field': 'weekly_limit',
-                    'bookings_per_week': bookings_per_week,
-                    'current_week_bookings': weekly_bookings,
-                    'current_week_start': week_start.isoformat(),
-                    'current_week_end': week_end.isoformat(),
-                    'next_available_date': next_week_start.isoformat(),
-                    'days_until_available': days_until_next_week,
-                    'last_booking_date': last_booking.start_time.isoformat() if last_booking else None
-                })
-            elif weekly_bookings >= bookings_per_week - 1:
-                self.warnings.append({
-                    'code': 'WEEKLY_LIMIT_NEAR',
-                    'message': f'This will be your last booking this week ({weekly_bookings + 1}/{bookings_per_week}). Next booking available from {next_week_start.strftime("%A, %B %d")}',
-                    'next_available_date': next_week_start.isoformat()
-                })
+    def _describe_weekly_limit(self, error):
+        """Add last booking and next available date to a weekly limit error"""
+        # Get last booking date in current week for better error message
+        last_booking_start = self._load_weekly_usage()['last_booking_start']
+        next_week_start = datetime.fromisoformat(error['next_available_date'])
+        days_until_next_week = error['days_until_available']
+        
+        if last_booking_start:
+            last_booking_day = last_booking_start.strftime('%A, %B %d')
+            error['message'] += f'. Last booking was on {last_booking_day}'
+        
+        if days_until_next_week > 0:
+            error['message'] += f'. Next booking available from {next_week_start.strftime("%A, %B %d")} (in {days_until_next_week} day(s))'
+        else:
+            error['message'] += f'. Next booking available from next Monday'
+        
+        error['last_booking_date'] = last_booking_start.isoformat() if last_booking_start else None
     
     def get_validation_result(self):
         """Get validation result dictionary"""
@@ -159,7 +196,8 @@ class BookingValidator:
             'errors': self.errors,
             'warnings': self.warnings,
             'duration_hours': self.duration_hours,
-            'day_of_week': self.day_of_week
+            'day_of_week': self.day_of_week,
+            'db_round_trips': self.db_round_trips
         }
     
     def get_weekly_booking_info(self):
@@ -167,8 +205,7 @@ class BookingValidator:
         if not self.subscription:
             return None
         
-        booking_limits = self.subscription.plan.booking_limits or {}
-        bookings_per_week = booking_limits.get('bookings_per_week', 0)
+        bookings_per_week = get_policy(self.plan).bookings_per_week
         
         if bookings_per_week == 0:
             return {
@@ -178,68 +215,61 @@ class BookingValidator:
                 'remaining_bookings': None
             }
         
-        # Get current calendar week
-        week_start = self.start_time - timedelta(days=self.start_time.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + timedelta(days=7)
-        
-        # Get user's bookings in current week
-        weekly_bookings_query = Booking.objects(
-            user=self.user,
-            status__in=['confirmed', 'pending'],
-            start_time__gte=week_start,
-            start_time__lt=week_end
-        ).order_by('start_time')
-        
-        weekly_bookings_count = weekly_bookings_query.count()
-        
-        bookings_list = []
-        for booking in weekly_bookings_query:
-            bookings_list.append({
-                'id': str(booking.id),
-                'court_name': booking.court.name if booking.court else 'Unknown',
-                'start_time': booking.start_time.isoformat(),
-                'end_time': booking.end_time.isoformat(),
-                'status': booking.status
-            })
+        usage = self._load_weekly_usage()
+        weekly_bookings_count = usage['count']
         
         return {
             'unlimited': False,
             'bookings_per_week': bookings_per_week,
             'current_week_bookings': weekly_bookings_count,
             'remaining_bookings': max(0, bookings_per_week - weekly_bookings_count),
-            'week_start': week_start.isoformat(),
-            'week_end': week_end.isoformat(),
-            'bookings': bookings_list,
+            'week_start': usage['week_start'].isoformat(),
+            'week_end': usage['week_end'].isoformat(),
+            'bookings': usage['bookings'],
             'limit_reached': weekly_bookings_count >= bookings_per_week
         }
 
 
-def check_time_slot_conflict(court, start_time, end_time, exclude_booking_id=None):
-    """Check if time slot has conflicts with existing bookings"""
-    query = {
-        'court': court,
-        'status__in': ['confirmed', 'pending'],
-        'start_time__lt': end_time,
-        'end_time__gt': start_time
-    }
-    
-    if exclude_booking_id:
-        query['id__ne'] = exclude_booking_id
-    
-    conflicts = Booking.objects(**query)
+def check_time_slot_conflict(court, start_time, end_time, exclude_booking_id=None, use_index=True):
+    """
+    Check if time slot has conflicts with existing bookings.
+    Uses the in-memory interval index unless use_index is False,
+    in which case MongoDB is queried directly (authoritative).
+    """
+    if use_index:
+        from apps.bookings.interval_index import booking_index
+        conflicts = booking_index.find_conflicts(court.id, start_time, end_time, exclude_booking_id)
+    else:
+        query = {
+            'court': court,
+            'status__in': ['confirmed', 'pending'],
+            'start_time__lt': end_time,
+            'end_time__gt': start_time
+        }
+        
+        if exclude_booking_id:
+            query['id__ne'] = exclude_booking_id
+        
+        conflicts = [
+            {
+                'id': str(row['_id']),
+                'start_time': row['start_time'],
+                'end_time': row['end_time'],
+                'status': row['status'],
+            }
+            for row in Booking.objects(**query).only('id', 'start_time', 'end_time', 'status').as_pymongo()
+        ]
     
     conflicting_bookings = []
     for booking in conflicts:
         conflicting_bookings.append({
-            'id': str(booking.id),
-            'start_time': booking.start_time.isoformat(),
-            'end_time': booking.end_time.isoformat(),
-            'status': booking.status,
+            'id': booking['id'],
+            'start_time': booking['start_time'].isoformat(),
+            'end_time': booking['end_time'].isoformat(),
+            'status': booking['status'],
         })
     
     return {
-        'has_conflict': conflicts.count() > 0,
+        'has_conflict': len(conflicting_bookings) > 0,
         'conflicts': conflicting_bookings
     }
-
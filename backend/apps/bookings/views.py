@@ -1,20 +1,27 @@
 """
 Booking views for MongoDB
 """
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from apps.core.mongoengine_drf import MongoEngineModelViewSet
+from apps.core.mongoengine_drf import MongoEngineModelViewSet, MongoEngineCursorPagination
 from apps.bookings.models import Booking
 from apps.bookings.serializers import (
     BookingSerializer, BookingCreateSerializer, BookingListSerializer
 )
-from apps.bookings.validators import BookingValidator, check_time_slot_conflict
+from apps.bookings.validators import (
+    BookingValidator, check_time_slot_conflict, get_active_subscription, get_weekly_usage
+)
+from apps.bookings.slot_claims import alignment_error, claim_slots, get_slot_minutes, release_slots
+from apps.bookings.week_usage import reserve_usage, decrement_usage, get_usage_count, get_usage_counts
+from apps.bookings.policy import get_policy
 from apps.courts.models import Court
 from datetime import datetime
 from dateutil import parser
+from mongoengine import ValidationError as MongoValidationError
+import uuid
 
 
 class BookingViewSet(MongoEngineModelViewSet):
@@ -32,6 +39,16 @@ class BookingViewSet(MongoEngineModelViewSet):
             return BookingListSerializer
         return BookingSerializer
     
+    def perform_update(self, serializer):
+        """Save editable fields; status='cancelled' cancels through Booking.cancel()"""
+        cancel = self.request.data.get('status') == 'cancelled' and serializer.instance.status != 'cancelled'
+        if cancel and not serializer.instance.can_cancel():
+            raise serializers.ValidationError({'status': 'Booking cannot be cancelled'})
+        
+        booking = serializer.save()
+        if cancel:
+            booking.cancel(self.request.data.get('cancellation_reason', ''))
+    
     def create(self, request, *args, **kwargs):
         """Create booking with conflict check and tariff validation"""
         serializer = self.get_serializer(data=request.data)
@@ -58,58 +75,56 @@ class BookingViewSet(MongoEngineModelViewSet):
                     'detail': 'You need an active subscription to rent equipment'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            plan = validator.subscription.plan
-            if not plan.features.get('equipment_rental', False):
+            if not validator.policy.equipment_rental:
                 return Response({
                     'error': 'Equipment rental not available',
                     'detail': 'Your subscription plan does not include equipment rental',
                     'feature': 'equipment_rental'
                 }, status=status.HTTP_403_FORBIDDEN)
         
-        # Check for time slot conflicts
         try:
             court = Court.objects.get(id=court_id)
         except Court.DoesNotExist:
             return Response({'error': 'Court not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        conflict_check = check_time_slot_conflict(court, start_time, end_time)
-        if conflict_check['has_conflict']:
+        # Claim the time slot atomically; a taken bucket means the slot is booked
+        booking_id = uuid.uuid4()
+        if not claim_slots(court.id, start_time, end_time, booking_id):
+            conflict_check = check_time_slot_conflict(court, start_time, end_time, use_index=False)
             return Response({
                 'error': 'Time slot already booked',
                 'detail': 'This court is already booked for the selected time',
                 'conflicts': conflict_check['conflicts']
             }, status=status.HTTP_409_CONFLICT)
         
-        # Create booking
-        booking = serializer.save(user=request.user)
+        # Count the booking against the weekly limit (conditional increment)
+        bookings_per_week = (validator.plan.booking_limits or {}).get('bookings_per_week', 0)
+        if reserve_usage(request.user.id, start_time, bookings_per_week) is None:
+            release_slots(booking_id)
+            return Response({
+                'error': 'Booking validation failed',
+                'validation': {
+                    'valid': False,
+                    'errors': [{
+                        'code': 'WEEKLY_LIMIT_REACHED',
+                        'message': f'Weekly booking limit ({bookings_per_week}) reached',
+                        'field': 'weekly_limit',
+                        'bookings_per_week': bookings_per_week,
+                    }],
+                    'warnings': [],
+                }
+            }, status=status.HTTP_403_FORBIDDEN)
         
-        # Try to auto-match opponents if requested
-        matches = []
-        if booking.find_opponents and booking.opponents_needed > 0:
-            from apps.bookings.matching import auto_match_opponents
-            from apps.notifications.services import notify_opponent_matched, notify_seeker_matched
-            
-            matches = auto_match_opponents(booking)
-            
-            # Send notifications for each match
-            for match in matches:
-                # Notify the opponent
-                notify_opponent_matched(booking, match.opponent)
-                # Notify the seeker
-                notify_seeker_matched(booking, match.opponent)
+        # Create booking
+        try:
+            booking = serializer.save(user=request.user, id=booking_id)
+        except Exception:
+            release_slots(booking_id)
+            decrement_usage(request.user.id, start_time)
+            raise
         
+        # Opponent matching and its notifications run from the booking.created event
         response_data = BookingSerializer(booking).data
-        if matches:
-            response_data['matches_found'] = len(matches)
-            response_data['matched_opponents'] = [
-                {
-                    'id': str(match.opponent.id),
-                    'nickname': match.opponent.nickname,
-                    'first_name': match.opponent.first_name,
-                    'last_name': match.opponent.last_name,
-                }
-                for match in matches
-            ]
         
         return Response(
             response_data,
@@ -121,9 +136,6 @@ class BookingViewSet(MongoEngineModelViewSet):
 @permission_classes([IsAuthenticated])
 def check_availability(request):
     """Check court availability and tariff restrictions for specific time slot"""
-    from apps.users.models import UserSubscription
-    from datetime import timedelta
-    
     court_id = request.query_params.get('court_id')
     start_time_str = request.query_params.get('start_time')
     end_time_str = request.query_params.get('end_time')
@@ -156,14 +168,11 @@ def check_availability(request):
         'warnings': []
     }
     
-    # Check user's subscription
-    user_subscription = UserSubscription.objects(
-        user=request.user,
-        status='active',
-        end_date__gte=datetime.now()
-    ).first()
+    # Check user's subscription and evaluate the plan's booking policy
+    user_subscription, plan = get_active_subscription(request.user)
+    policy = None
     
-    if not user_subscription:
+    if not user_subscription or not plan:
         validation_results['tariff_valid'] = False
         validation_results['can_book'] = False
         validation_results['errors'].append({
@@ -171,101 +180,54 @@ def check_availability(request):
             'message': 'No active subscription found'
         })
     else:
-        plan = user_subscription.plan
-        booking_limits = plan.booking_limits or {}
-        
-        # Check court booking feature
-        if not plan.features.get('court_booking', False):
-            validation_results['tariff_valid'] = False
-            validation_results['can_book'] = False
-            validation_results['errors'].append({
-                'code': 'FEATURE_NOT_AVAILABLE',
-                'message': 'Your subscription does not include court booking'
-            })
+        policy = get_policy(plan)
+        week_count = 0
+        if policy.bookings_per_week > 0:
+            week_count = get_usage_count(request.user.id, start_time)
         
-        # Check day of week
-        allowed_days = booking_limits.get('allowed_days', [])
-        if allowed_days and day_of_week not in allowed_days:
-            day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            allowed_day_names = [day_names[d-1] for d in allowed_days]
+        errors, warnings = policy.check(start_time, end_time, week_count)
+        if errors:
             validation_results['tariff_valid'] = False
             validation_results['can_book'] = False
-            validation_results['errors'].append({
-                'code': 'DAY_NOT_ALLOWED',
-                'message': f'Booking only allowed on: {", ".join(allowed_day_names)}',
-                'allowed_days': allowed_days,
-                'requested_day': day_of_week
-            })
-        
-        # Check duration
-        max_duration = booking_limits.get('max_duration_hours', 0)
-        if max_duration > 0 and duration_hours > max_duration:
-            validation_results['tariff_valid'] = False
-            validation_results['can_book'] = False
-            validation_results['errors'].append({
-                'code': 'DURATION_EXCEEDS_LIMIT',
-                'message': f'Maximum booking duration is {max_duration} hours',
-                'max_duration_hours': max_duration,
-                'requested_duration_hours': duration_hours
-            })
-        
-        # Check weekly limit
-        bookings_per_week = booking_limits.get('bookings_per_week', 0)
-        if bookings_per_week > 0:
-            week_start = start_time - timedelta(days=start_time.weekday())
-            week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-            week_end = week_start + timedelta(days=7)
-            
-            weekly_bookings = Booking.objects(
-                user=request.user,
-                status__in=['confirmed', 'pending'],
-                start_time__gte=week_start,
-                start_time__lt=week_end
-            ).count()
-            
-            if weekly_bookings >= bookings_per_week:
-                validation_results['tariff_valid'] = False
-                validation_results['can_book'] = False
-                validation_results['errors'].append({
-                    'code': 'WEEKLY_LIMIT_REACHED',
-                    'message': f'Weekly booking limit ({bookings_per_week}) reached',
-                    'bookings_per_week': bookings_per_week,
-                    'current_week_bookings': weekly_bookings
-                })
-            elif weekly_bookings >= bookings_per_week - 1:
-                validation_results['warnings'].append({
-                    'code': 'WEEKLY_LIMIT_NEAR',
-                    'message': f'This will be your last booking this week ({weekly_bookings + 1}/{bookings_per_week})'
-                })
-    
-    # Check for time slot conflicts
-    conflicts = Booking.objects(
-        court=court,
-        status__in=['confirmed', 'pending'],
-        start_time__lt=end_time,
-        end_time__gt=start_time
-    )
+        validation_results['errors'].extend(errors)
+        validation_results['warnings'].extend(warnings)
+    
+    # Bookings must lie on the slot grid
+    error = alignment_error(start_time, end_time)
+    if error:
+        validation_results['can_book'] = False
+        validation_results['errors'].append({
+            'code': 'TIME_NOT_ALIGNED',
+            'message': error,
+            'slot_minutes': get_slot_minutes(),
+        })
+    
+    # Check for time slot conflicts (served from the in-memory interval index)
+    conflict_check = check_time_slot_conflict(court, start_time, end_time)
     
-    conflicting_bookings = []
-    if conflicts.count() > 0:
+    if conflict_check['has_conflict']:
         validation_results['time_slot_available'] = False
         validation_results['can_book'] = False
-        for booking in conflicts:
-            conflicting_bookings.append({
-                'id': str(booking.id),
-                'start_time': booking.start_time.isoformat(),
-                'end_time': booking.end_time.isoformat(),
-                'status': booking.status,
-            })
         validation_results['errors'].append({
             'code': 'TIME_SLOT_OCCUPIED',
             'message': 'This time slot is already booked',
-            'conflicts': conflicting_bookings
+            'conflicts': conflict_check['conflicts']
         })
     
+    # Next free slots of this duration on this and nearby courts
+    # (none without a subscription: such users cannot book at all)
+    suggestions = []
+    if not validation_results['time_slot_available'] and policy is not None:
+        from apps.bookings.suggestions import suggest_slots
+        suggestions = [
+            dict(slot, start_time=slot['start_time'].isoformat(), end_time=slot['end_time'].isoformat())
+            for slot in suggest_slots(court, start_time, end_time, request.user.id, policy)
+        ]
+    
     return Response({
         'available': validation_results['can_book'],
         'validation': validation_results,
+        'suggestions': suggestions,
         'court_id': str(court.id),
         'court_name': court.name,
         'requested_start': start_time.isoformat(),
@@ -275,6 +237,207 @@ def check_availability(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def day_availability(request):
+    """
+    Evaluate every slot of a day for the current user in one call
+    
+    Query params:
+    - court_id: UUID
+    - date: YYYY-MM-DD
+    - duration_minutes: slot length (default 60)
+    - step_minutes: distance between slot starts (default 30)
+    """
+    from datetime import timedelta
+    from apps.courts.occupancy import get_occupancy, is_range_free
+    
+    court_id = request.query_params.get('court_id')
+    date_str = request.query_params.get('date')
+    if not court_id or not date_str:
+        return Response({
+            'error': 'Missing parameters',
+            'required': ['court_id', 'date']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        duration = timedelta(minutes=int(request.query_params.get('duration_minutes', 60)))
+        step = timedelta(minutes=int(request.query_params.get('step_minutes', 30)))
+    except ValueError:
+        return Response({'error': 'Invalid parameters'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    slot = timedelta(minutes=get_slot_minutes())
+    if duration <= timedelta(0) or step < slot or duration % slot or step % slot:
+        return Response({
+            'error': f'Invalid duration or step (multiples of {get_slot_minutes()} minutes)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not Court.objects(id=court_id).only('id').first():
+        return Response({'error': 'Court not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    day_start = datetime(date.year, date.month, date.day)
+    slots = []
+    slot_start = day_start
+    while slot_start + duration <= day_start + timedelta(days=1):
+        slots.append((slot_start, slot_start + duration))
+        slot_start += step
+    
+    user_subscription, plan = get_active_subscription(request.user)
+    if plan:
+        policy = get_policy(plan)
+        # One usage read for every week touched by the day's slots
+        week_counts = get_usage_counts(request.user.id, [start for start, _ in slots])
+        results = policy.evaluate(request.user.id, slots, week_counts)
+    else:
+        results = [
+            {'start_time': start, 'end_time': end, 'allowed': False, 'errors': ['NO_SUBSCRIPTION']}
+            for start, end in slots
+        ]
+    
+    # One occupancy read for the court
+    occupancy = get_occupancy([court_id], date, (day_start + timedelta(days=1)).date())
+    
+    slots_data = []
+    for result in results:
+        free = is_range_free(occupancy, court_id, result['start_time'], result['end_time'])
+        errors = result['errors'] if free else result['errors'] + ['TIME_SLOT_OCCUPIED']
+        slots_data.append({
+            'start_time': result['start_time'].isoformat(),
+            'end_time': result['end_time'].isoformat(),
+            'time_slot_available': free,
+            'tariff_valid': result['allowed'],
+            'can_book': free and result['allowed'],
+            'errors': errors,
+        })
+    
+    return Response({
+        'court_id': court_id,
+        'date': date.isoformat(),
+        'duration_minutes': int(duration.total_seconds() // 60),
+        'has_subscription': plan is not None,
+        'slots': slots_data,
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_create_bookings(request):
+    """
+    Create many bookings of one court in one request
+    
+    Body:
+    - court: UUID
+    - slots: [{start_time, end_time}, ...]
+      or
+    - recurrence: {start_time, end_time, frequency: daily|weekly, count | until, interval}
+    - number_of_players, equipment_needed, equipment_details, payment_method, notes:
+      applied to every booking
+    
+    Every slot is checked and reported separately; slots that pass are created
+    even if others are rejected.
+    """
+    from apps.bookings.batch import (
+        BATCH_OPTION_FIELDS, create_batch_bookings, expand_recurrence, get_max_batch_slots
+    )
+    
+    court_id = request.data.get('court')
+    slots_data = request.data.get('slots')
+    recurrence = request.data.get('recurrence')
+    
+    if not court_id or not (slots_data or recurrence):
+        return Response({
+            'error': 'Missing parameters',
+            'required': ['court', 'slots or recurrence']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        if recurrence:
+            until = recurrence.get('until')
+            slots = expand_recurrence(
+                parser.parse(recurrence['start_time']),
+                parser.parse(recurrence['end_time']),
+                frequency=recurrence.get('frequency', 'weekly'),
+                count=int(recurrence['count']) if recurrence.get('count') else None,
+                until=parser.parse(until) if until else None,
+                interval=int(recurrence.get('interval', 1))
+            )
+        else:
+            if len(slots_data) > get_max_batch_slots():
+                raise ValueError(f"At most {get_max_batch_slots()} slots can be booked at once")
+            slots = [
+                (parser.parse(slot['start_time']), parser.parse(slot['end_time']))
+                for slot in slots_data
+            ]
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return Response({'error': f'Invalid parameters: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not slots:
+        return Response({'error': 'No slots to book'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate the shared booking fields once, as for a single booking
+    serializer = BookingCreateSerializer(data=dict(
+        request.data,
+        start_time=slots[0][0].isoformat(),
+        end_time=slots[0][1].isoformat()
+    ))
+    serializer.is_valid(raise_exception=True)
+    options = {
+        field: serializer.validated_data[field]
+        for field in BATCH_OPTION_FIELDS
+        if field in serializer.validated_data
+    }
+    
+    try:
+        court = Court.objects.get(id=court_id)
+    except Court.DoesNotExist:
+        return Response({'error': 'Court not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Document constraints (max_length, choices) the serializer does not enforce
+    try:
+        Booking(user=request.user, court=court, start_time=slots[0][0], end_time=slots[0][1], **options).validate()
+    except MongoValidationError as e:
+        return Response({
+            'error': 'Invalid booking options',
+            'errors': {field: str(error) for field, error in (e.errors or {}).items()} or str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    user_subscription, plan = get_active_subscription(request.user)
+    if not user_subscription or not plan:
+        return Response({
+            'error': 'No active subscription',
+            'detail': 'You need an active subscription to book courts'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    policy = get_policy(plan)
+    if options.get('equipment_needed') and not policy.equipment_rental:
+        return Response({
+            'error': 'Equipment rental not available',
+            'detail': 'Your subscription plan does not include equipment rental',
+            'feature': 'equipment_rental'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    results, bookings = create_batch_bookings(request.user, court, slots, policy, options)
+    
+    return Response({
+        'court_id': str(court.id),
+        'requested': len(results),
+        'created': len(bookings),
+        'rejected': len(results) - len(bookings),
+        'results': [
+            {
+                'index': result['index'],
+                'start_time': result['start_time'].isoformat(),
+                'end_time': result['end_time'].isoformat(),
+                'status': result['status'],
+                'booking_id': result['booking_id'],
+                'errors': result['errors'],
+            }
+            for result in results
+        ],
+    }, status=status.HTTP_201_CREATED if bookings else status.HTTP_409_CONFLICT)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def cancel_booking(request, booking_id):
@@ -314,53 +477,28 @@ def confirm_booking(request, booking_id):
 @permission_classes([IsAuthenticated])
 def get_weekly_limits(request):
     """Get user's weekly booking limits and current usage"""
-    from apps.users.models import UserSubscription
-    
     # Get user's active subscription
-    user_subscription = UserSubscription.objects(
-        user=request.user,
-        status='active',
-        end_date__gte=datetime.now()
-    ).first()
+    user_subscription, plan = get_active_subscription(request.user)
     
-    if not user_subscription:
+    if not user_subscription or not plan:
         return Response({
             'has_subscription': False,
             'message': 'No active subscription found'
         })
     
-    plan = user_subscription.plan
     booking_limits = plan.booking_limits or {}
     bookings_per_week = booking_limits.get('bookings_per_week', 0)
     
-    # Get current calendar week
-    now = datetime.now()
-    week_start = now - timedelta(days=now.weekday())
-    week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_end = week_start + timedelta(days=7)
+    # Get user's bookings in current calendar week (one aggregation)
+    now = datetime.utcnow()
+    usage = get_weekly_usage(request.user, now)
+    week_start = usage['week_start']
+    week_end = usage['week_end']
     next_week_start = week_end
     
-    # Get user's bookings in current week
-    weekly_bookings_query = Booking.objects(
-        user=request.user,
-        status__in=['confirmed', 'pending'],
-        start_time__gte=week_start,
-        start_time__lt=week_end
-    ).order_by('start_time')
-    
-    weekly_bookings_count = weekly_bookings_query.count()
-    
-    bookings_list = []
-    for booking in weekly_bookings_query:
-        bookings_list.append({
-            'id': str(booking.id),
-            'court_id': str(booking.court.id) if booking.court else None,
-            'court_name': booking.court.name if booking.court else 'Unknown',
-            'start_time': booking.start_time.isoformat(),
-            'end_time': booking.end_time.isoformat(),
-            'status': booking.status,
-            'duration_hours': (booking.end_time - booking.start_time).total_seconds() / 3600
-        })
+    # The materialized counter is what the weekly limit is enforced against
+    weekly_bookings_count = get_usage_count(request.user.id, now)
+    bookings_list = usage['bookings']
     
     unlimited = bookings_per_week == 0
     limit_reached = not unlimited and weekly_bookings_count >= bookings_per_week
@@ -399,8 +537,9 @@ class UserBookingsView(APIView):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
-        # Order by start time
-        bookings = list(queryset.order_by('-start_time')[:50])
+        # Newest first, continuing from the cursor of the previous page
+        paginator = MongoEngineCursorPagination(ordering='-start_time')
+        bookings = paginator.paginate_queryset(queryset, request, view=self)
         
         serializer = BookingListSerializer(bookings, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
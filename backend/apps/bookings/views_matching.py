@@ -6,8 +6,11 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from apps.bookings.models import Booking
-from apps.bookings.matching import OpponentMatch, find_opponent_for_booking
+from apps.bookings.matching import OpponentMatch, find_opponent_for_booking, find_flexible_opponents
 from apps.users.models import User
+from apps.bookings.match_feed import MatchFeedEntry
+from apps.core.mongo_utils import reference_id
+from apps.core.mongoengine_drf import MongoEngineCursorPagination
 
 
 @api_view(['GET'])
@@ -50,70 +53,31 @@ def get_booking_matches(request, booking_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_my_matches(request):
-    """Get all matches where current user is involved (as seeker or opponent)"""
-    # Matches where user is the seeker
-    seeker_matches = OpponentMatch.objects(seeker=request.user, status='matched')
-    
-    # Matches where user is the opponent
-    opponent_matches = OpponentMatch.objects(opponent=request.user, status='matched')
+    """Get matches where current user is involved (as seeker or opponent), newest first"""
+    queryset = MatchFeedEntry.objects(user=str(request.user.id), status='matched')
+    paginator = MongoEngineCursorPagination(ordering='-created_at')
+    entries = paginator.paginate_queryset(queryset, request)
     
     all_matches = []
-    
-    # Process seeker matches
-    for match in seeker_matches:
-        booking = match.booking
-        opponent = match.opponent
-        all_matches.append({
-            'match_id': str(match.id),
-            'role': 'seeker',
-            'opponent': {
-                'id': str(opponent.id),
-                'nickname': opponent.nickname,
-                'first_name': opponent.first_name,
-                'last_name': opponent.last_name,
-            },
-            'booking': {
-                'id': str(booking.id),
-                'court_id': str(booking.court.id),
-                'court_name': booking.court.name if hasattr(booking.court, 'name') else 'Court',
-                'start_time': booking.start_time.isoformat(),
-                'end_time': booking.end_time.isoformat(),
-                'status': booking.status,
-            },
-            'matched_at': match.matched_at.isoformat() if match.matched_at else None,
-        })
-    
-    # Process opponent matches
-    for match in opponent_matches:
-        booking = match.booking
-        seeker = match.seeker
+    for entry in entries:
+        booking = entry.booking
         all_matches.append({
-            'match_id': str(match.id),
-            'role': 'opponent',
-            'opponent': {
-                'id': str(seeker.id),
-                'nickname': seeker.nickname,
-                'first_name': seeker.first_name,
-                'last_name': seeker.last_name,
-            },
-            'booking': {
-                'id': str(booking.id),
-                'court_id': str(booking.court.id),
-                'court_name': booking.court.name if hasattr(booking.court, 'name') else 'Court',
-                'start_time': booking.start_time.isoformat(),
-                'end_time': booking.end_time.isoformat(),
-                'status': booking.status,
-            },
-            'matched_at': match.matched_at.isoformat() if match.matched_at else None,
+            'match_id': entry.match_id,
+            'role': entry.role,
+            'opponent': entry.opponent,
+            'booking': dict(
+                booking,
+                start_time=booking['start_time'].isoformat(),
+                end_time=booking['end_time'].isoformat(),
+            ),
+            'matched_at': entry.matched_at.isoformat() if entry.matched_at else None,
         })
     
-    # Sort by matched_at descending
-    all_matches.sort(key=lambda x: x['matched_at'] or '', reverse=True)
-    
-    return Response({
-        'matches_count': len(all_matches),
-        'matches': all_matches,
-    })
+    return Response(dict(
+        paginator.get_pagination_data(),
+        matches_count=len(all_matches),
+        matches=all_matches,
+    ))
 
 
 @api_view(['GET'])
@@ -156,6 +120,7 @@ def find_potential_opponents(request):
                 'last_name': user.last_name,
             },
             'opponents_needed': candidate_booking.opponents_needed,
+            'opponents_found': candidate_booking.matches_found,
             'number_of_players': candidate_booking.number_of_players,
         })
     
@@ -165,3 +130,78 @@ def find_potential_opponents(request):
         'potential_opponents': candidates_data,
     })
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def find_flexible_opponents_view(request):
+    """
+    Find opponents on nearby courts within a time window of a booking
+    
+    Query params:
+    - booking_id: UUID
+    - radius_km: search radius around the booking's court (default 5)
+    - window_minutes: allowed difference of start times (default 60)
+    - limit: number of ranked candidates (default 10, max 50)
+    """
+    booking_id = request.query_params.get('booking_id')
+    
+    if not booking_id:
+        return Response(
+            {'error': 'booking_id is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        radius_km = float(request.query_params.get('radius_km', 5))
+        window_minutes = int(request.query_params.get('window_minutes', 60))
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        return Response({'error': 'Invalid parameters'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if radius_km <= 0 or window_minutes < 0 or limit < 1:
+        return Response({'error': 'Invalid parameters'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        booking = Booking.objects.get(id=booking_id, user=request.user)
+    except Booking.DoesNotExist:
+        return Response(
+            {'error': 'Booking not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if not booking.find_opponents:
+        return Response(
+            {'error': 'This booking is not looking for opponents'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    candidates = find_flexible_opponents(booking, radius_km, window_minutes, limit)
+    
+    candidates_data = []
+    for candidate_booking in candidates:
+        user = candidate_booking.user
+        candidates_data.append({
+            'booking_id': str(candidate_booking.id),
+            'court_id': reference_id(candidate_booking, 'court'),
+            'start_time': candidate_booking.start_time.isoformat(),
+            'end_time': candidate_booking.end_time.isoformat(),
+            'user': {
+                'id': str(user.id),
+                'nickname': user.nickname,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+            },
+            'opponents_needed': candidate_booking.opponents_needed,
+            'opponents_found': candidate_booking.matches_found,
+            'distance_km': round(getattr(candidate_booking, 'distance_km', 0) or 0, 2),
+            'overlap_minutes': getattr(candidate_booking, 'overlap_minutes', None),
+            'score': getattr(candidate_booking, 'score', None),
+        })
+    
+    return Response({
+        'booking_id': str(booking.id),
+        'radius_km': radius_km,
+        'window_minutes': window_minutes,
+        'potential_opponents_count': len(candidates_data),
+        'potential_opponents': candidates_data,
+    })
@@ -0,0 +1,191 @@
+"""
+Materialized per-user weekly booking counters
+
+One user_week_usage document per (user, ISO week) holds the number of
+bookings counted against the plan's weekly limit. Booking creation
+increments it (conditionally when a limit applies), cancellation and
+deletion decrement it, so the weekly-limit check is a single point read.
+"""
+from datetime import datetime, timedelta
+from mongoengine import Document, fields
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from apps.core.mongo_utils import to_naive_utc
+
+# Bookings that count against the weekly limit
+WEEKLY_LIMIT_STATUSES = ['pending', 'confirmed', 'completed']
+
+
+class UserWeekUsage(Document):
+    """Number of bookings of a user in one calendar (ISO) week"""
+
+    # "<user_id>:<ISO year>-W<ISO week>"
+    id = fields.StringField(primary_key=True)
+
+    user = fields.StringField(required=True)
+    week_start = fields.DateTimeField(required=True)  # Monday 00:00
+    count = fields.IntField(default=0)
+
+    updated_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'user_week_usage',
+        'indexes': [
+            [('user', 1), ('week_start', 1)],
+        ]
+    }
+
+    def __str__(self):
+        return f"WeekUsage {self.id} = {self.count}"
+
+
+def week_key(user_id, moment):
+    """Build the counter key of a user's calendar week"""
+    iso_year, iso_week, _ = to_naive_utc(moment).isocalendar()
+    return f"{user_id}:{iso_year}-W{iso_week:02d}"
+
+
+def week_start_of(moment):
+    """Get Monday 00:00 of the week containing moment"""
+    moment = to_naive_utc(moment)
+    week_start = moment - timedelta(days=moment.weekday())
+    return week_start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _insert_fields(user_id, moment):
+    return {'user': str(user_id), 'week_start': week_start_of(moment)}
+
+
+def get_usage_count(user_id, moment):
+    """Get number of counted bookings of a user in the week of moment"""
+    doc = UserWeekUsage._get_collection().find_one(
+        {'_id': week_key(user_id, moment)}, {'count': 1}
+    )
+    return doc['count'] if doc else 0
+
+
+def get_usage_counts(user_id, moments):
+    """Get counts of several weeks with one query: {week_key: count}"""
+    keys = list(dict.fromkeys(week_key(user_id, moment) for moment in moments))
+    counts = {key: 0 for key in keys}
+    for doc in UserWeekUsage._get_collection().find({'_id': {'$in': keys}}, {'count': 1}):
+        counts[doc['_id']] = doc['count']
+    return counts
+
+
+def increment_usage(user_id, moment, amount=1):
+    """Unconditionally add to a user's weekly counter"""
+    UserWeekUsage._get_collection().update_one(
+        {'_id': week_key(user_id, moment)},
+        {
+            '$inc': {'count': amount},
+            '$set': {'updated_at': datetime.utcnow()},
+            '$setOnInsert': _insert_fields(user_id, moment),
+        },
+        upsert=True
+    )
+
+
+def decrement_usage(user_id, moment, amount=1):
+    """Remove from a user's weekly counter (never below zero)"""
+    UserWeekUsage._get_collection().update_one(
+        {'_id': week_key(user_id, moment), 'count': {'$gte': amount}},
+        {'$inc': {'count': -amount}, '$set': {'updated_at': datetime.utcnow()}}
+    )
+
+
+def reserve_usage(user_id, moment, limit, amount=1):
+    """
+    Add amount to a user's weekly counter only if the result stays within limit.
+    A limit of 0 means unlimited.
+
+    Returns:
+        int or None: new count, or None if the limit would be exceeded
+    """
+    if not limit:
+        increment_usage(user_id, moment, amount)
+        return get_usage_count(user_id, moment)
+
+    if amount > limit:
+        return None
+
+    try:
+        doc = UserWeekUsage._get_collection().find_one_and_update(
+            {'_id': week_key(user_id, moment), 'count': {'$lte': limit - amount}},
+            {
+                '$inc': {'count': amount},
+                '$set': {'updated_at': datetime.utcnow()},
+                '$setOnInsert': _insert_fields(user_id, moment),
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The counter exists but has no room left
+        return None
+    return doc['count']
+
+
+def rebuild_usage(user_id=None, batch_size=1000):
+    """
+    Recompute weekly counters from bookings.
+
+    Counters are overwritten in place with upserts and the ones no booking
+    backs any more are deleted afterwards, so quota checks never see an
+    empty collection while the rebuild runs.
+
+    Returns:
+        int: number of counters written
+    """
+    from pymongo import UpdateOne
+    from apps.bookings.models import Booking
+
+    query = {'status__in': WEEKLY_LIMIT_STATUSES}
+    if user_id:
+        query['user'] = user_id
+
+    rows = Booking.objects(**query).aggregate([
+        {'$group': {
+            '_id': {
+                'user': '$user',
+                'year': {'$isoWeekYear': '$start_time'},
+                'week': {'$isoWeek': '$start_time'},
+            },
+            'count': {'$sum': 1},
+            'first_start': {'$min': '$start_time'},
+        }},
+    ])
+
+    collection = UserWeekUsage._get_collection()
+    # MongoDB stores milliseconds; keep the rebuild marker comparable
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    written = 0
+    operations = []
+    for row in rows:
+        user = row['_id']['user']
+        operations.append(UpdateOne(
+            {'_id': week_key(user, row['first_start'])},
+            {'$set': {
+                'user': str(user),
+                'week_start': week_start_of(row['first_start']),
+                'count': row['count'],
+                'updated_at': now,
+            }},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+        written += len(operations)
+
+    # Counters not rewritten above (nor touched by a booking since) are stale
+    stale = {'updated_at': {'$lt': now}}
+    if user_id:
+        stale['user'] = str(user_id)
+    collection.delete_many(stale)
+    return written
@@ -0,0 +1,169 @@
+"""
+Domain events
+
+Side effects of bookings and matches (matching, notifications, statistics)
+run outside the request: views and models publish an event, and the
+dispatch_domain_event Celery task runs every handler configured for the
+event type in settings.DOMAIN_EVENT_HANDLERS.
+
+Delivery is at least once, so each handler claims (event id, handler) in the
+processed_events collection before running. A finished claim makes a
+redelivered event a no-op for that handler; a failed handler drops its claim
+so the retry runs it again, and a claim left by a crashed worker can be
+taken over after EVENT_HANDLER_LEASE.
+
+Many events of one type can travel as a single BATCH event (one broker
+message); its handler dispatches every item as an event with a derived id,
+so per-item claims keep retries idempotent.
+"""
+import uuid
+import logging
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.utils.module_loading import import_string
+from mongoengine import Document, fields
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+BOOKING_CREATED = 'booking.created'
+BOOKING_CANCELLED = 'booking.cancelled'
+MATCH_CREATED = 'match.created'
+BATCH = 'batch'
+
+# A running handler claim older than this is considered abandoned
+EVENT_HANDLER_LEASE = timedelta(minutes=10)
+
+
+class ProcessedEvent(Document):
+    """Claim of one handler on one event"""
+
+    # "<event_id>:<handler path>"
+    id = fields.StringField(primary_key=True)
+
+    event_type = fields.StringField(required=True)
+    status = fields.StringField(choices=['running', 'done'], default='running')
+    started_at = fields.DateTimeField(default=datetime.utcnow)
+    finished_at = fields.DateTimeField()
+
+    meta = {
+        'collection': 'processed_events',
+        'indexes': [
+            # Claims are only needed while redeliveries can happen
+            {'fields': ['started_at'], 'expireAfterSeconds': 7 * 24 * 3600},
+        ]
+    }
+
+    def __str__(self):
+        return f"ProcessedEvent {self.id} ({self.status})"
+
+
+def make_event(event_type, payload):
+    """Build an event dict (JSON serializable)"""
+    return {
+        'id': str(uuid.uuid4()),
+        'type': event_type,
+        'payload': payload,
+        'occurred_at': datetime.utcnow().isoformat(),
+    }
+
+
+def publish(event_type, payload):
+    """
+    Publish an event to the Celery dispatcher.
+
+    When the broker is unreachable the handlers run inline, so side effects
+    are delayed at worst, never lost.
+    """
+    event = make_event(event_type, payload)
+    from apps.core.tasks import dispatch_domain_event
+    try:
+        dispatch_domain_event.delay(event)
+    except Exception as e:
+        logger.warning(f'Event {event_type} {event["id"]} not queued ({e}), dispatching inline')
+        dispatch(event)
+    return event
+
+
+def publish_many(event_type, payloads):
+    """Publish many events of one type as a single batch event"""
+    if not payloads:
+        return None
+    return publish(BATCH, {'event_type': event_type, 'items': list(payloads)})
+
+
+def dispatch_batch(event):
+    """batch: dispatch every item; raise so the batch is retried when one fails"""
+    failed = []
+    for index, payload in enumerate(event['payload']['items']):
+        item = {
+            'id': f"{event['id']}:{index}",
+            'type': event['payload']['event_type'],
+            'payload': payload,
+            'occurred_at': event['occurred_at'],
+        }
+        failed.extend(dispatch(item))
+    if failed:
+        raise RuntimeError(f'Batch items failed: {", ".join(sorted(set(failed)))}')
+
+
+def get_handlers(event_type):
+    """Import the handlers configured for an event type"""
+    return [
+        (path, import_string(path))
+        for path in getattr(settings, 'DOMAIN_EVENT_HANDLERS', {}).get(event_type, [])
+    ]
+
+
+def claim(event, handler_path):
+    """
+    Claim a handler run for an event.
+
+    Returns:
+        bool: False when the handler already ran or is running elsewhere
+    """
+    collection = ProcessedEvent._get_collection()
+    claim_id = f"{event['id']}:{handler_path}"
+    now = datetime.utcnow()
+    try:
+        collection.insert_one({
+            '_id': claim_id,
+            'event_type': event['type'],
+            'status': 'running',
+            'started_at': now,
+        })
+        return True
+    except DuplicateKeyError:
+        # Take over a claim abandoned by a crashed worker
+        taken = collection.update_one(
+            {'_id': claim_id, 'status': 'running', 'started_at': {'$lt': now - EVENT_HANDLER_LEASE}},
+            {'$set': {'started_at': now}}
+        )
+        return taken.modified_count == 1
+
+
+def dispatch(event):
+    """
+    Run every handler of an event once.
+
+    Returns:
+        list: paths of handlers that failed
+    """
+    collection = ProcessedEvent._get_collection()
+    failed = []
+    for path, handler in get_handlers(event['type']):
+        if not claim(event, path):
+            continue
+        claim_id = f"{event['id']}:{path}"
+        try:
+            handler(event)
+        except Exception as e:
+            logger.error(f'Event handler {path} failed for {event["type"]} {event["id"]}: {e}')
+            collection.delete_one({'_id': claim_id})
+            failed.append(path)
+            continue
+        collection.update_one(
+            {'_id': claim_id},
+            {'$set': {'status': 'done', 'finished_at': datetime.utcnow()}}
+        )
+    return failed
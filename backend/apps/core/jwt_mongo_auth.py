@@ -40,6 +40,9 @@ class MongoJWTAuthentication(JWTAuthentication):
         
         if user is None:
             return None
+        
+        # Feeds partner search recency and the in-memory player index
+        user.mark_active()
             
         return (user, validated_token)
 
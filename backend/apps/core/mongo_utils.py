@@ -0,0 +1,25 @@
+"""
+Small helpers for working with MongoEngine documents and raw MongoDB values
+"""
+from datetime import timezone
+from bson import DBRef
+from mongoengine import Document
+
+
+def reference_id(document, field_name):
+    """Get the stored id of a reference field as a string without dereferencing it"""
+    value = document._data.get(field_name)
+    if value is None:
+        return None
+    if isinstance(value, Document):
+        return str(value.pk)
+    if isinstance(value, DBRef):
+        return str(value.id)
+    return str(value)
+
+
+def to_naive_utc(value):
+    """Normalize a datetime to naive UTC (the form MongoDB returns)"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
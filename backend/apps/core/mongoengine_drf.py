@@ -3,9 +3,14 @@ Custom base classes for MongoEngine integration with Django REST Framework
 """
 from rest_framework import serializers, viewsets, pagination
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from mongoengine import Document, EmbeddedDocument
 from mongoengine.errors import ValidationError, DoesNotExist, MultipleObjectsReturned
+from mongoengine.queryset.visitor import Q
 from django.http import Http404
+from datetime import datetime
+import base64
+import json
 import uuid
 
 
@@ -229,6 +234,214 @@ class MongoEnginePagination(pagination.PageNumberPagination):
         })
 
 
+class MongoEngineCursorPagination(pagination.BasePagination):
+    """
+    Keyset (cursor) pagination for MongoEngine querysets.
+    
+    Pages are ordered by one field plus the primary key as tie-breaker and
+    continue from the last document of the previous page, so with a
+    compound index on (filter fields, ordering field, _id) every page costs
+    the same as the first one. Cursors are opaque base64 strings.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    # Counting stops here; larger totals are reported as estimates
+    count_limit = 1000
+    ordering = '-created_at'
+    
+    def __init__(self, ordering=None, page_size=None):
+        if ordering:
+            self.ordering = ordering
+        if page_size:
+            self.page_size = page_size
+    
+    @property
+    def ordering_field(self):
+        return self.ordering.lstrip('-')
+    
+    @property
+    def descending(self):
+        return self.ordering.startswith('-')
+    
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            page_size = self.page_size
+        return max(1, min(page_size, self.max_page_size))
+    
+    def encode_cursor(self, document):
+        """Build an opaque cursor pointing after a document (or raw as_pymongo row)"""
+        if isinstance(document, dict):
+            return self.make_cursor(document.get(self.ordering_field), document['_id'])
+        return self.make_cursor(getattr(document, self.ordering_field), document.pk)
+    
+    def make_cursor(self, value, pk):
+        """Build an opaque cursor from an ordering value and a primary key"""
+        if isinstance(value, datetime):
+            payload = {'t': 'dt', 'v': value.isoformat()}
+        else:
+            payload = {'t': 'raw', 'v': value}
+        payload['id'] = str(pk)
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    def decode_cursor(self, cursor):
+        """Decode a cursor into (ordering value, primary key)"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(raw)
+            value = payload['v']
+            if payload['t'] == 'dt':
+                value = datetime.fromisoformat(value)
+            return value, payload['id']
+        except (ValueError, KeyError, TypeError):
+            raise NotFound('Invalid cursor')
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        """Get the page of documents after the request's cursor"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field = self.ordering_field
+        
+        self.count = None
+        self.count_is_estimate = False
+        if request.query_params.get(self.count_query_param) in ('1', 'true', 'True'):
+            self.count = queryset.limit(self.count_limit).count(with_limit_and_skip=True)
+            self.count_is_estimate = self.count >= self.count_limit
+        
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            if self.descending:
+                after = Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+                queryset = queryset.filter(Q(**{f'{field}__lte': value}) & after)
+            else:
+                after = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+                queryset = queryset.filter(Q(**{f'{field}__gte': value}) & after)
+        
+        pk_ordering = '-pk' if self.descending else 'pk'
+        documents = list(queryset.order_by(self.ordering, pk_ordering).limit(self.page_size + 1))
+        
+        self.has_more = len(documents) > self.page_size
+        documents = documents[:self.page_size]
+        self.next_cursor = self.encode_cursor(documents[-1]) if self.has_more else None
+        return documents
+    
+    def get_pagination_data(self):
+        """Pagination fields for responses that use their own result key"""
+        data = {
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more,
+            'page_size': self.page_size,
+        }
+        if self.count is not None:
+            data['count'] = self.count
+            data['count_is_estimate'] = self.count_is_estimate
+        return data
+    
+    def get_paginated_response(self, data):
+        """Return paginated response"""
+        return Response(dict(self.get_pagination_data(), results=data))
+
+
+def geo_near_stage(lng, lat, max_distance, query, key='location', distance_field='distance', min_distance=None):
+    """
+    Build a spherical $geoNear stage (distances in meters).
+    
+    $geoNear must be the first stage of a pipeline, so run it on the raw
+    collection: QuerySet.aggregate() prepends a $match.
+    """
+    stage = {
+        'near': {'type': 'Point', 'coordinates': [float(lng), float(lat)]},
+        'distanceField': distance_field,
+        'maxDistance': max_distance,
+        'query': query,
+        'key': key,
+        'spherical': True,
+    }
+    if min_distance is not None:
+        stage['minDistance'] = min_distance
+    return {'$geoNear': stage}
+
+
+class GeoNearCursorPagination(MongoEngineCursorPagination):
+    """
+    Distance-ordered cursor pagination over a $geoNear aggregation.
+    
+    Pages are ordered by (distance, _id). The next page restarts $geoNear at
+    the last returned distance (minDistance) and skips the rows of that
+    distance already served, so deep pages do not re-read nearer documents.
+    Rows are raw documents with the distance in meters in distance_field.
+    """
+    ordering = 'distance'
+    distance_field = 'distance'
+    
+    def paginate_geo_near(self, collection, lng, lat, max_distance, query, request,
+                          key='location', stages=None):
+        """
+        Get the page of raw documents after the request's cursor.
+        
+        stages run after paging (e.g. a $project) and must keep _id and the
+        distance field.
+        """
+        field = self.distance_field
+        
+        def fetch(after, limit):
+            if after:
+                value, pk = after
+                pipeline = [
+                    geo_near_stage(lng, lat, max_distance, query, key, field, min_distance=value),
+                    {'$match': {'$or': [{field: {'$gt': value}}, {'_id': {'$gt': pk}}]}},
+                ]
+            else:
+                pipeline = [geo_near_stage(lng, lat, max_distance, query, key, field)]
+            pipeline.append({'$sort': {field: 1, '_id': 1}})
+            pipeline.append({'$limit': limit})
+            pipeline.extend(stages or [])
+            return list(collection.aggregate(pipeline))
+        
+        def count(limit):
+            counted = list(collection.aggregate([
+                geo_near_stage(lng, lat, max_distance, query, key, field),
+                {'$limit': limit},
+                {'$count': 'count'},
+            ]))
+            return counted[0]['count'] if counted else 0
+        
+        return self.paginate_nearest(fetch, request, count)
+    
+    def paginate_nearest(self, fetch, request, count=None):
+        """
+        Get the page after the request's cursor from any nearest-first source.
+        
+        fetch(after, limit) returns rows ordered by (distance, _id) that come
+        after the (distance, _id) pair `after` (None for the first page);
+        count(limit) returns the number of rows, capped at limit.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field = self.distance_field
+        
+        self.count = None
+        self.count_is_estimate = False
+        if count and request.query_params.get(self.count_query_param) in ('1', 'true', 'True'):
+            self.count = count(self.count_limit)
+            self.count_is_estimate = self.count >= self.count_limit
+        
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = self.decode_cursor(cursor) if cursor else None
+        rows = fetch(after, self.page_size + 1)
+        
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.make_cursor(rows[-1][field], rows[-1]['_id']) if self.has_more else None
+        return rows
+
+
 class GeoQueryMixin:
     """Mixin for geo-spatial queries with MongoDB"""
     
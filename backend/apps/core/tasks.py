@@ -0,0 +1,18 @@
+"""
+Celery tasks for domain events
+"""
+from celery import shared_task
+from apps.core.events import dispatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def dispatch_domain_event(self, event: dict):
+    """Run the handlers of a domain event; failed handlers are retried"""
+    failed = dispatch(event)
+    if failed:
+        logger.warning(f'Event {event["type"]} {event["id"]}: retrying {", ".join(failed)}')
+        raise self.retry()
+    return event['id']
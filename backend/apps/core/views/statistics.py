@@ -10,6 +10,7 @@ from apps.users.models import User
 from apps.bookings.models import Booking
 from apps.tournaments.models import Tournament
 from apps.courts.models import Court
+from apps.bookings.stats import day_of, get_daily_totals, get_court_totals
 
 
 @api_view(['GET'])
@@ -117,20 +118,17 @@ def booking_stats_chart(request):
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Count bookings per day
+        # Bookings per day from the daily rollup
+        totals = get_daily_totals(start_date, end_date)
         data = []
         current_date = start_date
         while current_date <= end_date:
-            next_date = current_date + timedelta(days=1)
-            count = Booking.objects.filter(
-                created_at__gte=current_date,
-                created_at__lt=next_date
-            ).count()
+            day = totals.get(day_of(current_date), {})
             data.append({
                 'date': current_date.strftime('%Y-%m-%d'),
-                'count': count
+                'count': day.get('bookings_created', 0)
             })
-            current_date = next_date
+            current_date += timedelta(days=1)
         
         return Response({'data': data})
     except Exception as e:
@@ -147,16 +145,27 @@ def popular_courts(request):
     try:
         limit = int(request.query_params.get('limit', 10))
         
-        # This is a simplified version - MongoDB aggregation would be better
-        courts = Court.objects.filter(is_active=True)[:limit]
+        # Booking counts from the daily rollup, active courts only
+        courts = {
+            str(court.id): court
+            for court in Court.objects.filter(is_active=True).only('id', 'name_i18n')
+        }
+        totals = get_court_totals(limit, court_ids=list(courts))
         
         data = []
-        for court in courts:
-            booking_count = Booking.objects.filter(court=court).count()
+        for row in totals:
+            court = courts.pop(row['court'])
+            data.append({
+                'id': str(court.id),
+                'name': court.name_i18n.get('tk', court.name_i18n.get('ru', court.name_i18n.get('en', 'Unknown'))),
+                'booking_count': row['bookings_created'],
+            })
+        # Fill up with courts that have no bookings yet
+        for court in list(courts.values())[:max(limit - len(data), 0)]:
             data.append({
                 'id': str(court.id),
                 'name': court.name_i18n.get('tk', court.name_i18n.get('ru', court.name_i18n.get('en', 'Unknown'))),
-                'booking_count': booking_count,
+                'booking_count': 0,
             })
         
         # Sort by booking count
@@ -40,7 +40,7 @@ class Court(Document):
     # Basic info
     name_i18n = fields.DictField(default=dict)  # Multilingual name
     address = fields.StringField(required=True)
-    location = fields.PointField()  # MongoDB GeoJSON point (optional)
+    location = fields.PointField(auto_index=False)  # MongoDB GeoJSON point (optional, indexed in meta)
     type = fields.StringField(required=True)  # Category ID or legacy type
     
     # Ownership
@@ -54,8 +54,7 @@ class Court(Document):
     # Tariffs
     tariffs = fields.ListField(fields.EmbeddedDocumentField(Tariff))
     
-    # Availability (embedded slots)
-    availability_slots = fields.ListField(fields.EmbeddedDocumentField(AvailabilitySlot))
+    # Explicit slots live in the court_slots collection (apps/courts/slots.py)
     
     # Status
     is_active = fields.BooleanField(default=True)
@@ -67,14 +66,16 @@ class Court(Document):
     meta = {
         'collection': 'courts',
         'indexes': [
-            'location',  # 2dsphere index for geo queries
+            # Court search: $geoNear filtered by type and activity inside the index
+            [('location', '2dsphere'), ('type', 1), ('is_active', 1)],
             'type',
             'owner',
             'created_by',
             'is_active',
             'created_at',
-            [('availability_slots.start_time', 1), ('availability_slots.end_time', 1)],  # Compound index for time queries
-        ]
+        ],
+        # Courts not yet migrated by migrate_court_slots.py still carry availability_slots
+        'strict': False,
     }
     
     def __str__(self):
@@ -92,23 +93,34 @@ class Court(Document):
         return self.name_i18n.get(language, self.name_i18n.get('tk', ''))
     
     def get_availability_for_date(self, date):
-        """Get availability slots for a specific date"""
-        # Filter slots by date
-        from datetime import time
-        start_of_day = datetime.combine(date, time.min)
-        end_of_day = datetime.combine(date, time.max)
-        
-        return [
-            slot for slot in self.availability_slots
-            if start_of_day <= slot.start_time <= end_of_day
-        ]
+        """Get availability slots for a specific date (one court_slots bucket)"""
+        from apps.courts.slots import get_slots_for_date
+        return get_slots_for_date(self.id, date)
+    
+    def get_occupancy_for_date(self, date):
+        """Get booked/blocked/free runs for a specific date from the occupancy bitmap"""
+        from apps.courts.occupancy import get_occupancy, day_runs
+        booked, blocked = get_occupancy([self.id], date, date).get((str(self.id), date), (0, 0))
+        return day_runs(booked, blocked, date)
     
     def is_available(self, start_time, end_time):
         """Check if court is available for the given time range"""
-        for slot in self.availability_slots:
-            # Check for overlapping slots that are not free
-            if (slot.status != 'free' and 
-                slot.start_time < end_time and 
-                slot.end_time > start_time):
-                return False
+        from apps.courts.occupancy import is_court_free
+        return is_court_free(self.id, start_time, end_time)
+    
+    def block_time(self, start_time, end_time):
+        """Block a time range (maintenance, events, etc.)"""
+        from apps.courts.occupancy import mark_blocked
+        from apps.courts.slots import add_slot
+        add_slot(self.id, start_time, end_time, 'blocked')
+        mark_blocked(self.id, start_time, end_time)
+    
+    def unblock_time(self, start_time, end_time):
+        """Remove blocked slots that exactly match a time range"""
+        from apps.courts.occupancy import clear_blocked
+        from apps.courts.slots import remove_slot
+        if not remove_slot(self.id, start_time, end_time, 'blocked'):
+            return False
+        
+        clear_blocked(self.id, start_time, end_time)
         return True
@@ -0,0 +1,70 @@
+"""
+Nearest free courts for a time range
+
+Answers "which court near me is free at 19:00?" with two queries whatever
+the number of courts in range: one $geoNear over the courts' (location,
+type, is_active) index loads the nearest NEAREST_FREE_COURT_POOL candidates
+(list fields and distance only), and one get_occupancy() read loads their
+occupancy bitmaps for the days of the range. Candidates are then tested in
+distance order with is_range_free() until enough free courts are found.
+"""
+from django.conf import settings
+from apps.core.mongoengine_drf import geo_near_stage
+from apps.courts.models import Court
+from apps.courts.occupancy import day_masks, get_occupancy, is_range_free
+from apps.courts.read_models import list_projection
+
+DISTANCE_FIELD = 'distance'
+
+
+def get_pool_size():
+    """Get how many nearest courts are checked per search"""
+    return getattr(settings, 'NEAREST_FREE_COURT_POOL', 200)
+
+
+def nearest_courts(lng, lat, radius_m, court_type=None, limit=None):
+    """
+    Get the nearest active courts as raw list documents, nearest first.
+
+    Rows carry the distance in meters in DISTANCE_FIELD.
+    """
+    query = {'is_active': True}
+    if court_type:
+        query['type'] = court_type
+
+    return list(Court._get_collection().aggregate([
+        geo_near_stage(lng, lat, radius_m, query, distance_field=DISTANCE_FIELD),
+        {'$limit': limit or get_pool_size()},
+        {'$project': dict(list_projection(), **{DISTANCE_FIELD: 1})},
+    ]))
+
+
+def find_free_courts(rows, start_time, end_time, limit):
+    """
+    Keep the first `limit` courts of rows that are free for a time range.
+
+    Occupancy of all rows is loaded with a single query.
+    """
+    masks = day_masks(start_time, end_time)
+    if not rows or not masks:
+        return rows[:limit]
+
+    occupancy = get_occupancy([row['_id'] for row in rows], masks[0][0], masks[-1][0])
+    free = []
+    for row in rows:
+        if is_range_free(occupancy, row['_id'], start_time, end_time):
+            free.append(row)
+            if len(free) >= limit:
+                break
+    return free
+
+
+def nearest_free_courts(lng, lat, radius_m, start_time, end_time, limit, court_type=None):
+    """
+    Get the nearest courts free for [start_time, end_time).
+
+    Returns:
+        tuple: (free rows nearest first, number of courts checked)
+    """
+    rows = nearest_courts(lng, lat, radius_m, court_type)
+    return find_free_courts(rows, start_time, end_time, limit), len(rows)
@@ -0,0 +1,272 @@
+"""
+Per-court daily occupancy bitmaps
+
+Each (court, day) document holds 96 bits per state (15-minute slots), split
+into two 48-bit halves per state because MongoDB's $bit operator works on
+integers. Bookings and admin blocks set and clear bits with atomic $bit
+updates, so availability checks are bit tests on a few bytes.
+"""
+from datetime import datetime, timedelta
+from bson import Int64
+from mongoengine import Document, fields
+from apps.core.mongo_utils import to_naive_utc
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+HALF_DAY_SLOTS = SLOTS_PER_DAY // 2
+HALF_MASK = (1 << HALF_DAY_SLOTS) - 1
+
+SLOT_STATES = ['free', 'booked', 'blocked']
+STATE_KINDS = ['booked', 'blocked']
+
+
+class CourtOccupancy(Document):
+    """Occupancy bitmap of one court for one day"""
+
+    # "<court_id>:<YYYY-MM-DD>"
+    id = fields.StringField(primary_key=True)
+
+    court = fields.StringField(required=True)
+    day = fields.DateTimeField(required=True)  # Midnight (UTC)
+
+    # Bit i of *_am is slot i, bit i of *_pm is slot HALF_DAY_SLOTS + i
+    booked_am = fields.LongField(default=0)
+    booked_pm = fields.LongField(default=0)
+    blocked_am = fields.LongField(default=0)
+    blocked_pm = fields.LongField(default=0)
+
+    updated_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'court_occupancy',
+        'indexes': [
+            [('court', 1), ('day', 1)],
+            'day',
+        ]
+    }
+
+    def __str__(self):
+        return f"Occupancy {self.id}"
+
+    @property
+    def booked(self):
+        """Booked slots as a 96-bit integer"""
+        return (self.booked_am or 0) | ((self.booked_pm or 0) << HALF_DAY_SLOTS)
+
+    @property
+    def blocked(self):
+        """Blocked slots as a 96-bit integer"""
+        return (self.blocked_am or 0) | ((self.blocked_pm or 0) << HALF_DAY_SLOTS)
+
+    def to_bytes(self):
+        """Pack booked and blocked bitmaps into 24 bytes"""
+        size = SLOTS_PER_DAY // 8
+        return self.booked.to_bytes(size, 'little') + self.blocked.to_bytes(size, 'little')
+
+    def slot_states(self):
+        """Get state of every slot of the day"""
+        return slot_states(self.booked, self.blocked)
+
+
+def occupancy_key(court_id, day):
+    """Build the key of a court's occupancy document for a date"""
+    return f"{court_id}:{day.isoformat()}"
+
+
+def slot_states(booked, blocked):
+    """Convert bitmaps to a list of SLOT_STATES values"""
+    states = []
+    for slot in range(SLOTS_PER_DAY):
+        bit = 1 << slot
+        if blocked & bit:
+            states.append('blocked')
+        elif booked & bit:
+            states.append('booked')
+        else:
+            states.append('free')
+    return states
+
+
+def encode_day(booked, blocked):
+    """Encode a day's bitmaps as a string with one SLOT_STATES index per slot"""
+    return ''.join(str(SLOT_STATES.index(state)) for state in slot_states(booked, blocked))
+
+
+def day_masks(start_time, end_time):
+    """
+    Split a time range into per-day slot masks.
+
+    Returns:
+        list of (date, mask) where mask is a 96-bit integer of the slots
+        of that day touched by [start_time, end_time)
+    """
+    start_time = to_naive_utc(start_time)
+    end_time = to_naive_utc(end_time)
+
+    masks = []
+    day = start_time.date()
+    while datetime(day.year, day.month, day.day) < end_time:
+        midnight = datetime(day.year, day.month, day.day)
+        range_start = max(start_time, midnight)
+        range_end = min(end_time, midnight + timedelta(days=1))
+
+        first_slot = int((range_start - midnight).total_seconds() // (SLOT_MINUTES * 60))
+        # Round the end up so partially used slots count as occupied
+        last_slot = -int(-(range_end - midnight).total_seconds() // (SLOT_MINUTES * 60))
+
+        if last_slot > first_slot:
+            mask = ((1 << (last_slot - first_slot)) - 1) << first_slot
+            masks.append((day, mask))
+        day += timedelta(days=1)
+
+    return masks
+
+
+def _bit_update(court_id, day, mask, kind, set_bits):
+    """Build the (filter, update) setting or clearing bits of one state for a day"""
+    halves = {'am': mask & HALF_MASK, 'pm': mask >> HALF_DAY_SLOTS}
+    bit_ops = {}
+    for half, value in halves.items():
+        if not value:
+            continue
+        if set_bits:
+            bit_ops[f'{kind}_{half}'] = {'or': Int64(value)}
+        else:
+            bit_ops[f'{kind}_{half}'] = {'and': Int64(HALF_MASK ^ value)}
+
+    return (
+        {'_id': occupancy_key(court_id, day)},
+        {
+            '$bit': bit_ops,
+            '$set': {'updated_at': datetime.utcnow()},
+            '$setOnInsert': {
+                'court': court_id,
+                'day': datetime(day.year, day.month, day.day),
+            },
+        },
+    )
+
+
+def _update_bits(court_id, start_time, end_time, kind, set_bits):
+    """Atomically set or clear bits of one state for a time range"""
+    collection = CourtOccupancy._get_collection()
+    court_id = str(court_id)
+
+    for day, mask in day_masks(start_time, end_time):
+        collection.update_one(*_bit_update(court_id, day, mask, kind, set_bits), upsert=True)
+
+
+def mark_booked(court_id, start_time, end_time):
+    """Mark a time range of a court as booked"""
+    _update_bits(court_id, start_time, end_time, 'booked', True)
+
+
+def mark_booked_many(court_id, ranges):
+    """
+    Mark many time ranges of a court as booked with one bulk write
+    (one update per touched day).
+    """
+    from pymongo import UpdateOne
+
+    court_id = str(court_id)
+    masks = {}
+    for start_time, end_time in ranges:
+        for day, mask in day_masks(start_time, end_time):
+            masks[day] = masks.get(day, 0) | mask
+    if masks:
+        CourtOccupancy._get_collection().bulk_write([
+            UpdateOne(*_bit_update(court_id, day, mask, 'booked', True), upsert=True)
+            for day, mask in masks.items()
+        ], ordered=False)
+
+
+def clear_booked(court_id, start_time, end_time, booking_id=None):
+    """
+    Mark a booked time range of a court as free again.
+
+    day_masks rounds partial slots outward, so the cleared mask can cover an
+    edge slot still used by an adjacent booking (off-grid times). Bookings
+    still holding bits around the range, except booking_id, are marked
+    again after clearing.
+    """
+    from apps.bookings.models import Booking
+
+    _update_bits(court_id, start_time, end_time, 'booked', False)
+
+    slot = timedelta(minutes=SLOT_MINUTES)
+    neighbours = Booking.objects(
+        court=str(court_id),
+        status__in=['pending', 'confirmed', 'completed'],
+        start_time__lt=to_naive_utc(end_time) + slot,
+        end_time__gt=to_naive_utc(start_time) - slot
+    ).only('id', 'start_time', 'end_time').as_pymongo()
+    for row in neighbours:
+        if booking_id is None or str(row['_id']) != str(booking_id):
+            mark_booked(court_id, row['start_time'], row['end_time'])
+
+
+def mark_blocked(court_id, start_time, end_time):
+    """Mark a time range of a court as blocked by an admin"""
+    _update_bits(court_id, start_time, end_time, 'blocked', True)
+
+
+def clear_blocked(court_id, start_time, end_time):
+    """Remove an admin block from a time range"""
+    _update_bits(court_id, start_time, end_time, 'blocked', False)
+
+
+def get_occupancy(court_ids, first_day, last_day):
+    """
+    Load occupancy of many courts for a date range with a single query.
+
+    Returns:
+        dict: {(court_id, date): (booked, blocked)} for days that have a document
+    """
+    rows = CourtOccupancy.objects(
+        court__in=[str(court_id) for court_id in court_ids],
+        day__gte=datetime(first_day.year, first_day.month, first_day.day),
+        day__lte=datetime(last_day.year, last_day.month, last_day.day)
+    ).as_pymongo()
+
+    occupancy = {}
+    for row in rows:
+        booked = row.get('booked_am', 0) | (row.get('booked_pm', 0) << HALF_DAY_SLOTS)
+        blocked = row.get('blocked_am', 0) | (row.get('blocked_pm', 0) << HALF_DAY_SLOTS)
+        occupancy[(row['court'], row['day'].date())] = (booked, blocked)
+    return occupancy
+
+
+def is_range_free(occupancy, court_id, start_time, end_time):
+    """Check a time range against occupancy loaded with get_occupancy()"""
+    court_id = str(court_id)
+    for day, mask in day_masks(start_time, end_time):
+        booked, blocked = occupancy.get((court_id, day), (0, 0))
+        if (booked | blocked) & mask:
+            return False
+    return True
+
+
+def is_court_free(court_id, start_time, end_time):
+    """Check if no slot of a court is booked or blocked in a time range"""
+    masks = day_masks(start_time, end_time)
+    if not masks:
+        return True
+    occupancy = get_occupancy([court_id], masks[0][0], masks[-1][0])
+    return is_range_free(occupancy, court_id, start_time, end_time)
+
+
+def day_runs(booked, blocked, day):
+    """Collapse a day's bitmaps into contiguous runs of equal state"""
+    midnight = datetime(day.year, day.month, day.day)
+    runs = []
+    states = slot_states(booked, blocked)
+    run_start = 0
+    for slot in range(1, SLOTS_PER_DAY + 1):
+        if slot == SLOTS_PER_DAY or states[slot] != states[run_start]:
+            runs.append({
+                'start_time': midnight + timedelta(minutes=run_start * SLOT_MINUTES),
+                'end_time': midnight + timedelta(minutes=slot * SLOT_MINUTES),
+                'status': states[run_start],
+            })
+            run_start = slot
+    return runs
@@ -0,0 +1,78 @@
+"""
+Lightweight court read models
+
+List responses need a handful of court fields, while a Court document also
+carries its tariffs and attributes (and, until migrate_court_slots.py has
+run, the embedded availability_slots history). The helpers here read only
+the listed fields as raw documents (only() + as_pymongo()) and build
+response dicts directly, without Document instances, so the memory and
+BSON decode cost per court stays constant whatever a court document holds.
+"""
+from django.conf import settings
+from apps.courts.models import Court
+
+# Fields of a court list item (same output as CourtListSerializer)
+COURT_LIST_FIELDS = ['id', 'name_i18n', 'address', 'type', 'images', 'is_active']
+
+
+def list_projection(fields=None):
+    """Raw projection of court fields ({db_field: 1})"""
+    return {Court._fields[field].db_field: 1 for field in (fields or COURT_LIST_FIELDS)}
+
+
+def absolute_image_url(url):
+    """Make a relative media URL absolute"""
+    if url and not url.startswith('http'):
+        return f"{getattr(settings, 'BASE_URL', 'http://192.168.31.106:8000')}{url}"
+    return url
+
+
+def court_name(name_i18n, language='tk'):
+    """Get a court name from raw name_i18n (as Court.get_name)"""
+    name_i18n = name_i18n or {}
+    return name_i18n.get(language, name_i18n.get('tk', ''))
+
+
+def court_list_item(row, distance=None):
+    """Build a court list item from a raw court document"""
+    return {
+        'id': str(row['_id']),
+        'name_i18n': row.get('name_i18n') or {},
+        'address': row.get('address'),
+        'type': row.get('type'),
+        'images': [absolute_image_url(url) for url in row.get('images') or []],
+        'is_active': bool(row.get('is_active', True)),
+        'distance': distance,
+    }
+
+
+def get_court_list_items(court_ids):
+    """
+    Load list items of several courts with one projected query.
+
+    Returns:
+        dict: court id -> list item
+    """
+    court_ids = list(set(str(court_id) for court_id in court_ids if court_id))
+    if not court_ids:
+        return {}
+    return {
+        str(row['_id']): court_list_item(row)
+        for row in Court.objects(id__in=court_ids).only(*COURT_LIST_FIELDS).as_pymongo()
+    }
+
+
+def get_court_names(court_ids, language='tk'):
+    """
+    Load names of several courts with one projected query.
+
+    Returns:
+        dict: court id -> name
+    """
+    court_ids = list(set(str(court_id) for court_id in court_ids if court_id))
+    if not court_ids:
+        return {}
+    return {
+        str(row['_id']): court_name(row.get('name_i18n'), language)
+        for row in Court.objects(id__in=court_ids).only('id', 'name_i18n').as_pymongo()
+    }
@@ -0,0 +1,125 @@
+"""
+Time-bucketed court slots
+
+Explicit court slots (admin blocks, legacy booked/free entries) live in the
+court_slots collection, one document per (court, day) keyed
+"<court_id>:<YYYY-MM-DD>". A slot belongs to the day it starts on, so a
+day's slots are one point read and courts no longer carry their slot
+history. Buckets expire through a TTL index COURT_SLOTS_RETENTION_DAYS
+after their day.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from mongoengine import Document, fields
+from apps.core.mongo_utils import to_naive_utc
+from apps.courts.models import AvailabilitySlot
+
+
+class CourtSlotBucket(Document):
+    """Slots of one court starting on one day"""
+
+    # "<court_id>:<YYYY-MM-DD>"
+    id = fields.StringField(primary_key=True)
+
+    court = fields.StringField(required=True)
+    day = fields.DateTimeField(required=True)  # Midnight (UTC)
+    slots = fields.ListField(fields.EmbeddedDocumentField(AvailabilitySlot))
+
+    expires_at = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'court_slots',
+        'indexes': [
+            [('court', 1), ('day', 1)],
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+    def __str__(self):
+        return f"CourtSlots {self.id} ({len(self.slots)})"
+
+
+def get_retention():
+    """Get how long buckets are kept after their day"""
+    return timedelta(days=getattr(settings, 'COURT_SLOTS_RETENTION_DAYS', 90))
+
+
+def day_start(moment):
+    """Get midnight of a datetime or date"""
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def bucket_key(court_id, day):
+    """Get the key of a court's bucket for a day"""
+    return f"{court_id}:{day_start(day).date().isoformat()}"
+
+
+def slot_document(start_time, end_time, status, booking_id=None):
+    """Raw slot subdocument (as AvailabilitySlot stores it)"""
+    slot = {
+        'start_time': to_naive_utc(start_time),
+        'end_time': to_naive_utc(end_time),
+        'status': status,
+    }
+    if booking_id:
+        slot['booking_id'] = str(booking_id)
+    return slot
+
+
+def add_slots_operation(court_id, day, slots):
+    """
+    Build the upsert adding raw slots to a bucket.
+
+    $addToSet keeps re-applied slots (e.g. a resumed migration) unique.
+
+    Returns:
+        tuple: (filter, update)
+    """
+    day = day_start(day)
+    return (
+        {'_id': bucket_key(court_id, day)},
+        {
+            '$addToSet': {'slots': {'$each': slots}},
+            '$setOnInsert': {
+                'court': str(court_id),
+                'day': day,
+                'expires_at': day + timedelta(days=1) + get_retention(),
+            },
+        },
+    )
+
+
+def add_slot(court_id, start_time, end_time, status, booking_id=None):
+    """Store a slot in its court/day bucket"""
+    start_time = to_naive_utc(start_time)
+    query, update = add_slots_operation(
+        court_id, start_time, [slot_document(start_time, end_time, status, booking_id)]
+    )
+    CourtSlotBucket._get_collection().update_one(query, update, upsert=True)
+
+
+def remove_slot(court_id, start_time, end_time, status):
+    """
+    Remove slots of a status exactly matching a time range.
+
+    Returns:
+        bool: whether a slot was removed
+    """
+    start_time = to_naive_utc(start_time)
+    result = CourtSlotBucket._get_collection().update_one(
+        {'_id': bucket_key(court_id, start_time)},
+        {'$pull': {'slots': {
+            'status': status,
+            'start_time': start_time,
+            'end_time': to_naive_utc(end_time),
+        }}}
+    )
+    return result.modified_count > 0
+
+
+def get_slots_for_date(court_id, day):
+    """Get the slots of a court starting on a day, ordered by start"""
+    bucket = CourtSlotBucket.objects(id=bucket_key(court_id, day)).only('slots').first()
+    if not bucket:
+        return []
+    return sorted(bucket.slots, key=lambda slot: slot.start_time)
@@ -11,8 +11,13 @@ router.register(r'admin/courts', views.AdminCourtViewSet, basename='admin-court'
 
 urlpatterns = [
     # Court availability
+    path('courts/availability/grid/', views.court_availability_grid, name='court-availability-grid'),
+    path('courts/free/nearest/', views.nearest_free_courts, name='nearest-free-courts'),
     path('courts/<uuid:court_id>/availability/', views.court_availability, name='court-availability'),
     
+    # Admin time blocking
+    path('admin/courts/<uuid:court_id>/block/', views.block_court_time, name='block-court-time'),
+    
     # Image upload/delete
     path('admin/courts/upload-image/', views_upload.upload_court_image, name='upload-court-image'),
     path('admin/courts/<uuid:court_id>/images/<int:image_index>/', views_upload.delete_court_image, name='delete-court-image'),
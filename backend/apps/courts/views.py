@@ -2,18 +2,26 @@
 Court views for MongoDB
 """
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from apps.core.mongoengine_drf import MongoEngineModelViewSet, GeoQueryMixin
+from apps.core.mongoengine_drf import (
+    MongoEngineModelViewSet, MongoEngineCursorPagination, GeoNearCursorPagination, GeoQueryMixin
+)
+from apps.core.permissions import IsAdminUser
 from apps.courts.models import Court
+from apps.courts.read_models import COURT_LIST_FIELDS, court_list_item, list_projection
 from apps.courts.serializers import (
     CourtSerializer, CourtListSerializer, CourtDetailSerializer
 )
 
 
-class CourtViewSet(MongoEngineModelViewSet, GeoQueryMixin):
+DEFAULT_SEARCH_RADIUS_KM = 10.0
+MAX_SEARCH_RADIUS_KM = 200.0
+
+
+class CourtViewSet(MongoEngineModelViewSet):
     """Court search and details (read-only for users)"""
     permission_classes = [AllowAny]
     
@@ -25,31 +33,6 @@ class CourtViewSet(MongoEngineModelViewSet, GeoQueryMixin):
         if court_type:
             queryset = queryset.filter(type=court_type)
         
-        # Filter by location and radius
-        lat = self.request.query_params.get('lat')
-        lng = self.request.query_params.get('lng')
-        radius_km = self.request.query_params.get('radius_km', 10.0)
-        
-        # Convert to float if provided
-        if lat:
-            try:
-                lat = float(lat)
-            except (ValueError, TypeError):
-                lat = None
-        if lng:
-            try:
-                lng = float(lng)
-            except (ValueError, TypeError):
-                lng = None
-        if radius_km:
-            try:
-                radius_km = float(radius_km)
-            except (ValueError, TypeError):
-                radius_km = 10.0
-        
-        if lat and lng:
-            queryset = self.filter_by_location(queryset, lat, lng, radius_km)
-        
         return queryset
     
     def get_serializer_class(self):
@@ -58,42 +41,56 @@ class CourtViewSet(MongoEngineModelViewSet, GeoQueryMixin):
         return CourtListSerializer
     
     def list(self, request, *args, **kwargs):
-        """List courts with distance calculation"""
-        queryset = self.get_queryset()
+        """
+        List courts, nearest first when lat/lng are given
         
-        # Get user location for distance calculation
-        lat = request.query_params.get('lat')
-        lng = request.query_params.get('lng')
+        Query params:
+        - lat, lng: search point (optional)
+        - radius_km: float (default 10, max 200)
+        - type: court type (optional)
+        - cursor, page_size: cursor pagination; with a location, pages go
+          outward by distance
+        """
+        lat = self._get_float('lat')
+        lng = self._get_float('lng')
         
-        # Convert to float if provided
-        if lat:
-            try:
-                lat = float(lat)
-            except (ValueError, TypeError):
-                lat = None
-        if lng:
-            try:
-                lng = float(lng)
-            except (ValueError, TypeError):
-                lng = None
+        # Without a location: newest courts first
+        if lat is None or lng is None:
+            paginator = MongoEngineCursorPagination(ordering='-created_at', page_size=100)
+            rows = paginator.paginate_queryset(
+                self.get_queryset().only(*COURT_LIST_FIELDS, 'created_at').as_pymongo(), request
+            )
+            return paginator.get_paginated_response([court_list_item(row) for row in rows])
         
-        courts = list(queryset[:100])  # Limit results
+        radius_km = self._get_float('radius_km')
+        if radius_km is None:
+            radius_km = DEFAULT_SEARCH_RADIUS_KM
+        radius_km = max(0.1, min(radius_km, MAX_SEARCH_RADIUS_KM))
+        
+        query = {'is_active': True}
+        court_type = request.query_params.get('type')
+        if court_type:
+            query['type'] = court_type
         
-        # Calculate distances
-        if lat and lng:
-            for court in courts:
-                if court.location:
-                    court._distance = self.calculate_distance(
-                        court.location, [lng, lat]
-                    )
-                else:
-                    court._distance = None
-            
-            # Sort by distance
-            courts.sort(key=lambda c: c._distance or 999999)
+        # One $geoNear over the (location, type, is_active) index: the
+        # database computes distances and only list fields are returned
+        paginator = GeoNearCursorPagination()
+        rows = paginator.paginate_geo_near(
+            Court._get_collection(), lng, lat, radius_km * 1000, query, request,
+            stages=[{'$project': dict(list_projection(), **{paginator.distance_field: 1})}],
+        )
         
-        serializer = self.get_serializer(courts, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response([
+            court_list_item(row, round(row[paginator.distance_field] / 1000, 2))  # km
+            for row in rows
+        ])
+    
+    def _get_float(self, name):
+        """Get a float query parameter, None when missing or invalid"""
+        try:
+            return float(self.request.query_params[name])
+        except (KeyError, ValueError, TypeError):
+            return None
 
 
 # Admin court views
@@ -142,8 +139,193 @@ def court_availability(request, court_id):
             for slot in slots
         ]
         
-        return Response({'availability': availability})
+        occupancy = [
+            {
+                'start_time': run['start_time'].isoformat(),
+                'end_time': run['end_time'].isoformat(),
+                'status': run['status'],
+            }
+            for run in court.get_occupancy_for_date(date)
+        ]
+        
+        return Response({'availability': availability, 'occupancy': occupancy})
         
     except ValueError:
         return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, 
                        status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def block_court_time(request, court_id):
+    """Block (POST) or unblock (DELETE) a court time range (admin)"""
+    from dateutil import parser
+    
+    try:
+        court = Court.objects.get(id=court_id)
+    except Court.DoesNotExist:
+        return Response({'error': 'Court not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    start_time_str = request.data.get('start_time')
+    end_time_str = request.data.get('end_time')
+    if not start_time_str or not end_time_str:
+        return Response({
+            'error': 'Missing parameters',
+            'required': ['start_time', 'end_time']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        start_time = parser.parse(start_time_str)
+        end_time = parser.parse(end_time_str)
+    except (ValueError, OverflowError) as e:
+        return Response({'error': f'Invalid parameters: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if start_time >= end_time:
+        return Response({'error': 'End time must be after start time'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if request.method == 'DELETE':
+        if not court.unblock_time(start_time, end_time):
+            return Response({'error': 'Blocked slot not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Time range unblocked'})
+    
+    court.block_time(start_time, end_time)
+    return Response({'message': 'Time range blocked'}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+def court_availability_grid(request):
+    """
+    Get availability of many courts over a date range in one call
+    
+    Query params:
+    - court_ids: comma separated court ids, or
+    - lat, lng, radius_km, type: select active courts by location/type
+    - date_from, date_to: YYYY-MM-DD (inclusive, at most 14 days)
+    
+    Every day is a string with one character per slot
+    (see 'legend', 'slot_minutes').
+    """
+    from datetime import datetime, timedelta
+    from apps.courts.occupancy import (
+        get_occupancy, encode_day, SLOT_MINUTES, SLOT_STATES
+    )
+    
+    max_days = 14
+    max_courts = 50
+    
+    date_from_str = request.query_params.get('date_from')
+    date_to_str = request.query_params.get('date_to', date_from_str)
+    if not date_from_str:
+        return Response({'error': 'date_from parameter required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
+        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+    except ValueError:
+        return Response({'error': 'Invalid date format. Use YYYY-MM-DD'},
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    if date_to < date_from or (date_to - date_from).days >= max_days:
+        return Response({'error': f'Date range must be between 1 and {max_days} days'},
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    court_ids_param = request.query_params.get('court_ids')
+    if court_ids_param:
+        court_ids = [court_id.strip() for court_id in court_ids_param.split(',') if court_id.strip()]
+        court_ids = list(dict.fromkeys(court_ids))[:max_courts]
+    else:
+        queryset = Court.objects.filter(is_active=True)
+        
+        court_type = request.query_params.get('type')
+        if court_type:
+            queryset = queryset.filter(type=court_type)
+        
+        try:
+            lat = float(request.query_params.get('lat'))
+            lng = float(request.query_params.get('lng'))
+            radius_km = float(request.query_params.get('radius_km', 10.0))
+            queryset = GeoQueryMixin().filter_by_location(queryset, lat, lng, radius_km)
+        except (ValueError, TypeError):
+            pass
+        
+        court_ids = [str(row['_id']) for row in queryset.only('id').limit(max_courts).as_pymongo()]
+    
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    occupancy = get_occupancy(court_ids, date_from, date_to)
+    
+    courts = []
+    for court_id in court_ids:
+        courts.append({
+            'court_id': court_id,
+            'days': {
+                day.isoformat(): encode_day(*occupancy.get((court_id, day), (0, 0)))
+                for day in days
+            }
+        })
+    
+    return Response({
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'slot_minutes': SLOT_MINUTES,
+        'legend': {str(idx): state for idx, state in enumerate(SLOT_STATES)},
+        'courts': courts,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def nearest_free_courts(request):
+    """
+    Get the nearest courts that are free for a time range
+    
+    Query params:
+    - lat, lng: search point (required)
+    - start_time, end_time: ISO datetimes (required)
+    - type: court type (optional)
+    - radius_km: float (default 10, max 200)
+    - limit: number of courts (default 10, max 50)
+    
+    Two queries in total: $geoNear for the nearest candidate courts and one
+    occupancy read for all of them.
+    """
+    from dateutil import parser
+    from apps.courts.nearest_free import DISTANCE_FIELD, nearest_free_courts as find_nearest_free
+    
+    try:
+        lat = float(request.query_params['lat'])
+        lng = float(request.query_params['lng'])
+        start_time = parser.parse(request.query_params['start_time'])
+        end_time = parser.parse(request.query_params['end_time'])
+    except KeyError:
+        return Response({
+            'error': 'Missing parameters',
+            'required': ['lat', 'lng', 'start_time', 'end_time']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except (ValueError, OverflowError) as e:
+        return Response({'error': f'Invalid parameters: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if start_time >= end_time:
+        return Response({'error': 'End time must be after start time'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        radius_km = float(request.query_params.get('radius_km', DEFAULT_SEARCH_RADIUS_KM))
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response({'error': 'radius_km and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    radius_km = max(0.1, min(radius_km, MAX_SEARCH_RADIUS_KM))
+    limit = max(1, min(limit, 50))
+    
+    rows, checked = find_nearest_free(
+        lng, lat, radius_km * 1000, start_time, end_time, limit,
+        court_type=request.query_params.get('type')
+    )
+    
+    return Response({
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat(),
+        'courts_checked': checked,
+        'results': [
+            court_list_item(row, round(row[DISTANCE_FIELD] / 1000, 2))  # km
+            for row in rows
+        ],
+    })
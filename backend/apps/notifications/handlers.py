@@ -0,0 +1,107 @@
+"""
+Notification domain event handlers (see settings.DOMAIN_EVENT_HANDLERS)
+"""
+from apps.notifications.services import (
+    create_notification, notify_opponent_matched, notify_seeker_matched
+)
+
+
+def _claim_notified(match, flag):
+    """Set a match notified flag; False when it was already set"""
+    from apps.bookings.matching import OpponentMatch
+    # __ne also claims matches stored before the flag existed
+    return OpponentMatch.objects(id=match.id, **{f'{flag}__ne': True}).update_one(**{f'set__{flag}': True}) == 1
+
+
+def _release_notified(match, flag):
+    from apps.bookings.matching import OpponentMatch
+    OpponentMatch.objects(id=match.id).update_one(**{f'set__{flag}': False})
+
+
+def notify_match_created(event):
+    """match.created: notify both players once per match"""
+    from apps.bookings.matching import OpponentMatch
+
+    match = OpponentMatch.objects(id=event['payload']['match_id']).first()
+    if not match or not match.opponent:
+        return
+    booking = match.booking
+
+    # The notified flags make redelivered or republished events no-ops
+    for flag, notify in [
+        ('opponent_notified', lambda: notify_opponent_matched(booking, match.opponent)),
+        ('seeker_notified', lambda: notify_seeker_matched(booking, match.opponent)),
+    ]:
+        if not _claim_notified(match, flag):
+            continue
+        try:
+            notify()
+        except Exception:
+            _release_notified(match, flag)
+            raise
+
+
+def notify_booking_cancelled(event):
+    """
+    booking.cancelled: tell matched opponents that the game is off, once per
+    match (cancellation_notified)
+    """
+    from apps.bookings.models import Booking
+    from apps.bookings.matching import OpponentMatch, FILLED_MATCH_STATUSES
+
+    booking = Booking.objects(id=event['payload']['booking_id']).first()
+    if not booking:
+        return
+
+    matches = OpponentMatch.objects(
+        booking=booking.id, status__in=FILLED_MATCH_STATUSES, opponent__ne=None
+    )
+    if not matches:
+        return
+
+    court_name = booking.court.get_name() if booking.court else 'Court'
+    start_time = booking.start_time.strftime('%d %B, %H:%M')
+    reason = event['payload'].get('cancellation_reason') or booking.cancellation_reason or ''
+
+    title_i18n = {
+        'en': 'Match Cancelled',
+        'ru': 'Матч отменён',
+        'tk': 'Duşuşyk ýatyryldy',
+    }
+    if reason == 'expired':
+        # Cancelled by the lifecycle job, not by the seeker
+        message_i18n = {
+            'en': f'The match on {start_time} at {court_name} was cancelled because the booking was not confirmed',
+            'ru': f'Матч {start_time} на {court_name} отменён: бронирование не было подтверждено',
+            'tk': f'{start_time} wagtyndaky {court_name}-daky duşuşyk bron tassyklanmansoň ýatyryldy',
+        }
+    else:
+        seeker_nickname = booking.user.nickname
+        message_i18n = {
+            'en': f'{seeker_nickname} cancelled the match on {start_time} at {court_name}',
+            'ru': f'{seeker_nickname} отменил матч {start_time} на {court_name}',
+            'tk': f'{seeker_nickname} {start_time} wagtyndaky {court_name}-daky duşuşygy ýatyrdy',
+        }
+
+    for match in matches:
+        # A retried delivery skips opponents already notified
+        if not _claim_notified(match, 'cancellation_notified'):
+            continue
+        try:
+            create_notification(
+                user=match.opponent,
+                notification_type='booking_cancelled',
+                title_i18n=title_i18n,
+                message_i18n=message_i18n,
+                data={
+                    'booking_id': str(booking.id),
+                    'court_id': str(booking.court.id) if booking.court else None,
+                    'court_name': court_name,
+                    'start_time': booking.start_time.isoformat(),
+                    'end_time': booking.end_time.isoformat(),
+                    'cancellation_reason': reason,
+                }
+            )
+        except Exception:
+            _release_notified(match, 'cancellation_notified')
+            raise
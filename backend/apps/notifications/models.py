@@ -50,7 +50,7 @@ class Notification(Document):
             'type',
             'is_read',
             'created_at',
-            [('user', 1), ('created_at', -1)],
+            [('user', 1), ('created_at', -1), ('id', -1)],  # Cursor pagination
             [('user', 1), ('is_read', 1)],
         ]
     }
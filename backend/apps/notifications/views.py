@@ -5,6 +5,7 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from apps.core.mongoengine_drf import MongoEngineCursorPagination
 from apps.notifications.models import Notification, PushToken
 from apps.notifications.serializers import (
     NotificationSerializer,
@@ -17,10 +18,11 @@ from apps.notifications.services import register_push_token, unregister_push_tok
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_notifications(request):
-    """List notifications for current user"""
-    notifications = Notification.objects(user=request.user).order_by('-created_at')
-    serializer = NotificationSerializer([n for n in notifications], many=True)
-    return Response(serializer.data)
+    """List notifications for current user, newest first (cursor paginated)"""
+    paginator = MongoEngineCursorPagination(ordering='-created_at')
+    notifications = paginator.paginate_queryset(Notification.objects(user=request.user), request)
+    serializer = NotificationSerializer(notifications, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
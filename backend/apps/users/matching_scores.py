@@ -0,0 +1,221 @@
+"""
+Vectorized partner compatibility scoring
+
+A wide pool of candidate users is loaded as raw documents, packed into NumPy
+arrays and scored in one pass. Every term is normalized to [0, 1] and
+weighted by settings.MATCHING_WEIGHTS; the final score is 0-100.
+
+Terms:
+- level_difference: 1 - |level difference| / 3
+- common_categories: shared sports, saturating at 3
+- distance: exponential decay with MATCHING_DISTANCE_SCALE_KM (same city
+  counts as close when either user has no location)
+- rating: 1 - |rating difference| / 10
+- last_active: halves every MATCHING_LAST_ACTIVE_HALF_LIFE_DAYS
+"""
+from datetime import datetime
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+
+# User fields needed for scoring and for the response
+CANDIDATE_FIELDS = [
+    'id', 'first_name', 'last_name', 'avatar_url', 'experience_level',
+    'rating', 'city', 'location', 'categories', 'last_active_at',
+]
+
+
+def _coordinates(location):
+    """Get (lat, lng) of a stored GeoJSON point or [lng, lat] pair"""
+    if not location:
+        return None
+    if isinstance(location, dict):
+        location = location.get('coordinates')
+    if not location or len(location) != 2:
+        return None
+    return location[1], location[0]
+
+
+def _category_ids(categories):
+    return set(str(category.get('category_id') if isinstance(category, dict) else category.category_id)
+               for category in categories or [])
+
+
+def pack_candidates(rows):
+    """
+    Pack raw user documents into column arrays.
+
+    Returns:
+        dict of NumPy arrays (one entry per candidate) plus the category
+        vocabulary
+    """
+    count = len(rows)
+    levels = np.zeros(count)
+    ratings = np.zeros(count)
+    lat = np.full(count, np.nan)
+    lng = np.full(count, np.nan)
+    last_active = np.full(count, np.nan)
+    cities = np.empty(count, dtype=object)
+
+    vocabulary = {}
+    category_rows = []
+    for i, row in enumerate(rows):
+        levels[i] = row.get('experience_level') or 0
+        ratings[i] = row.get('rating') or 0.0
+        cities[i] = row.get('city') or None
+        coordinates = _coordinates(row.get('location'))
+        if coordinates:
+            lat[i], lng[i] = coordinates
+        if row.get('last_active_at'):
+            last_active[i] = row['last_active_at'].timestamp()
+        category_rows.append([
+            vocabulary.setdefault(category_id, len(vocabulary))
+            for category_id in _category_ids(row.get('categories'))
+        ])
+
+    categories = np.zeros((count, max(len(vocabulary), 1)), dtype=bool)
+    for i, columns in enumerate(category_rows):
+        categories[i, columns] = True
+
+    return {
+        'levels': levels,
+        'ratings': ratings,
+        'lat': lat,
+        'lng': lng,
+        'last_active': last_active,
+        'cities': cities,
+        'categories': categories,
+        'vocabulary': vocabulary,
+    }
+
+
+def score_candidates(user, packed, weights=None, now=None):
+    """
+    Score all packed candidates against a user in one pass.
+
+    Returns:
+        np.ndarray: scores 0-100
+    """
+    weights = weights or settings.MATCHING_WEIGHTS
+    now = now or datetime.utcnow()
+    count = len(packed['levels'])
+    if not count:
+        return np.zeros(0)
+
+    terms = {}
+
+    # Experience level similarity
+    if user.experience_level:
+        level_diff = np.abs(packed['levels'] - user.experience_level)
+        level_term = np.clip(1 - level_diff / 3, 0, 1)
+        terms['level_difference'] = np.where(packed['levels'] > 0, level_term, 0)
+    else:
+        terms['level_difference'] = np.zeros(count)
+
+    # Shared sports
+    user_vector = np.zeros(packed['categories'].shape[1], dtype=bool)
+    for category_id in _category_ids(user.categories):
+        column = packed['vocabulary'].get(category_id)
+        if column is not None:
+            user_vector[column] = True
+    common = packed['categories'].astype(np.int32) @ user_vector.astype(np.int32)
+    terms['common_categories'] = np.minimum(common, 3) / 3
+
+    # Distance (haversine), same city when a location is missing
+    same_city = (packed['cities'] == user.city) if user.city else np.zeros(count, dtype=bool)
+    same_city = same_city.astype(float)
+    coordinates = _coordinates(user.location)
+    if coordinates:
+        lat1, lng1 = np.radians(coordinates[0]), np.radians(coordinates[1])
+        lat2, lng2 = np.radians(packed['lat']), np.radians(packed['lng'])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        scale = getattr(settings, 'MATCHING_DISTANCE_SCALE_KM', 10)
+        distance_term = np.exp(-distance_km / scale)
+        terms['distance'] = np.where(np.isnan(distance_km), same_city, distance_term)
+    else:
+        terms['distance'] = same_city
+
+    # Rating similarity
+    if user.rating:
+        rating_term = np.clip(1 - np.abs(packed['ratings'] - user.rating) / 10, 0, 1)
+        terms['rating'] = np.where(packed['ratings'] > 0, rating_term, 0)
+    else:
+        terms['rating'] = np.zeros(count)
+
+    # Recent activity
+    half_life_days = getattr(settings, 'MATCHING_LAST_ACTIVE_HALF_LIFE_DAYS', 7)
+    idle_days = np.maximum(now.timestamp() - packed['last_active'], 0) / 86400
+    terms['last_active'] = np.nan_to_num(0.5 ** (idle_days / half_life_days), nan=0.0)
+
+    total_weight = sum(weights.get(name, 0) for name in terms)
+    if total_weight <= 0:
+        return np.zeros(count)
+
+    score = sum(weights.get(name, 0) * term for name, term in terms.items())
+    return np.clip(np.rint(100 * score / total_weight), 0, 100)
+
+
+def top_k(scores, k):
+    """Get indexes of the k highest scores, best first"""
+    if k <= 0 or not len(scores):
+        return np.zeros(0, dtype=int)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def candidate_query(user, target_level=None, city=None, category_id=None):
+    """
+    Build User filters for partner candidates of a user.
+
+    Defaults to the user's own level ±1; city and category are optional.
+    """
+    target_level = target_level or user.experience_level or 3
+    query = {
+        'is_active': True,
+        'is_banned': False,
+        'id__ne': user.id,  # Exclude the user
+        'experience_level__gte': max(1, target_level - 1),
+        'experience_level__lte': min(7, target_level + 1),
+    }
+    if city:
+        query['city'] = city
+    if category_id:
+        query['categories__category_id'] = category_id
+    return query
+
+
+def rank_candidates(user, queryset, limit, pool_size=None):
+    """
+    Load a candidate pool from a User queryset and return the best matches.
+
+    Scoring is bounded by the pool: it holds the pool_size most recently
+    active matching users (a stable relevance proxy served by the candidate
+    index), so the result is the top K of that pool.
+
+    Returns:
+        list of (raw user document, score)
+    """
+    pool_size = pool_size or getattr(settings, 'MATCHING_CANDIDATE_POOL', 500)
+    rows = list(
+        queryset.order_by('-last_active_at').only(*CANDIDATE_FIELDS).limit(pool_size).as_pymongo()
+    )
+    return rank_rows(user, rows, limit)
+
+
+def rank_rows(user, rows, limit):
+    """
+    Score already loaded candidate documents and return the best matches.
+
+    Returns:
+        list of (raw user document, score)
+    """
+    if not rows:
+        return []
+
+    scores = score_candidates(user, pack_candidates(rows))
+    return [(rows[i], int(scores[i])) for i in top_k(scores, limit)]
@@ -2,8 +2,9 @@
 User models for MongoDB
 """
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from mongoengine import Document, EmbeddedDocument, fields
+from django.conf import settings
 from django.contrib.auth.hashers import make_password, check_password
 
 
@@ -40,7 +41,7 @@ class User(Document):
     
     # Location
     city = fields.StringField(max_length=100)
-    location = fields.PointField()  # MongoDB 2dsphere GeoJSON point
+    location = fields.PointField(auto_index=False)  # MongoDB 2dsphere GeoJSON point (indexed in meta)
     
     # Sports profile
     categories = fields.ListField(fields.EmbeddedDocumentField(UserCategory))  # Legacy field for backward compatibility
@@ -80,9 +81,16 @@ class User(Document):
             'nickname',
             'email',
             'firebase_uid',
-            'location',  # 2dsphere index for geo queries
             'created_at',
+            'updated_at',
             'last_active_at',
+            # Partner search plan:
+            # $geoNear searches (search_partners, find_opponents with lat/lng)
+            # filter on level and activity inside the 2dsphere index
+            [('location', '2dsphere'), ('experience_level', 1), ('is_active', 1)],
+            # Non-geo candidate pools: equality fields, then the recency sort,
+            # then the level range
+            [('is_active', 1), ('is_banned', 1), ('city', 1), ('last_active_at', -1), ('experience_level', 1)],
         ]
     }
     
@@ -99,7 +107,26 @@ class User(Document):
         if self.categories and not self.favorite_sports:
             self.favorite_sports = self.categories
         
-        return super().save(*args, **kwargs)
+        is_new = self._created
+        changed_fields = set(field.split('.')[0] for field in getattr(self, '_changed_fields', []))
+        result = super().save(*args, **kwargs)
+        
+        # Partner recommendations that depend on this profile must be recomputed
+        from apps.users.recommendations import MATCHING_PROFILE_FIELDS, mark_profile_changed
+        if not is_new and changed_fields.intersection(MATCHING_PROFILE_FIELDS):
+            mark_profile_changed(self.id)
+        
+        return result
+    
+    def mark_active(self):
+        """Stamp last_active_at, at most once per LAST_ACTIVE_UPDATE_MINUTES"""
+        now = datetime.utcnow()
+        interval = timedelta(minutes=getattr(settings, 'LAST_ACTIVE_UPDATE_MINUTES', 5))
+        if self.last_active_at and now - self.last_active_at < interval:
+            return
+        # Direct update: activity is not a profile change, so save() hooks are skipped
+        User.objects(id=self.id).update_one(set__last_active_at=now)
+        self._data['last_active_at'] = now
     
     def set_password(self, raw_password):
         """Set password using Django's password hasher"""
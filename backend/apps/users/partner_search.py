@@ -0,0 +1,145 @@
+"""
+Geo partner search
+
+Partner searches with a location run as one $geoNear aggregation on users.
+Level, activity and ban filters go into the $geoNear query, so they are
+checked against the (location 2dsphere, experience_level, is_active) index
+while the index is walked outwards from the search point, and every row
+carries its distance in meters.
+
+When the in-memory player index is enabled (see player_index.py) it
+proposes the nearest user ids instead, and only those users are read back
+from MongoDB with the same filters. The index only holds recently active
+players, so MongoDB stays authoritative: whenever the index cannot fill the
+requested number of rows, the $geoNear search runs instead.
+"""
+from django.conf import settings
+from apps.core.mongoengine_drf import geo_near_stage
+from apps.users.models import User
+from apps.users.matching_scores import CANDIDATE_FIELDS
+from apps.users.player_index import player_index
+
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 100.0
+
+DISTANCE_FIELD = 'distance'
+
+
+def get_radius_m(radius_km):
+    """Clamp a requested search radius and convert it to meters"""
+    try:
+        radius_km = float(radius_km)
+    except (TypeError, ValueError):
+        radius_km = DEFAULT_RADIUS_KM
+    return max(0.1, min(radius_km, MAX_RADIUS_KM)) * 1000
+
+
+def get_search_point(user, lat=None, lng=None, use_profile=True):
+    """
+    Get the (lng, lat) to search around: explicit coordinates or, with
+    use_profile, the user's location
+    """
+    if lat not in (None, '') and lng not in (None, ''):
+        try:
+            return float(lng), float(lat)
+        except (TypeError, ValueError):
+            pass
+    if not use_profile:
+        return None
+    location = user.location
+    if isinstance(location, dict):
+        location = location.get('coordinates')
+    if location and len(location) == 2:
+        return float(location[0]), float(location[1])
+    return None
+
+
+def partner_query(user, min_level=None, max_level=None, city=None, category_id=None):
+    """Build User filters of a partner search"""
+    query = {
+        'is_active': True,
+        'is_banned': False,
+        'id__ne': user.id,  # Exclude the user
+    }
+    if min_level:
+        query['experience_level__gte'] = int(min_level)
+    if max_level:
+        query['experience_level__lte'] = int(max_level)
+    if city:
+        query['city'] = city
+    if category_id:
+        query['categories__category_id'] = category_id
+    return query
+
+
+def raw_query(filters):
+    """Translate User filter kwargs into the raw MongoDB filter"""
+    return User.objects(**filters)._query
+
+
+def projection_stage(fields=None):
+    """$project stage keeping the candidate fields and the distance"""
+    projection = {
+        User._fields[field].db_field: 1
+        for field in (fields or CANDIDATE_FIELDS)
+    }
+    projection[DISTANCE_FIELD] = 1
+    return {'$project': projection}
+
+
+def search_pipeline(filters, lng, lat, radius_m, limit):
+    """Build the $geoNear pipeline of the nearest matching users"""
+    return [
+        geo_near_stage(lng, lat, radius_m, raw_query(filters), 'location', DISTANCE_FIELD),
+        {'$limit': limit},
+        projection_stage(),
+    ]
+
+
+def load_hits(hits, filters, fields=None):
+    """
+    Read player index hits back from MongoDB with the search filters.
+    
+    Users that no longer match are dropped; order and distances are kept.
+    """
+    if not hits:
+        return []
+    rows = {
+        str(row['_id']): row
+        for row in User.objects(
+            id__in=[hit['_id'] for hit in hits], **filters
+        ).only(*(fields or CANDIDATE_FIELDS)).as_pymongo()
+    }
+    return [
+        dict(rows[hit['_id']], **{DISTANCE_FIELD: hit[DISTANCE_FIELD]})
+        for hit in hits
+        if hit['_id'] in rows
+    ]
+
+
+def nearby_candidates(user, filters, lng, lat, radius_m, pool_size=None, criteria=None):
+    """
+    Load the nearest matching users as raw documents, nearest first.
+    
+    criteria (min_level, max_level, city, category_id) narrows player index
+    hits before they are read back with filters.
+    
+    Returns:
+        list of raw user documents with the distance in meters
+    """
+    pool_size = pool_size or getattr(settings, 'MATCHING_CANDIDATE_POOL', 500)
+    
+    hits = player_index.nearest(lng, lat, radius_m, pool_size, exclude_id=user.id, **(criteria or {}))
+    if hits is not None:
+        rows = load_hits(hits, filters)
+        if len(rows) >= pool_size:
+            return rows
+    
+    pipeline = search_pipeline(filters, lng, lat, radius_m, pool_size)
+    return list(User._get_collection().aggregate(pipeline))
+
+
+def distance_km(row):
+    """Get a row's distance in km, rounded for responses"""
+    distance = row.get(DISTANCE_FIELD)
+    return round(distance / 1000, 2) if distance is not None else None
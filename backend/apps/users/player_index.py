@@ -0,0 +1,275 @@
+"""
+In-memory spatial index of recently active players
+
+Users with a location that were active within PLAYER_INDEX_ACTIVE_DAYS are
+kept in a grid of PLAYER_INDEX_CELL_KM cells together with their level,
+city and sports. The grid is loaded from MongoDB on first use and then
+refreshed incrementally every PLAYER_INDEX_REFRESH_SECONDS from the users
+whose last_active_at or updated_at moved since the previous refresh.
+
+Nearest-N and radius searches grow a search circle until it holds enough
+players, so only nearby cells are scanned. The index only proposes user ids
+ordered by distance; callers re-read those users from MongoDB with the full
+search filters, so a ban or deactivation not yet refreshed is never served.
+The index is off unless PLAYER_INDEX_ENABLED is set, and searches fall back
+to the MongoDB $geoNear query whenever it cannot answer.
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from mongoengine.queryset.visitor import Q
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+KM_PER_DEGREE = 111.32
+
+# Incremental refreshes re-read this much of the previous window, which
+# covers clock skew between app servers
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+INDEX_FIELDS = [
+    'id', 'location', 'experience_level', 'city', 'categories',
+    'last_active_at', 'is_active', 'is_banned',
+]
+
+
+def haversine_m(lng1, lat1, lng2, lat2):
+    """Great-circle distance between two points in meters"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (lng1, lat1, lng2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class PlayerEntry:
+    """Indexed search fields of one player"""
+    __slots__ = ('user_id', 'lng', 'lat', 'level', 'city', 'categories', 'last_active_at', 'cell')
+
+    def __init__(self, user_id, lng, lat, level, city, categories, last_active_at, cell):
+        self.user_id = user_id
+        self.lng = lng
+        self.lat = lat
+        self.level = level
+        self.city = city
+        self.categories = categories
+        self.last_active_at = last_active_at
+        self.cell = cell
+
+    def matches(self, min_level=None, max_level=None, city=None, category_id=None):
+        if min_level and (self.level or 0) < min_level:
+            return False
+        if max_level and (self.level or 0) > max_level:
+            return False
+        if city and self.city != city:
+            return False
+        if category_id and str(category_id) not in self.categories:
+            return False
+        return True
+
+
+class ActivePlayerIndex:
+    """Process-local grid of recently active players' locations"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._entries = {}  # user_id -> PlayerEntry
+        self._cells = {}  # (x, y) -> set of user_ids
+        self._watermark = None  # wall clock of the last refresh query
+        self._refreshed_at = None  # monotonic time of the last refresh
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'PLAYER_INDEX_ENABLED', False)
+
+    @property
+    def cell_km(self):
+        return getattr(settings, 'PLAYER_INDEX_CELL_KM', 2.0)
+
+    @property
+    def active_days(self):
+        return getattr(settings, 'PLAYER_INDEX_ACTIVE_DAYS', 30)
+
+    @property
+    def refresh_seconds(self):
+        return getattr(settings, 'PLAYER_INDEX_REFRESH_SECONDS', 30)
+
+    @property
+    def size(self):
+        return len(self._entries)
+
+    def cell_of(self, lng, lat):
+        """Get the grid cell of a point"""
+        size = self.cell_km / KM_PER_DEGREE
+        return int(math.floor(lng / size)), int(math.floor(lat / size))
+
+    def nearest(self, lng, lat, radius_m, limit, exclude_id=None, after=None,
+                min_level=None, max_level=None, city=None, category_id=None):
+        """
+        Find the nearest matching players within radius_m.
+
+        after is a (distance, user_id) pair; only players ordered after it
+        are returned.
+
+        Returns:
+            list of {'_id': user_id, 'distance': meters} ordered by
+            (distance, id), or None when the index cannot answer
+        """
+        if not self.enabled or not self.ensure_fresh():
+            return None
+
+        exclude_id = str(exclude_id) if exclude_id else None
+        filters = {'min_level': min_level, 'max_level': max_level, 'city': city, 'category_id': category_id}
+        cell_m = self.cell_km * 1000
+        start_m = (after[0] if after else 0) + cell_m
+        search_m = min(radius_m, max(cell_m, start_m))
+
+        # Grow the circle until it holds `limit` players: every player
+        # inside the circle has been seen, so its nearest ones are final
+        while True:
+            hits = self._within(lng, lat, search_m, exclude_id, after, filters)
+            if len(hits) >= limit or search_m >= radius_m:
+                break
+            search_m = min(radius_m, search_m * 2)
+
+        return [
+            {'_id': user_id, 'distance': distance}
+            for distance, user_id in heapq.nsmallest(limit, hits)
+        ]
+
+    def _within(self, lng, lat, radius_m, exclude_id, after, filters):
+        """Get (distance, user_id) of matching players inside a circle"""
+        dlat = radius_m / 1000 / KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles
+        dlng = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        min_x, min_y = self.cell_of(lng - dlng, lat - dlat)
+        max_x, max_y = self.cell_of(lng + dlng, lat + dlat)
+
+        hits = []
+        with self._lock:
+            if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self._cells):
+                cells = [
+                    members for (x, y), members in self._cells.items()
+                    if min_x <= x <= max_x and min_y <= y <= max_y
+                ]
+            else:
+                cells = [
+                    self._cells[(x, y)]
+                    for x in range(min_x, max_x + 1)
+                    for y in range(min_y, max_y + 1)
+                    if (x, y) in self._cells
+                ]
+
+            for members in cells:
+                for user_id in members:
+                    if user_id == exclude_id:
+                        continue
+                    entry = self._entries[user_id]
+                    if not entry.matches(**filters):
+                        continue
+                    distance = haversine_m(lng, lat, entry.lng, entry.lat)
+                    if distance > radius_m:
+                        continue
+                    if after and (distance, user_id) <= after:
+                        continue
+                    hits.append((distance, user_id))
+        return hits
+
+    def ensure_fresh(self):
+        """
+        Refresh the index when it is older than refresh_seconds.
+
+        Returns:
+            bool: whether the index is loaded
+        """
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return True
+
+        # Only one thread refreshes; others keep serving the loaded index,
+        # or fall back to MongoDB while the first load is running
+        if not self._refresh_lock.acquire(blocking=False):
+            return self._refreshed_at is not None
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f'Player index refresh failed: {e}')
+        finally:
+            self._refresh_lock.release()
+        return self._refreshed_at is not None
+
+    def refresh(self):
+        """Load the index, or apply users changed since the last refresh"""
+        from apps.users.models import User
+
+        started = time.monotonic()
+        now = datetime.utcnow()
+        active_since = now - timedelta(days=self.active_days)
+
+        if self._watermark is None:
+            query = Q(last_active_at__gte=active_since, location__exists=True)
+        else:
+            since = self._watermark - REFRESH_OVERLAP
+            query = Q(last_active_at__gte=since) | Q(updated_at__gte=since)
+        rows = list(User.objects(query).only(*INDEX_FIELDS).as_pymongo())
+
+        with self._lock:
+            for row in rows:
+                self._apply_row(row, active_since)
+            for entry in [entry for entry in self._entries.values() if entry.last_active_at < active_since]:
+                self._remove(entry.user_id)
+
+        full = self._watermark is None
+        self._watermark = now
+        self._refreshed_at = time.monotonic()
+        logger.info(
+            f'Player index {"loaded" if full else "refreshed"}: changed={len(rows)} '
+            f'size={len(self._entries)} seconds={time.monotonic() - started:.3f}'
+        )
+
+    def _apply_row(self, row, active_since):
+        user_id = str(row['_id'])
+        location = row.get('location') or {}
+        coordinates = location.get('coordinates') if isinstance(location, dict) else location
+        last_active_at = row.get('last_active_at')
+
+        if (not row.get('is_active', True) or row.get('is_banned')
+                or not coordinates or not last_active_at or last_active_at < active_since):
+            self._remove(user_id)
+            return
+
+        lng, lat = float(coordinates[0]), float(coordinates[1])
+        entry = PlayerEntry(
+            user_id, lng, lat,
+            row.get('experience_level'),
+            row.get('city'),
+            frozenset(str(category.get('category_id')) for category in row.get('categories') or []),
+            last_active_at,
+            self.cell_of(lng, lat),
+        )
+        self._remove(user_id)
+        self._entries[user_id] = entry
+        self._cells.setdefault(entry.cell, set()).add(user_id)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            members = self._cells.get(entry.cell)
+            if members is not None:
+                members.discard(user_id)
+                if not members:
+                    del self._cells[entry.cell]
+
+    def invalidate(self):
+        """Drop everything; the next search reloads the index"""
+        with self._lock:
+            self._entries.clear()
+            self._cells.clear()
+            self._watermark = None
+            self._refreshed_at = None
+
+
+player_index = ActivePlayerIndex()
@@ -0,0 +1,252 @@
+"""
+Precomputed partner recommendations
+
+One partner_recommendations document per user holds the top
+RECOMMENDATIONS_SIZE candidates of the default partner search (own level
+±1, own city) with their compatibility scores. find_opponents serves the
+default search with a point read; entries are marked stale when the user's
+or a listed candidate's matching profile changes and are recomputed by a
+Celery beat job or on demand.
+
+A changed profile is also queued in partner_profile_changes; the beat job
+scores the changed user against the fresh lists of users whose default
+search now includes them and folds the user in, so a newly qualifying
+partner appears without recomputing those lists.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from mongoengine import Document, fields
+from apps.users.models import User
+from apps.users.matching_scores import (
+    CANDIDATE_FIELDS, candidate_query, pack_candidates, rank_candidates, score_candidates
+)
+
+RECOMMENDATIONS_SIZE = 50
+
+# User fields that change compatibility scores
+MATCHING_PROFILE_FIELDS = [
+    'experience_level', 'city', 'categories', 'rating', 'location',
+    'is_active', 'is_banned',
+]
+
+
+class PartnerRecommendations(Document):
+    """Top partner candidates of one user"""
+
+    # User id
+    id = fields.StringField(primary_key=True)
+
+    # [{'id': user id, 'score': 0-100}, ...] best first
+    candidates = fields.ListField(fields.DictField())
+    stale = fields.BooleanField(default=False)
+    computed_at = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'partner_recommendations',
+        'indexes': [
+            'candidates.id',
+            [('stale', 1), ('computed_at', 1)],
+        ]
+    }
+
+    def __str__(self):
+        return f"Recommendations {self.id} ({len(self.candidates)})"
+
+
+class ProfileChange(Document):
+    """A user whose matching profile changed, waiting to be folded into lists"""
+
+    # User id
+    id = fields.StringField(primary_key=True)
+    changed_at = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'partner_profile_changes',
+        'indexes': ['changed_at'],
+    }
+
+    def __str__(self):
+        return f"ProfileChange {self.id}"
+
+
+def get_max_age():
+    """Get how long recommendations are served without recompute"""
+    return timedelta(minutes=getattr(settings, 'PARTNER_RECOMMENDATIONS_MAX_AGE_MINUTES', 360))
+
+
+def compute_recommendations(user):
+    """Recompute and store the recommendations of a user"""
+    query = candidate_query(user, city=user.city)
+    ranked = rank_candidates(user, User.objects(**query), RECOMMENDATIONS_SIZE)
+
+    now = datetime.utcnow()
+    candidates = [{'id': str(row['_id']), 'score': score} for row, score in ranked]
+    PartnerRecommendations._get_collection().replace_one(
+        {'_id': str(user.id)},
+        {'candidates': candidates, 'stale': False, 'computed_at': now},
+        upsert=True
+    )
+    return ranked, now
+
+
+def get_recommendations(user, limit):
+    """
+    Get a user's top candidates, recomputing stale or missing entries.
+
+    Returns:
+        tuple: (list of (raw user document, score), computed_at)
+    """
+    doc = PartnerRecommendations._get_collection().find_one({'_id': str(user.id)})
+    if not doc or doc.get('stale') or doc['computed_at'] < datetime.utcnow() - get_max_age():
+        ranked, computed_at = compute_recommendations(user)
+        return ranked[:limit], computed_at
+
+    # Freshness filter: drop candidates deactivated or banned since computation
+    candidate_ids = [candidate['id'] for candidate in doc['candidates']]
+    rows = {
+        str(row['_id']): row
+        for row in User.objects(
+            id__in=candidate_ids, is_active=True, is_banned=False
+        ).only(*CANDIDATE_FIELDS).as_pymongo()
+    }
+    ranked = [
+        (rows[candidate['id']], candidate['score'])
+        for candidate in doc['candidates']
+        if candidate['id'] in rows
+    ]
+    return ranked[:limit], doc['computed_at']
+
+
+def mark_profile_changed(user_id):
+    """
+    Mark the user's own list and every list containing the user as stale,
+    and queue the user to be folded into the lists of new matching partners.
+    """
+    collection = PartnerRecommendations._get_collection()
+    user_id = str(user_id)
+    collection.update_one({'_id': user_id}, {'$set': {'stale': True}})
+    collection.update_many({'candidates.id': user_id}, {'$set': {'stale': True}})
+    ProfileChange._get_collection().update_one(
+        {'_id': user_id}, {'$set': {'changed_at': datetime.utcnow()}}, upsert=True
+    )
+
+
+def fold_candidate(candidates, candidate_id, score):
+    """
+    Insert or rescore a candidate in a list of {'id', 'score'}, best first.
+
+    Returns:
+        list or None: the new list, None when the candidate does not make it
+    """
+    others = [candidate for candidate in candidates if candidate['id'] != candidate_id]
+    if len(others) >= RECOMMENDATIONS_SIZE and score <= others[-1]['score']:
+        return None
+    others.append({'id': candidate_id, 'score': score})
+    # Stable: equal scores keep their order, the newcomer last
+    others.sort(key=lambda candidate: -candidate['score'])
+    return others[:RECOMMENDATIONS_SIZE]
+
+
+def fold_profile_changes(batch_size=50):
+    """
+    Fold queued changed users into the fresh lists of users whose default
+    search includes them (same city, level ±1). At most
+    PARTNER_RECOMMENDATIONS_FOLD_LIMIT of the most recently active such
+    users are considered per change.
+
+    Returns:
+        int: number of lists updated
+    """
+    from pymongo import UpdateOne
+
+    changes = ProfileChange._get_collection()
+    collection = PartnerRecommendations._get_collection()
+    fold_limit = getattr(settings, 'PARTNER_RECOMMENDATIONS_FOLD_LIMIT', 1000)
+
+    updated = 0
+    for change in list(changes.find().sort('changed_at', 1).limit(batch_size)):
+        row = User.objects(
+            id=change['_id'], is_active=True, is_banned=False
+        ).only(*CANDIDATE_FIELDS).as_pymongo().first()
+
+        if row and row.get('city') and row.get('experience_level'):
+            level = row['experience_level']
+            searchers = {
+                str(searcher.id): searcher
+                for searcher in User.objects(
+                    is_active=True,
+                    is_banned=False,
+                    city=row['city'],
+                    experience_level__gte=level - 1,
+                    experience_level__lte=level + 1,
+                    id__ne=change['_id']
+                ).order_by('-last_active_at').only(*CANDIDATE_FIELDS).limit(fold_limit)
+            }
+            # Stale lists are recomputed anyway
+            lists = collection.find(
+                {'_id': {'$in': list(searchers)}, 'stale': {'$ne': True}},
+                {'candidates': 1, 'computed_at': 1}
+            )
+
+            packed = pack_candidates([row])
+            operations = []
+            for doc in lists:
+                score = int(score_candidates(searchers[doc['_id']], packed)[0])
+                candidates = fold_candidate(doc['candidates'], str(change['_id']), score)
+                if candidates is not None:
+                    # Skip lists recomputed since they were read
+                    operations.append(UpdateOne(
+                        {'_id': doc['_id'], 'computed_at': doc['computed_at']},
+                        {'$set': {'candidates': candidates}}
+                    ))
+            if operations:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        # A newer change of the same user stays queued
+        changes.delete_one({'_id': change['_id'], 'changed_at': change['changed_at']})
+    return updated
+
+
+def refresh_recommendations(batch_size=200):
+    """
+    Fold changed profiles into existing lists, then recompute stale or old
+    lists and create lists for recently active users that have none.
+
+    Returns:
+        int: number of lists recomputed
+    """
+    fold_profile_changes()
+
+    collection = PartnerRecommendations._get_collection()
+    now = datetime.utcnow()
+
+    user_ids = [
+        doc['_id'] for doc in collection.find(
+            {'$or': [{'stale': True}, {'computed_at': {'$lt': now - get_max_age()}}]},
+            {'_id': 1}
+        ).limit(batch_size)
+    ]
+
+    # Recently active users without a list
+    if len(user_ids) < batch_size:
+        active_since = now - timedelta(days=getattr(settings, 'PARTNER_RECOMMENDATIONS_ACTIVE_DAYS', 30))
+        rows = User.objects(
+            is_active=True, is_banned=False, last_active_at__gte=active_since
+        ).aggregate([
+            {'$lookup': {
+                'from': PartnerRecommendations._get_collection_name(),
+                'localField': '_id',
+                'foreignField': '_id',
+                'as': 'recommendations',
+            }},
+            {'$match': {'recommendations': {'$size': 0}}},
+            {'$limit': batch_size - len(user_ids)},
+            {'$project': {'_id': 1}},
+        ])
+        user_ids.extend(row['_id'] for row in rows)
+
+    refreshed = 0
+    for user in User.objects(id__in=user_ids):
+        compute_recommendations(user)
+        refreshed += 1
+    return refreshed
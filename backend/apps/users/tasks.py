@@ -0,0 +1,18 @@
+"""
+Celery tasks for partner recommendations
+"""
+import time
+from celery import shared_task
+from apps.users.recommendations import refresh_recommendations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_partner_recommendations(batch_size: int = 200):
+    """Recompute stale, old and missing partner recommendation lists"""
+    started = time.monotonic()
+    refreshed = refresh_recommendations(batch_size)
+    logger.info(f'Partner recommendations: refreshed={refreshed} seconds={time.monotonic() - started:.3f}')
+    return refreshed
@@ -6,12 +6,22 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from apps.core.mongoengine_drf import MongoEngineModelViewSet, GeoQueryMixin
+from apps.core.mongoengine_drf import (
+    MongoEngineModelViewSet, MongoEngineCursorPagination, GeoNearCursorPagination
+)
 from apps.users.models import User
+from apps.users import partner_search
+from apps.users.player_index import player_index
 from apps.users.serializers import (
     UserSerializer, UserPublicSerializer, UserCreateSerializer, UserUpdateSerializer, AdminUserSerializer
 )
 
+# Fields loaded for search_partners results (UserPublicSerializer fields)
+PARTNER_RESULT_FIELDS = [
+    'id', 'first_name', 'last_name', 'city', 'experience_level',
+    'rating', 'avatar_url', 'last_active_at',
+]
+
 
 # Auth views - Register & Login
 @api_view(['POST'])
@@ -249,33 +259,85 @@ def change_password(request):
 
 
 # Partner search
-class SearchPartnersView(APIView, GeoQueryMixin):
-    """Search for partners with geo-location"""
+class SearchPartnersView(APIView):
+    """
+    Search for partners nearest first
+    
+    Query params:
+    - lat, lng: search point (optional; without them every matching active
+      user is listed, most recently registered first)
+    - radius_km: float (default 10, max 100, only with lat/lng)
+    - min_level, max_level: int (experience level range, optional)
+    - city: str (optional)
+    - category_id: str (optional)
+    - cursor, page_size: cursor pagination
+    """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # Get query parameters
-        lat = request.query_params.get('lat')
-        lng = request.query_params.get('lng')
-        radius_km = float(request.query_params.get('radius_km', 10.0))
+        params = request.query_params
+        try:
+            criteria = {
+                'min_level': int(params['min_level']) if params.get('min_level') else None,
+                'max_level': int(params['max_level']) if params.get('max_level') else None,
+                'city': params.get('city'),
+                'category_id': params.get('category_id'),
+            }
+        except ValueError:
+            return Response({
+                'error': 'min_level and max_level must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        filters = partner_search.partner_query(request.user, **criteria)
+        
+        point = partner_search.get_search_point(
+            request.user, params.get('lat'), params.get('lng'), use_profile=False
+        )
+        
+        # Without coordinates: no distance filter, most recently registered first
+        if not point:
+            paginator = MongoEngineCursorPagination(ordering='-created_at')
+            users = paginator.paginate_queryset(User.objects(**filters), request)
+            serializer = UserPublicSerializer(users, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        
+        lng, lat = point
+        radius_m = partner_search.get_radius_m(params.get('radius_km'))
+        paginator = GeoNearCursorPagination()
+        paginator.distance_field = partner_search.DISTANCE_FIELD
         
-        # Base queryset (exclude current user)
-        queryset = User.objects.filter(id__ne=request.user.id, is_active=True)
+        rows = None
+        if player_index.enabled and player_index.ensure_fresh():
+            # Nearest ids from the in-memory player index, users re-read by id
+            def nearest(after, limit):
+                return player_index.nearest(
+                    lng, lat, radius_m, limit, exclude_id=request.user.id, after=after, **criteria
+                ) or []
+            
+            hits = paginator.paginate_nearest(nearest, request, lambda limit: len(nearest(None, limit)))
+            rows = partner_search.load_hits(hits, filters, PARTNER_RESULT_FIELDS)
+            if len(rows) < paginator.page_size:
+                # The index only holds recently active players: short pages
+                # come from MongoDB (cursors are the same (distance, id) pairs)
+                rows = None
         
-        # Filter by location if provided
-        if lat and lng:
-            try:
-                lat = float(lat)
-                lng = float(lng)
-                queryset = self.filter_by_location(queryset, lat, lng, radius_km)
-            except (ValueError, TypeError):
-                pass
+        if rows is None:
+            # One $geoNear over the compound location/level/activity index
+            rows = paginator.paginate_geo_near(
+                User._get_collection(), lng, lat, radius_m,
+                partner_search.raw_query(filters),
+                request,
+                stages=[partner_search.projection_stage(PARTNER_RESULT_FIELDS)],
+            )
         
-        # Limit results
-        users = list(queryset[:50])
+        results = []
+        for row in rows:
+            data = UserPublicSerializer(User._from_son(
+                {key: value for key, value in row.items() if key != partner_search.DISTANCE_FIELD}
+            )).data
+            data['distance_km'] = partner_search.distance_km(row)
+            results.append(data)
         
-        serializer = UserPublicSerializer(users, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(results)
 
 
 # Admin views
@@ -6,8 +6,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from apps.users.models import User
+from apps.users.matching_scores import (
+    candidate_query, rank_candidates, rank_rows, score_candidates, pack_candidates
+)
+from apps.users import partner_search
+from apps.users.recommendations import RECOMMENDATIONS_SIZE, get_recommendations
+from apps.categories.models import Category
 from apps.subscriptions.permissions import require_feature
-from datetime import datetime
 
 
 @api_view(['GET'])
@@ -21,6 +26,8 @@ def find_opponents(request):
     - experience_level: int (1-7, optional - defaults to current user's level ±1)
     - category_id: ObjectId (optional - filter by sport category)
     - city: str (optional - filter by location)
+    - lat, lng: float (optional - search nearest users around a point)
+    - radius_km: float (default 10, with lat/lng)
     - limit: int (default 20)
     """
     current_user = request.user
@@ -28,19 +35,12 @@ def find_opponents(request):
     # Get query parameters
     experience_level = request.query_params.get('experience_level')
     category_id = request.query_params.get('category_id')
-    city = request.query_params.get('city', current_user.city)
-    limit = int(request.query_params.get('limit', 20))
-    
-    # Build query
-    query = {
-        'is_active': True,
-        'is_banned': False,
-        'id__ne': current_user.id,  # Exclude current user
-    }
-    
-    # Filter by city
-    if city:
-        query['city'] = city
+    lat = request.query_params.get('lat')
+    lng = request.query_params.get('lng')
+    point = partner_search.get_search_point(current_user, lat, lng) if lat and lng else None
+    # A geo search is bounded by its radius, not the user's city
+    city = request.query_params.get('city', None if point else current_user.city)
+    limit = min(int(request.query_params.get('limit', 20)), 100)
     
     # Filter by experience level (±1 from user's level)
     if experience_level:
@@ -48,46 +48,92 @@ def find_opponents(request):
     else:
         target_level = current_user.experience_level or 3
     
-    # Find users within ±1 skill level
-    query['experience_level__gte'] = max(1, target_level - 1)
-    query['experience_level__lte'] = min(7, target_level + 1)
+    filters = {
+        'experience_level': target_level,
+        'city': city,
+        'category_id': category_id,
+    }
+    
+    # Default search: served from the precomputed recommendation list
+    is_default_search = (
+        not point and not experience_level and not category_id
+        and city == current_user.city and limit <= RECOMMENDATIONS_SIZE
+    )
+    if is_default_search:
+        ranked, computed_at = get_recommendations(current_user, limit)
+        return Response({
+            'count': len(ranked),
+            'results': _serialize_candidates(ranked),
+            'filters': filters,
+            'computed_at': computed_at.isoformat(),
+        })
+    
+    query = candidate_query(current_user, target_level, city, category_id)
     
-    # Find matching users
-    users = User.objects(**query).order_by('-rating')[:limit]
+    if point:
+        # Nearest candidates through the compound geo index, then scored
+        lng, lat = point
+        radius_m = partner_search.get_radius_m(request.query_params.get('radius_km'))
+        criteria = {
+            'min_level': query['experience_level__gte'],
+            'max_level': query['experience_level__lte'],
+            'city': city,
+            'category_id': category_id,
+        }
+        rows = partner_search.nearby_candidates(current_user, query, lng, lat, radius_m, criteria=criteria)
+        ranked = rank_rows(current_user, rows, limit)
+        filters['radius_km'] = radius_m / 1000
+    else:
+        # Score a wide candidate pool and keep the best matches
+        ranked = rank_candidates(current_user, User.objects(**query), limit)
+    
+    results = _serialize_candidates(ranked)
+    
+    return Response({
+        'count': len(results),
+        'results': results,
+        'filters': filters,
+    })
+
+
+def _serialize_candidates(ranked):
+    """Serialize (raw user document, score) pairs for find_opponents"""
+    # Resolve category names of the returned users with one query
+    category_ids = set(
+        str(cat.get('category_id'))
+        for row, _ in ranked
+        for cat in (row.get('categories') or [])
+    )
+    category_names = {
+        str(category.id): category.get_name()
+        for category in Category.objects(id__in=list(category_ids)).only('id', 'name_i18n')
+    } if category_ids else {}
     
-    # Serialize results
     results = []
-    for user in users:
-        # Calculate compatibility score (0-100)
-        compatibility = calculate_compatibility(current_user, user)
-        
+    for row, compatibility in ranked:
+        rating = row.get('rating')
+        last_active_at = row.get('last_active_at')
         results.append({
-            'id': str(user.id),
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'avatar_url': user.avatar_url,
-            'experience_level': user.experience_level,
-            'rating': float(user.rating) if user.rating else 0.0,
-            'city': user.city,
+            'id': str(row['_id']),
+            'first_name': row.get('first_name'),
+            'last_name': row.get('last_name'),
+            'avatar_url': row.get('avatar_url'),
+            'experience_level': row.get('experience_level'),
+            'rating': float(rating) if rating else 0.0,
+            'city': row.get('city'),
             'categories': [
                 {
-                    'id': str(cat.category_id),
-                    'name': cat.name
-                } for cat in (user.categories or [])
+                    'id': str(cat.get('category_id')),
+                    'name': category_names.get(str(cat.get('category_id')), '')
+                } for cat in (row.get('categories') or [])
             ],
             'compatibility_score': compatibility,
-            'last_active': user.last_active_at.isoformat() if user.last_active_at else None,
+            'last_active': last_active_at.isoformat() if last_active_at else None,
         })
+        if partner_search.DISTANCE_FIELD in row:
+            results[-1]['distance_km'] = partner_search.distance_km(row)
     
-    return Response({
-        'count': len(results),
-        'results': results,
-        'filters': {
-            'experience_level': target_level,
-            'city': city,
-            'category_id': category_id,
-        }
-    })
+    return results
 
 
 @api_view(['POST'])
@@ -153,34 +199,7 @@ def calculate_compatibility(user1, user2):
     """
     Calculate compatibility score between two users (0-100)
     
-    Factors:
-    - Experience level similarity (40 points)
-    - Common sports/categories (30 points)
-    - Location proximity (20 points)
-    - Rating similarity (10 points)
+    Uses the same weighted terms as find_opponents (see apps.users.matching_scores).
     """
-    score = 0
-    
-    # Experience level similarity (40 points)
-    if user1.experience_level and user2.experience_level:
-        level_diff = abs(user1.experience_level - user2.experience_level)
-        score += max(0, 40 - (level_diff * 13))  # -13 points per level difference
-    
-    # Common categories (30 points)
-    if user1.categories and user2.categories:
-        user1_cats = set(str(cat.category_id) for cat in user1.categories)
-        user2_cats = set(str(cat.category_id) for cat in user2.categories)
-        common = len(user1_cats.intersection(user2_cats))
-        score += min(30, common * 10)  # 10 points per common category
-    
-    # Same city (20 points)
-    if user1.city and user2.city and user1.city == user2.city:
-        score += 20
-    
-    # Rating similarity (10 points)
-    if user1.rating and user2.rating:
-        rating_diff = abs(user1.rating - user2.rating)
-        score += max(0, 10 - rating_diff)  # -1 point per rating difference
-    
-    return min(100, max(0, int(score)))
-
+    row = user2.to_mongo().to_dict()
+    return int(score_candidates(user1, pack_candidates([row]))[0])
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+"""
+Rebuild the denormalized match feed (match_feed) from opponent matches
+Usage: python backfill_match_feed.py
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from apps.bookings.match_feed import rebuild_feed
+
+
+if __name__ == '__main__':
+    written = rebuild_feed()
+    print(f"✅ Wrote {written} match feed entries")
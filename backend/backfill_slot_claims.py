@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Create slot claims for active bookings made before slot claims existed
+Usage: python backfill_slot_claims.py
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from datetime import datetime
+from apps.bookings.models import Booking
+from apps.bookings.slot_claims import claim_slots
+
+
+def backfill_slot_claims():
+    """Claim slots for all upcoming pending/confirmed bookings"""
+    bookings = Booking.objects(
+        status__in=['confirmed', 'pending'],
+        end_time__gt=datetime.utcnow()
+    ).only('id', 'court', 'start_time', 'end_time').as_pymongo()
+    
+    claimed = 0
+    conflicts = 0
+    for booking in bookings:
+        if claim_slots(booking['court'], booking['start_time'], booking['end_time'], booking['_id']):
+            claimed += 1
+        else:
+            conflicts += 1
+            print(f"⚠️  Booking {booking['_id']} overlaps an already claimed slot")
+    
+    print(f"\n✅ Claimed slots for {claimed} bookings ({conflicts} conflicts)")
+
+
+if __name__ == '__main__':
+    backfill_slot_claims()
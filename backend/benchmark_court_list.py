@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Benchmark court list reads: full Court documents + CourtListSerializer
+versus the projected read model (only() + as_pymongo() + court_list_item)
+
+Temporary inactive courts with large embedded availability_slots arrays
+(the shape of courts not yet migrated to court_slots) are created and
+removed afterwards.
+Usage: python benchmark_court_list.py [courts] [slots_per_court] [repeats]
+"""
+import os
+import sys
+import time
+import uuid
+import tracemalloc
+from datetime import datetime, timedelta
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+import bson
+from apps.courts.models import Court
+from apps.courts.serializers import CourtListSerializer
+from apps.courts.read_models import COURT_LIST_FIELDS, court_list_item, list_projection
+
+# Type of the temporary courts, used to find and remove them
+BENCHMARK_TYPE = '__benchmark__'
+
+
+def create_courts(count, slots):
+    """Insert benchmark courts with `slots` hourly slots each"""
+    start = datetime(2020, 1, 1)
+    docs = []
+    for i in range(count):
+        docs.append({
+            '_id': str(uuid.uuid4()),
+            'name_i18n': {'tk': f'Benchmark {i}', 'ru': f'Benchmark {i}', 'en': f'Benchmark {i}'},
+            'address': f'Benchmark street {i}',
+            'type': BENCHMARK_TYPE,
+            'images': [f'/media/courts/benchmark_{i}.jpg'],
+            'attributes': {'surface_type': 'hard', 'lights': True},
+            'tariffs': [
+                {'name_i18n': {'en': 'Hour'}, 'base_price': '100.00', 'price_type': 'per_hour'},
+                {'name_i18n': {'en': 'Day'}, 'base_price': '800.00', 'price_type': 'per_day'},
+            ],
+            'availability_slots': [
+                {
+                    'start_time': start + timedelta(hours=hour),
+                    'end_time': start + timedelta(hours=hour + 1),
+                    'status': 'booked',
+                    'booking_id': str(uuid.uuid4()),
+                }
+                for hour in range(slots)
+            ],
+            'is_active': False,
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow(),
+        })
+    Court._get_collection().insert_many(docs)
+
+
+def full_path():
+    courts = list(Court.objects(type=BENCHMARK_TYPE))
+    return CourtListSerializer(courts, many=True).data
+
+
+def fast_path():
+    rows = Court.objects(type=BENCHMARK_TYPE).only(*COURT_LIST_FIELDS).as_pymongo()
+    return [court_list_item(row) for row in rows]
+
+
+def measure(fn, repeats):
+    """Get (best seconds, peak traced memory in bytes) of a read path"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def transferred_bytes(projection=None):
+    """Size of the BSON documents a read returns"""
+    return sum(
+        len(bson.encode(doc))
+        for doc in Court._get_collection().find({'type': BENCHMARK_TYPE}, projection)
+    )
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    slots = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    print(f"Creating {count} courts with {slots} availability slots each...")
+    Court._get_collection().delete_many({'type': BENCHMARK_TYPE})
+    create_courts(count, slots)
+
+    try:
+        full_seconds, full_memory = measure(full_path, repeats)
+        fast_seconds, fast_memory = measure(fast_path, repeats)
+        full_bytes = transferred_bytes()
+        fast_bytes = transferred_bytes(list_projection())
+
+        print()
+        print(f"{'path':<12}{'best ms':>12}{'peak MB':>12}{'BSON MB':>12}")
+        print(f"{'full':<12}{full_seconds * 1000:>12.1f}{full_memory / 2**20:>12.2f}{full_bytes / 2**20:>12.2f}")
+        print(f"{'projected':<12}{fast_seconds * 1000:>12.1f}{fast_memory / 2**20:>12.2f}{fast_bytes / 2**20:>12.2f}")
+        print()
+        print(f"Speedup: {full_seconds / fast_seconds:.1f}x, "
+              f"memory: {full_memory / max(fast_memory, 1):.1f}x less, "
+              f"transfer: {full_bytes / max(fast_bytes, 1):.1f}x less")
+    finally:
+        Court._get_collection().delete_many({'type': BENCHMARK_TYPE})
+        print("Benchmark courts removed")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Move embedded Court.availability_slots into the court_slots collection
+(one bucket per court and day, see apps/courts/slots.py)
+
+Courts are streamed in batches with only their slots projected; each batch
+is written with one bulk upsert and then unset on the courts. Re-running
+is safe: slots are added with $addToSet. Slots whose bucket is already past
+retention are dropped.
+Usage: python migrate_court_slots.py [batch_size]
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from apps.courts.models import Court
+from apps.courts.slots import CourtSlotBucket, add_slots_operation, day_start, get_retention
+
+OLD_INDEX_KEY = [('availability_slots.start_time', 1), ('availability_slots.end_time', 1)]
+
+
+def flush(courts, buckets, court_ids):
+    """Write one batch of buckets, then unset the slots of its courts"""
+    if buckets:
+        operations = [
+            UpdateOne(*add_slots_operation(court_id, day, slots), upsert=True)
+            for (court_id, day), slots in buckets.items()
+        ]
+        CourtSlotBucket._get_collection().bulk_write(operations, ordered=False)
+    courts.update_many({'_id': {'$in': court_ids}}, {'$unset': {'availability_slots': ''}})
+
+
+def drop_old_index(courts):
+    """Drop the multikey index on the embedded slots"""
+    for name, info in courts.index_information().items():
+        if [tuple(key) for key in info['key']] == OLD_INDEX_KEY:
+            courts.drop_index(name)
+            print(f"Dropped index {name}")
+
+
+def migrate_court_slots(batch_size=200):
+    """Stream embedded slots out of courts into day buckets"""
+    courts = Court._get_collection()
+    # Buckets whose day ended before this would expire immediately
+    oldest_day = day_start(datetime.utcnow() - get_retention()) - timedelta(days=1)
+    
+    cursor = courts.find(
+        {'availability_slots': {'$exists': True}},
+        {'availability_slots': 1}
+    ).batch_size(batch_size)
+    
+    migrated_courts = migrated_slots = expired_slots = 0
+    buckets = defaultdict(list)
+    court_ids = []
+    for court in cursor:
+        court_ids.append(court['_id'])
+        for slot in court.get('availability_slots') or []:
+            day = day_start(slot['start_time'])
+            if day < oldest_day:
+                expired_slots += 1
+                continue
+            buckets[(str(court['_id']), day)].append(slot)
+            migrated_slots += 1
+        
+        if len(court_ids) >= batch_size:
+            flush(courts, buckets, court_ids)
+            migrated_courts += len(court_ids)
+            print(f"  {migrated_courts} courts...")
+            buckets = defaultdict(list)
+            court_ids = []
+    
+    if court_ids:
+        flush(courts, buckets, court_ids)
+        migrated_courts += len(court_ids)
+    
+    drop_old_index(courts)
+    CourtSlotBucket.ensure_indexes()
+    
+    print(f"\n✅ Moved {migrated_slots} slots of {migrated_courts} courts "
+          f"({expired_slots} past retention dropped)")
+
+
+if __name__ == '__main__':
+    migrate_court_slots(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+Recompute the daily booking statistics rollup (booking_stats_daily) from
+bookings and matches
+Usage: python rebuild_booking_stats.py
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from apps.bookings.stats import rebuild_booking_stats
+
+
+if __name__ == '__main__':
+    written = rebuild_booking_stats()
+    print(f"✅ Rebuilt {written} daily court statistics")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Rebuild court occupancy bitmaps from bookings and blocked court slots
+Usage: python rebuild_court_occupancy.py
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from datetime import datetime, timedelta
+from apps.bookings.models import Booking
+from apps.courts.slots import CourtSlotBucket
+from apps.courts.occupancy import CourtOccupancy, mark_booked, mark_blocked
+
+
+def rebuild_court_occupancy(days_back=7):
+    """Recreate occupancy documents from today minus days_back onwards"""
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_back)
+    
+    deleted = CourtOccupancy.objects(day__gte=since).delete()
+    print(f"Removed {deleted} occupancy documents since {since.date()}")
+    
+    bookings = Booking.objects(
+        status__in=['confirmed', 'pending', 'completed'],
+        end_time__gt=since
+    ).only('court', 'start_time', 'end_time').as_pymongo()
+    
+    booked = 0
+    for booking in bookings:
+        mark_booked(booking['court'], max(booking['start_time'], since), booking['end_time'])
+        booked += 1
+    
+    blocked = 0
+    buckets = CourtSlotBucket._get_collection().find(
+        {'slots': {'$elemMatch': {'status': 'blocked', 'end_time': {'$gt': since}}}},
+        {'court': 1, 'slots': 1}
+    )
+    for bucket in buckets:
+        for slot in bucket['slots']:
+            if slot['status'] == 'blocked' and slot['end_time'] > since:
+                mark_blocked(bucket['court'], max(slot['start_time'], since), slot['end_time'])
+                blocked += 1
+    
+    print(f"\n✅ Rebuilt occupancy from {booked} bookings and {blocked} blocked slots")
+
+
+if __name__ == '__main__':
+    rebuild_court_occupancy()
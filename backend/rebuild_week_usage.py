@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+Recompute materialized weekly booking counters (user_week_usage) from bookings
+Usage: python rebuild_week_usage.py [user_id]
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from apps.bookings.week_usage import rebuild_usage
+
+
+if __name__ == '__main__':
+    user_id = sys.argv[1] if len(sys.argv) > 1 else None
+    written = rebuild_usage(user_id)
+    print(f"✅ Rebuilt {written} weekly counters" + (f" for user {user_id}" if user_id else ""))
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+"""
+Seed the matchmaking queue from active future bookings that need opponents
+Usage: python seed_matchmaking_queue.py
+"""
+import os
+import sys
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from apps.bookings.matchmaking_queue import seed_from_bookings
+
+
+if __name__ == '__main__':
+    written = seed_from_bookings()
+    print(f"✅ Queued {written} bookings")
@@ -239,6 +239,19 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Modules outside INSTALLED_APPS with Celery tasks
+CELERY_IMPORTS = ('apps.core.tasks',)
+
+CELERY_BEAT_SCHEDULE = {
+    'booking-lifecycle': {
+        'task': 'apps.bookings.tasks.process_booking_lifecycle',
+        'schedule': float(os.getenv('BOOKING_LIFECYCLE_INTERVAL_SECONDS', '300')),
+    },
+    'partner-recommendations': {
+        'task': 'apps.users.tasks.refresh_partner_recommendations',
+        'schedule': float(os.getenv('PARTNER_RECOMMENDATIONS_INTERVAL_SECONDS', '600')),
+    },
+}
 
 # Security (Production)
 if not DEBUG:
@@ -285,10 +298,74 @@ LOGGING = {
 MAX_ACTIVE_BOOKINGS_PER_USER = int(os.getenv('MAX_ACTIVE_BOOKINGS_PER_USER', '5'))
 BOOKING_CANCELLATION_HOURS = int(os.getenv('BOOKING_CANCELLATION_HOURS', '2'))
 
-# Matching weights
+# Booking interval index (process-local cache used for conflict checks)
+BOOKING_INTERVAL_INDEX_TTL = int(os.getenv('BOOKING_INTERVAL_INDEX_TTL', '60'))  # seconds
+BOOKING_INTERVAL_INDEX_MAX_BUCKETS = int(os.getenv('BOOKING_INTERVAL_INDEX_MAX_BUCKETS', '5000'))
+
+# Slot claims: bookings reserve fixed-size buckets of a court (minutes).
+# Booking times must lie on this grid; keep it a multiple of the 15-minute occupancy slots
+BOOKING_SLOT_MINUTES = int(os.getenv('BOOKING_SLOT_MINUTES', '15'))
+
+# Maximum slots in one batch/recurring booking request
+BOOKING_BATCH_MAX_SLOTS = int(os.getenv('BOOKING_BATCH_MAX_SLOTS', '52'))
+
+# Booking lifecycle job: completes finished bookings and expires unconfirmed ones
+BOOKING_LIFECYCLE_WINDOW_HOURS = int(os.getenv('BOOKING_LIFECYCLE_WINDOW_HOURS', '24'))  # update_many window size
+BOOKING_LIFECYCLE_MAX_LOOKBACK_DAYS = int(os.getenv('BOOKING_LIFECYCLE_MAX_LOOKBACK_DAYS', '7'))  # older bookings are left as they are
+BOOKING_PENDING_EXPIRE_MINUTES = int(os.getenv('BOOKING_PENDING_EXPIRE_MINUTES', '0'))  # after start_time; 0 disables expiry
+
+# Matching weights (partner compatibility, see apps/users/matching_scores.py)
 MATCHING_WEIGHTS = {
-    'distance': 0.4,
-    'level_difference': 0.4,
-    'last_active': 0.2,
+    'distance': 0.2,
+    'level_difference': 0.3,
+    'last_active': 0.1,
+    'common_categories': 0.3,
+    'rating': 0.1,
+}
+MATCHING_DISTANCE_SCALE_KM = float(os.getenv('MATCHING_DISTANCE_SCALE_KM', '10'))  # distance score decays over this length
+MATCHING_LAST_ACTIVE_HALF_LIFE_DAYS = float(os.getenv('MATCHING_LAST_ACTIVE_HALF_LIFE_DAYS', '7'))
+MATCHING_CANDIDATE_POOL = int(os.getenv('MATCHING_CANDIDATE_POOL', '500'))  # users scored per search
+
+# Precomputed partner recommendations (top 50 per user)
+PARTNER_RECOMMENDATIONS_MAX_AGE_MINUTES = int(os.getenv('PARTNER_RECOMMENDATIONS_MAX_AGE_MINUTES', '360'))
+PARTNER_RECOMMENDATIONS_ACTIVE_DAYS = int(os.getenv('PARTNER_RECOMMENDATIONS_ACTIVE_DAYS', '30'))  # users kept precomputed
+PARTNER_RECOMMENDATIONS_FOLD_LIMIT = int(os.getenv('PARTNER_RECOMMENDATIONS_FOLD_LIMIT', '1000'))  # lists a changed profile is folded into
+
+# Users' last_active_at is stamped on authenticated requests at most this often
+LAST_ACTIVE_UPDATE_MINUTES = int(os.getenv('LAST_ACTIVE_UPDATE_MINUTES', '5'))
+
+# In-memory spatial index of recently active players (partner search)
+PLAYER_INDEX_ENABLED = os.getenv('PLAYER_INDEX_ENABLED', 'False') == 'True'
+PLAYER_INDEX_CELL_KM = float(os.getenv('PLAYER_INDEX_CELL_KM', '2'))
+PLAYER_INDEX_ACTIVE_DAYS = int(os.getenv('PLAYER_INDEX_ACTIVE_DAYS', '30'))  # players kept in memory
+PLAYER_INDEX_REFRESH_SECONDS = int(os.getenv('PLAYER_INDEX_REFRESH_SECONDS', '30'))
+
+# Court slot buckets (court_slots) are kept this long after their day
+COURT_SLOTS_RETENTION_DAYS = int(os.getenv('COURT_SLOTS_RETENTION_DAYS', '90'))
+
+# Nearest free court search: nearest courts checked against occupancy per request
+NEAREST_FREE_COURT_POOL = int(os.getenv('NEAREST_FREE_COURT_POOL', '200'))
+
+# Slot suggestions offered when a requested slot is taken
+SLOT_SUGGESTION_DAYS = int(os.getenv('SLOT_SUGGESTION_DAYS', '7'))  # days searched after the requested start
+SLOT_SUGGESTION_NEARBY_COURTS = int(os.getenv('SLOT_SUGGESTION_NEARBY_COURTS', '5'))  # same-type courts searched besides the requested one
+
+# Domain events: handlers run by the dispatch_domain_event Celery task (apps/core/events.py)
+DOMAIN_EVENT_HANDLERS = {
+    'booking.created': [
+        'apps.bookings.handlers.match_opponents',
+        'apps.bookings.stats.count_booking_created',
+    ],
+    'booking.cancelled': [
+        'apps.notifications.handlers.notify_booking_cancelled',
+        'apps.bookings.stats.count_booking_cancelled',
+    ],
+    'match.created': [
+        'apps.notifications.handlers.notify_match_created',
+        'apps.bookings.stats.count_match_created',
+    ],
+    # Many events in one message (publish_many)
+    'batch': [
+        'apps.core.events.dispatch_batch',
+    ],
 }
-
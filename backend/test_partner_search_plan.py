@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Test partner search query plans - the $geoNear searches must run on the
+compound (location, experience_level, is_active) index and the non-geo
+candidate pool on the (is_active, is_banned, city, last_active_at,
+experience_level) index, with no collection scan.
+Skipped when MongoDB is unreachable or the indexes have not been built
+yet (mongoengine creates them when the app first uses the collection); the
+test only reads the database and never builds indexes itself.
+Usage: pytest test_partner_search_plan.py  (or python test_partner_search_plan.py)
+"""
+import os
+import sys
+import uuid
+import django
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Setup Django
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sportlink.settings')
+django.setup()
+
+from django.conf import settings
+from apps.users.models import User
+from apps.users import partner_search
+from apps.users.matching_scores import candidate_query
+from apps.core.mongoengine_drf import geo_near_stage
+
+GEO_INDEX = {'location': '2dsphere', 'experience_level': 1, 'is_active': 1}
+CANDIDATE_INDEX = {'is_active': 1, 'is_banned': 1, 'city': 1, 'last_active_at': -1, 'experience_level': 1}
+
+# Ashgabat, used when no user has a location
+DEFAULT_POINT = (58.3833, 37.95)
+
+
+def mongo_available():
+    """Ping the configured MongoDB server with a short timeout"""
+    client = MongoClient(
+        host=settings.MONGODB_HOST,
+        port=settings.MONGODB_PORT,
+        username=settings.MONGODB_USERNAME or None,
+        password=settings.MONGODB_PASSWORD or None,
+        serverSelectionTimeoutMS=2000,
+    )
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+pytestmark = pytest.mark.skipif(not mongo_available(), reason='MongoDB is not reachable')
+
+
+def missing_indexes():
+    """Key patterns of the expected indexes that do not exist on the users collection"""
+    existing = [dict(info['key']) for info in User._get_collection().index_information().values()]
+    return [pattern for pattern in (GEO_INDEX, CANDIDATE_INDEX) if pattern not in existing]
+
+
+def plan_stages(explain):
+    """Collect (stage, keyPattern) of every winning plan node, skipping rejected plans"""
+    stages = []
+    
+    def walk(node):
+        if isinstance(node, dict):
+            if isinstance(node.get('stage'), str):
+                stages.append((node['stage'], dict(node.get('keyPattern') or {})))
+            for key, value in node.items():
+                if key != 'rejectedPlans':
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+    
+    walk(explain)
+    return stages
+
+
+def check(name, explain, stage, key_pattern):
+    """Print the plan and report whether it uses the expected index without a COLLSCAN"""
+    stages = plan_stages(explain)
+    print(f"{name}:")
+    for stage_name, pattern in stages:
+        print(f"  - {stage_name} {pattern or ''}")
+    
+    uses_index = (stage, key_pattern) in stages
+    collscan = any(stage_name == 'COLLSCAN' for stage_name, _ in stages)
+    ok = uses_index and not collscan
+    print(f"  {'OK' if ok else 'FAIL'}: {stage} on {key_pattern}{', COLLSCAN found' if collscan else ''}")
+    print()
+    return ok
+
+
+def assert_plan(name, explain, stage, key_pattern):
+    assert check(name, explain, stage, key_pattern), f"{name} does not use {stage} on {key_pattern} without a COLLSCAN"
+
+
+def explain_aggregate(pipeline):
+    collection = User._get_collection()
+    return collection.database.command(
+        'explain',
+        {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}},
+        verbosity='queryPlanner'
+    )
+
+
+def get_search_context():
+    """Pick a user and search point (a sample user when none has a location)"""
+    user = User.objects(location__exists=True, is_active=True).first()
+    if user:
+        lng, lat = partner_search.get_search_point(user)
+    else:
+        user = User(id=uuid.uuid4(), experience_level=3, city='Ashgabat')
+        lng, lat = DEFAULT_POINT
+    
+    print(f"Explaining partner search around ({lat}, {lng})")
+    print()
+    return {
+        'user': user,
+        'lng': lng,
+        'lat': lat,
+        'radius_m': partner_search.get_radius_m(partner_search.DEFAULT_RADIUS_KM),
+    }
+
+
+@pytest.fixture(scope='module')
+def search_context():
+    missing = missing_indexes()
+    if missing:
+        pytest.skip(f"indexes not built: {missing}")
+    return get_search_context()
+
+
+def test_search_partners_first_page(search_context):
+    ctx = search_context
+    filters = partner_search.partner_query(ctx['user'], min_level=2, max_level=4)
+    assert_plan(
+        'search_partners first page',
+        explain_aggregate(partner_search.search_pipeline(filters, ctx['lng'], ctx['lat'], ctx['radius_m'], 21)),
+        'GEO_NEAR_2DSPHERE', GEO_INDEX
+    )
+
+
+def test_search_partners_next_page(search_context):
+    """Later pages restart $geoNear at a distance"""
+    ctx = search_context
+    filters = partner_search.partner_query(ctx['user'], min_level=2, max_level=4)
+    query = partner_search.raw_query(filters)
+    assert_plan(
+        'search_partners next page',
+        explain_aggregate([
+            geo_near_stage(ctx['lng'], ctx['lat'], ctx['radius_m'], query, 'location',
+                           partner_search.DISTANCE_FIELD, min_distance=500),
+            {'$match': {'$or': [{partner_search.DISTANCE_FIELD: {'$gt': 500}}, {'_id': {'$gt': ''}}]}},
+            {'$sort': {partner_search.DISTANCE_FIELD: 1, '_id': 1}},
+            {'$limit': 21},
+        ]),
+        'GEO_NEAR_2DSPHERE', GEO_INDEX
+    )
+
+
+def test_find_opponents_geo_pool(search_context):
+    """find_opponents with lat/lng"""
+    ctx = search_context
+    filters = candidate_query(ctx['user'], ctx['user'].experience_level)
+    assert_plan(
+        'find_opponents geo pool',
+        explain_aggregate(partner_search.search_pipeline(filters, ctx['lng'], ctx['lat'], ctx['radius_m'], 500)),
+        'GEO_NEAR_2DSPHERE', GEO_INDEX
+    )
+
+
+def test_find_opponents_city_pool(search_context):
+    """find_opponents without lat/lng"""
+    ctx = search_context
+    user = ctx['user']
+    filters = candidate_query(user, user.experience_level, city=user.city or 'Ashgabat')
+    assert_plan(
+        'find_opponents city pool',
+        User.objects(**filters).order_by('-last_active_at').limit(500).explain(),
+        'IXSCAN', CANDIDATE_INDEX
+    )
+
+
+if __name__ == '__main__':
+    if not mongo_available():
+        print("MongoDB is not reachable")
+        sys.exit(1)
+    missing = missing_indexes()
+    if missing:
+        print(f"Indexes not built: {missing} - start the app once to create them")
+        sys.exit(1)
+    context = get_search_context()
+    failed = 0
+    for test in [
+        test_search_partners_first_page,
+        test_search_partners_next_page,
+        test_find_opponents_geo_pool,
+        test_find_opponents_city_pool,
+    ]:
+        try:
+            test(context)
+        except AssertionError:
+            failed += 1
+    
+    if failed:
+        print("Partner search plan check FAILED")
+        sys.exit(1)
+    print("All partner search plans use their indexes")
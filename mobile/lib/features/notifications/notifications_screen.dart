@@ -35,7 +35,10 @@ class _NotificationsScreenState extends ConsumerState<NotificationsScreen> {
       final response = await apiService.get('/notifications/');
       
       if (response.statusCode == 200) {
-        final List<dynamic> notificationsJson = response.data;
+        // Paginated response: {results, next_cursor, has_more}
+        final List<dynamic> notificationsJson = response.data is List
+            ? response.data
+            : response.data['results'] as List<dynamic>;
         setState(() {
           _notifications = notificationsJson
               .map((json) => app_notification.Notification.fromJson(json))